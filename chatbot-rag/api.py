@@ -6,19 +6,51 @@ document management, and system status.
 
 Run:
     uvicorn api:app --reload --port 8000
+    python api.py --profile-startup     # import-time breakdown
+
+The chatbot warms up in the background: GET /health answers at once,
+GET /ready (and the chat/document endpoints) return 503 until it is loaded.
+GET /metrics serves request counters and per-stage latency histograms in
+the Prometheus text format.
 
 Docs:
     http://localhost:8000/docs (Swagger UI)
     http://localhost:8000/redoc (ReDoc)
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator
+
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 
-from src.chatbot import RAGChatbot
-from src.utils import Config
+from src.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, REGISTRY
+from src.startup import BackgroundWarmup, print_startup_profile
+
+if TYPE_CHECKING:  # langchain / ChromaDB load in the warm-up thread, not at import
+    from src.chatbot import ChatResponse, RAGChatbot
+
+
+# ─── Singleton Chatbot (background warm-up) ─────────────
+def _build_chatbot() -> "RAGChatbot":
+    from src.chatbot import RAGChatbot
+
+    return RAGChatbot()
+
+
+warmup = BackgroundWarmup("rag_chatbot", _build_chatbot)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start()
+    yield
+
 
 # ─── App Setup ───────────────────────────────────────────
 app = FastAPI(
@@ -28,6 +60,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -39,10 +72,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ─── Singleton Chatbot ──────────────────────────────────
-chatbot = RAGChatbot()
-
-
 # ─── Pydantic Models ────────────────────────────────────
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=2000, description="User message")
@@ -57,6 +86,12 @@ class SourceInfo(BaseModel):
     relevance: float
 
 
+class SpanInfo(BaseModel):
+    name: str
+    start_ms: float
+    duration_ms: float
+
+
 class ChatResponseModel(BaseModel):
     answer: str
     sources: list[SourceInfo]
@@ -64,11 +99,14 @@ class ChatResponseModel(BaseModel):
     response_time_ms: float
     docs_consulted: int
     is_confident: bool
+    cached: bool = False
+    spans: list[SpanInfo] = []
 
 
 class StatusResponse(BaseModel):
     documents_loaded: int
     memory_messages: int
+    active_sessions: int
     metrics: dict
     collection_stats: dict
 
@@ -78,39 +116,30 @@ class FeedbackRequest(BaseModel):
     feedback: str = Field(..., pattern="^(positive|negative)$", description="positive or negative")
 
 
-# ─── Endpoints ───────────────────────────────────────────
-
-@app.get("/", tags=["General"])
-async def root():
-    """Health check and API info."""
-    return {
-        "service": "BillEasy RAG Chatbot API",
-        "version": "1.0.0",
-        "status": "running",
-        "docs": "/docs",
-        "documents_loaded": chatbot.em.document_count,
-    }
+# ─── Helpers ─────────────────────────────────────────────
 
+def get_chatbot() -> "RAGChatbot":
+    """Dependency: the warmed-up chatbot, or 503 while it is still loading."""
+    chatbot = warmup.get()
+    if chatbot is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Chatbot not ready ({warmup.status()['state']}). Retry shortly.",
+            headers={"Retry-After": "2"},
+        )
+    return chatbot
 
-@app.post("/chat", response_model=ChatResponseModel, tags=["Chat"])
-async def chat(request: ChatRequest):
-    """
-    Send a message and receive an AI-generated response based on the knowledge base.
 
-    The response includes:
-    - The answer text with source citations
-    - Confidence score (0-1)
-    - List of source documents used
-    - Response time in milliseconds
-    """
+def _require_documents(chatbot: "RAGChatbot") -> None:
+    """Reject chat requests while the knowledge base is empty."""
     if chatbot.em.document_count == 0:
         raise HTTPException(
             status_code=400,
             detail="No documents loaded. Use POST /documents/load-samples or upload documents first.",
         )
 
-    response = chatbot.chat(request.message)
 
+def _to_response_model(response: "ChatResponse") -> ChatResponseModel:
     return ChatResponseModel(
         answer=response.answer,
         sources=[
@@ -125,11 +154,96 @@ async def chat(request: ChatRequest):
         response_time_ms=round(response.response_time * 1000, 2),
         docs_consulted=response.docs_consulted,
         is_confident=response.is_confident,
+        cached=response.cached,
+        spans=[SpanInfo(**span) for span in response.spans],
+    )
+
+
+# ─── Endpoints ───────────────────────────────────────────
+
+@app.get("/", tags=["General"])
+async def root():
+    """Health check and API info."""
+    chatbot = warmup.get()
+    return {
+        "service": "BillEasy RAG Chatbot API",
+        "version": "1.0.0",
+        "status": "running" if chatbot is not None else warmup.status()["state"],
+        "docs": "/docs",
+        "documents_loaded": chatbot.em.document_count if chatbot is not None else None,
+    }
+
+
+@app.get("/health", tags=["System"])
+async def health():
+    """Liveness: the process is up (never waits for the chatbot)."""
+    return {"status": "ok"}
+
+
+@app.get("/ready", tags=["System"])
+async def ready():
+    """Readiness: 200 once the chatbot has warmed up, 503 before (or if warm-up failed)."""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics", tags=["System"], include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: request counters and per-stage latency histograms."""
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.post("/chat", response_model=ChatResponseModel, tags=["Chat"])
+async def chat(request: ChatRequest, chatbot=Depends(get_chatbot)):
+    """
+    Send a message and receive an AI-generated response based on the knowledge base.
+
+    The response includes:
+    - The answer text with source citations
+    - Confidence score (0-1)
+    - List of source documents used
+    - Response time in milliseconds, and per-stage spans
+    """
+    _require_documents(chatbot)
+    response = await chatbot.achat(request.message, session_id=request.session_id)
+    return _to_response_model(response)
+
+
+@app.post("/chat/stream", tags=["Chat"])
+async def chat_stream(request: ChatRequest, chatbot=Depends(get_chatbot)):
+    """
+    Same as POST /chat, but streamed as Server-Sent Events.
+
+    Event sequence:
+    - `retrieval`: sources, confidence and docs consulted (before generation)
+    - `token`: one per generated chunk (`{"content": "..."}`)
+    - `done`: the full ChatResponseModel plus `time_to_first_token_ms`
+    """
+    _require_documents(chatbot)
+
+    async def event_source() -> AsyncIterator[str]:
+        async for event in chatbot.achat_stream(
+            request.message, session_id=request.session_id
+        ):
+            if event["type"] == "done":
+                ttft = event["time_to_first_token"]
+                payload = _to_response_model(event["response"]).model_dump()
+                payload["time_to_first_token_ms"] = (
+                    round(ttft * 1000, 2) if ttft is not None else None
+                )
+            else:
+                payload = {k: v for k, v in event.items() if k != "type"}
+            yield f"event: {event['type']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.post("/documents/upload", tags=["Documents"])
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), chatbot=Depends(get_chatbot)):
     """
     Upload a document to the knowledge base.
     Supported formats: PDF, TXT, DOCX, MD.
@@ -144,7 +258,7 @@ async def upload_document(file: UploadFile = File(...)):
         )
 
     content = await file.read()
-    count = chatbot.load_uploaded_file(content, file.filename)
+    count = await asyncio.to_thread(chatbot.load_uploaded_file, content, file.filename)
 
     return {
         "success": True,
@@ -155,9 +269,9 @@ async def upload_document(file: UploadFile = File(...)):
 
 
 @app.post("/documents/load-samples", tags=["Documents"])
-async def load_sample_documents():
+async def load_sample_documents(chatbot=Depends(get_chatbot)):
     """Load the built-in BillEasy sample documents."""
-    count = chatbot.load_sample_documents()
+    count = await asyncio.to_thread(chatbot.load_sample_documents)
     return {
         "success": True,
         "chunks_loaded": count,
@@ -165,33 +279,50 @@ async def load_sample_documents():
     }
 
 
+@app.post("/documents/sync", tags=["Documents"])
+async def sync_documents(chatbot=Depends(get_chatbot)):
+    """
+    Incrementally re-index the sample documents directory.
+
+    Only new or modified files are embedded; chunks of removed or
+    changed files are deleted.
+    """
+    report = await asyncio.to_thread(chatbot.sync_directory)
+    return {
+        "success": True,
+        **report.to_dict(),
+        "total_documents": chatbot.em.document_count,
+    }
+
+
 @app.get("/documents", tags=["Documents"])
-async def list_documents():
+async def list_documents(chatbot=Depends(get_chatbot)):
     """Get information about loaded documents."""
     return chatbot.em.get_collection_stats()
 
 
 @app.delete("/documents", tags=["Documents"])
-async def clear_documents():
+async def clear_documents(chatbot=Depends(get_chatbot)):
     """Clear all documents from the knowledge base."""
-    chatbot.em.clear_collection()
+    await asyncio.to_thread(chatbot.em.clear_collection)
     return {"success": True, "message": "All documents cleared."}
 
 
 @app.delete("/history", tags=["Chat"])
-async def clear_history():
-    """Clear conversation memory."""
-    chatbot.clear_memory()
+async def clear_history(session_id: Optional[str] = None, chatbot=Depends(get_chatbot)):
+    """Clear conversation memory for one session, or for all sessions if omitted."""
+    chatbot.clear_memory(session_id)
     return {"success": True, "message": "Conversation history cleared."}
 
 
 @app.get("/status", response_model=StatusResponse, tags=["System"])
-async def get_status():
+async def get_status(chatbot=Depends(get_chatbot)):
     """Get system status, metrics, and configuration."""
     status = chatbot.get_status()
     return StatusResponse(
         documents_loaded=status["documents_loaded"],
         memory_messages=status["memory_messages"],
+        active_sessions=status["active_sessions"],
         metrics=status["metrics"],
         collection_stats=status["collection_stats"],
     )
@@ -205,3 +336,14 @@ async def submit_feedback(request: FeedbackRequest):
         "feedback": request.feedback,
         "message": "Feedback recorded. Thank you!",
     }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--profile-startup" in sys.argv:
+        print_startup_profile("api")
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,397 @@
+"""
+Analytics Store — Queryable Conversation History
+==================================================
+SQLite (WAL) copy of the conversation log, indexed by timestamp,
+sender, confidence, latency and cited source file, so dashboards
+(Streamlit's metrics panel, the Google Sheets export) query it in
+milliseconds instead of scanning the JSONL log.
+
+The ConversationLogger's writer thread inserts every batch it writes;
+logs written before the store existed are imported once (``backfill``).
+An interaction is identified by (timestamp, sender, question), so an
+entry seen by both paths — or by two workers — is stored once.
+"""
+
+import gzip
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional
+
+from src.utils import LOGS_DIR, logger
+
+ANALYTICS_FILE_NAME = "analytics.sqlite3"
+DEFAULT_ANALYTICS_PATH = LOGS_DIR / ANALYTICS_FILE_NAME
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,                    -- unix seconds
+    day TEXT NOT NULL,                   -- YYYY-MM-DD, local time as logged
+    sender TEXT,                         -- session_id (WhatsApp number, API session)
+    user_message TEXT NOT NULL,
+    assistant_response TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    response_time_ms REAL NOT NULL,
+    docs_consulted INTEGER NOT NULL,
+    cached INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS interactions_ts ON interactions (ts);
+CREATE INDEX IF NOT EXISTS interactions_sender ON interactions (sender, ts);
+CREATE INDEX IF NOT EXISTS interactions_confidence ON interactions (confidence, ts);
+CREATE INDEX IF NOT EXISTS interactions_latency ON interactions (response_time_ms);
+
+CREATE TABLE IF NOT EXISTS citations (
+    interaction_id INTEGER NOT NULL REFERENCES interactions (id),
+    source_file TEXT NOT NULL,
+    chunk TEXT,
+    relevance REAL
+);
+CREATE INDEX IF NOT EXISTS citations_source ON citations (source_file, interaction_id);
+CREATE INDEX IF NOT EXISTS citations_interaction ON citations (interaction_id);
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Identity of an interaction; added by _add_entry_key() so databases
+# created before it (possibly holding duplicates) are migrated
+_ENTRY_KEY = """
+CREATE UNIQUE INDEX IF NOT EXISTS interactions_entry
+    ON interactions (ts, IFNULL(sender, ''), user_message)
+"""
+
+INTERACTION_COLUMNS = (
+    "id", "ts", "day", "sender", "user_message", "assistant_response",
+    "confidence", "response_time_ms", "docs_consulted", "cached",
+)
+
+
+class AnalyticsStore:
+    """
+    Conversation history as indexed SQLite tables.
+
+    Usage:
+        store = AnalyticsStore()
+        store.add([entry, ...])                  # ConversationLogger entries
+        store.low_confidence_by_day(days=30)
+        store.top_sources(limit=10)
+        store.latency_distribution(days=7)
+    """
+
+    def __init__(self, db_path: Optional[str | Path] = None):
+        self.db_path = Path(db_path or os.getenv("ANALYTICS_DB_PATH", DEFAULT_ANALYTICS_PATH))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'interactions_entry'"
+        ).fetchone():
+            self._add_entry_key(conn)
+
+    # ─── Writes ──────────────────────────────────────────
+
+    def add(self, entries: Iterable[dict]) -> int:
+        """
+        Insert logged interactions (one transaction per call); returns rows
+        added. Interactions already stored are skipped.
+        """
+        added = 0
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            for entry in entries:
+                added += self._insert(conn, entry)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def backfill(self, log_files: Iterable[Path]) -> int:
+        """
+        Import JSONL conversation logs written before this store existed.
+
+        Runs at most once per database (several workers may call it);
+        missing or unreadable files are skipped, and entries already
+        mirrored by ``add`` are not imported twice.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'backfilled'").fetchone()
+            if done:
+                conn.execute("COMMIT")
+                return 0
+            added = 0
+            for path in log_files:
+                try:
+                    for entry in _read_jsonl(path):
+                        added += self._insert(conn, entry)
+                except FileNotFoundError:
+                    continue  # fresh install, or rotated away meanwhile
+                except (OSError, EOFError) as e:
+                    logger.error("Skipping unreadable conversation log %s: %s", path, e)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('backfilled', ?)", (str(time.time()),)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if added:
+            logger.info("Analytics store backfilled with %d logged interactions", added)
+        return added
+
+    # ─── Dashboard queries ───────────────────────────────
+
+    def summary(self, days: Optional[int] = None) -> dict:
+        """Totals and averages (optionally over the last ``days`` days)."""
+        where, params = self._since(days)
+        total, avg_conf, avg_ms, cached, senders = self._conn().execute(
+            f"SELECT COUNT(*), AVG(confidence), AVG(response_time_ms), SUM(cached),"
+            f" COUNT(DISTINCT sender) FROM interactions {where}",
+            params,
+        ).fetchone()
+        return {
+            "total_interactions": total,
+            "avg_confidence": round(avg_conf or 0.0, 4),
+            "avg_response_time_ms": round(avg_ms or 0.0, 2),
+            "cached_answers": cached or 0,
+            "unique_senders": senders,
+        }
+
+    def low_confidence_by_day(self, threshold: float = 0.7, days: int = 30) -> list[dict]:
+        """Per day: questions asked, how many were answered with low confidence, and the share."""
+        where, params = self._since(days)
+        rows = self._conn().execute(
+            f"""
+            SELECT day, COUNT(*), SUM(confidence < ?) FROM interactions {where}
+            GROUP BY day ORDER BY day
+            """,
+            (threshold, *params),
+        ).fetchall()
+        return [
+            {
+                "day": day,
+                "questions": total,
+                "low_confidence": low,
+                "low_confidence_share": round(low / total, 4) if total else 0.0,
+            }
+            for day, total, low in rows
+        ]
+
+    def low_confidence_questions(
+        self, threshold: float = 0.7, day: Optional[str] = None, limit: int = 50
+    ) -> list[dict]:
+        """Most recent questions answered below ``threshold`` (optionally on one day)."""
+        sql = (
+            "SELECT ts, sender, user_message, confidence FROM interactions"
+            " WHERE confidence < ?"
+        )
+        params: list = [threshold]
+        if day:
+            sql += " AND day = ?"
+            params.append(day)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(ts).isoformat(),
+                "sender": sender,
+                "question": question,
+                "confidence": round(confidence, 4),
+            }
+            for ts, sender, question, confidence in self._conn().execute(sql, params)
+        ]
+
+    def top_sources(self, limit: int = 10, days: Optional[int] = None) -> list[dict]:
+        """Most cited source files, with their average relevance."""
+        where, params = self._since(days, column="i.ts")
+        rows = self._conn().execute(
+            f"""
+            SELECT c.source_file, COUNT(*), COUNT(DISTINCT c.interaction_id), AVG(c.relevance)
+            FROM citations AS c JOIN interactions AS i ON i.id = c.interaction_id
+            {where}
+            GROUP BY c.source_file ORDER BY COUNT(*) DESC LIMIT ?
+            """,
+            (*params, limit),
+        ).fetchall()
+        return [
+            {
+                "source": source,
+                "citations": citations,
+                "interactions": interactions,
+                "avg_relevance": round(relevance or 0.0, 4),
+            }
+            for source, citations, interactions, relevance in rows
+        ]
+
+    def latency_distribution(
+        self,
+        days: Optional[int] = None,
+        bounds_ms: tuple[float, ...] = (250, 500, 1000, 2000, 5000, 10000),
+    ) -> dict:
+        """Percentiles of response time plus a histogram over ``bounds_ms``."""
+        where, params = self._since(days)
+        conn = self._conn()
+        count = conn.execute(f"SELECT COUNT(*) FROM interactions {where}", params).fetchone()[0]
+        quantiles = {"p50": 0.50, "p90": 0.90, "p95": 0.95, "p99": 0.99}
+        # Nearest rank (1-based) of each quantile, all read in one sorted pass
+        ranks = {name: max(math.ceil(q * count), 1) for name, q in quantiles.items()}
+        values: dict[int, float] = {}
+        if count:
+            values = dict(conn.execute(
+                f"""
+                SELECT rn, response_time_ms FROM (
+                    SELECT response_time_ms,
+                           ROW_NUMBER() OVER (ORDER BY response_time_ms) AS rn
+                    FROM interactions {where})
+                WHERE rn IN ({", ".join("?" * len(ranks))})
+                """,
+                (*params, *ranks.values()),
+            ).fetchall())
+        percentiles = {
+            name: round(values[rank], 2) if rank in values else None
+            for name, rank in ranks.items()
+        }
+
+        cases = " ".join(
+            f"WHEN response_time_ms <= {float(bound)} THEN {i}" for i, bound in enumerate(bounds_ms)
+        )
+        bucket_rows = conn.execute(
+            f"SELECT CASE {cases} ELSE {len(bounds_ms)} END AS bucket, COUNT(*)"
+            f" FROM interactions {where} GROUP BY bucket",
+            params,
+        ).fetchall()
+        counts = dict(bucket_rows)
+        labels = [f"≤{bound:g}ms" for bound in bounds_ms] + [f">{bounds_ms[-1]:g}ms"]
+        return {
+            "count": count,
+            **percentiles,
+            "histogram": [
+                {"bucket": label, "count": counts.get(i, 0)} for i, label in enumerate(labels)
+            ],
+        }
+
+    def sender_history(self, sender: str, limit: int = 50) -> list[dict]:
+        """Latest interactions of one sender, oldest first."""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(INTERACTION_COLUMNS)} FROM interactions"
+            " WHERE sender = ? ORDER BY ts DESC LIMIT ?",
+            (sender, limit),
+        ).fetchall()
+        return [dict(zip(INTERACTION_COLUMNS, row)) for row in reversed(rows)]
+
+    def interactions_after(self, last_id: int = 0, limit: int = 1000) -> list[dict]:
+        """Interactions with ``id > last_id`` in insertion order (incremental exports)."""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(INTERACTION_COLUMNS)} FROM interactions"
+            " WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit),
+        ).fetchall()
+        return [dict(zip(INTERACTION_COLUMNS, row)) for row in rows]
+
+    # ─── Internals ───────────────────────────────────────
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, entry: dict) -> int:
+        """Store one logged interaction; returns 0 if it was already there."""
+        logged_at = datetime.fromisoformat(entry["timestamp"])
+        cursor = conn.execute(
+            """
+            INSERT OR IGNORE INTO interactions (ts, day, sender, user_message, assistant_response,
+                                      confidence, response_time_ms, docs_consulted, cached)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                logged_at.timestamp(),
+                logged_at.strftime("%Y-%m-%d"),
+                entry.get("session_id"),
+                entry.get("user_message", ""),
+                entry.get("assistant_response", ""),
+                entry.get("confidence", 0.0),
+                entry.get("response_time_ms", 0.0),
+                entry.get("docs_consulted", 0),
+                int(bool(entry.get("cached", False))),
+            ),
+        )
+        if not cursor.rowcount:
+            return 0
+        sources = entry.get("sources") or []
+        if sources:
+            conn.executemany(
+                "INSERT INTO citations (interaction_id, source_file, chunk, relevance)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, s.get("source", "unknown"), s.get("chunk"), s.get("relevance"))
+                    for s in sources
+                ],
+            )
+        return 1
+
+    @staticmethod
+    def _add_entry_key(conn: sqlite3.Connection) -> None:
+        """
+        Create the unique interaction key, first dropping repeated
+        interactions (and their citations) and keeping the first copy.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                CREATE TEMP TABLE duplicates AS
+                SELECT id FROM interactions WHERE id NOT IN (
+                    SELECT MIN(id) FROM interactions
+                    GROUP BY ts, IFNULL(sender, ''), user_message)
+                """
+            )
+            removed = conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+            conn.execute(
+                "DELETE FROM citations WHERE interaction_id IN (SELECT id FROM duplicates)"
+            )
+            conn.execute("DELETE FROM interactions WHERE id IN (SELECT id FROM duplicates)")
+            conn.execute("DROP TABLE duplicates")
+            conn.execute(_ENTRY_KEY)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if removed:
+            logger.info("Analytics store: removed %d duplicated interactions", removed)
+
+    @staticmethod
+    def _since(days: Optional[int], column: str = "ts") -> tuple[str, tuple]:
+        if not days:
+            return "", ()
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        return f"WHERE {column} >= ?", (cutoff,)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread, reopened after fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def _read_jsonl(path: Path) -> Iterable[dict]:
+    """Entries of a (possibly gzip-compressed) JSONL log, skipping torn lines."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
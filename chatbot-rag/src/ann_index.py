@@ -0,0 +1,218 @@
+"""
+ANN Index — Inverted-File (IVF) Search over the Vector Matrix
+===============================================================
+Approximate nearest-neighbour index for the NumPy vector backend
+(src/numpy_store.py), built in-process with NumPy only:
+
+- k-means splits the vectors into ``nlist`` clusters
+- every matrix row is assigned to its nearest centroid (inverted lists)
+- a query scans the ``nprobe`` closest clusters exactly instead of the
+  whole matrix: roughly nprobe / nlist of the work
+
+Raising ``nprobe`` trades latency for recall (nprobe = nlist is exact
+search). Vectors are not copied or compressed — candidates are read
+from the memory-mapped matrix — so the index costs one int32 per row.
+New rows are assigned to the existing centroids as they arrive; the
+store retrains once the collection has grown well past the size the
+centroids were trained on.
+
+The index is saved next to the matrix (``ivf.npz``) so other workers
+and restarts load it instead of re-running k-means.
+"""
+
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# Training points per centroid (k-means on a sample, not the full matrix)
+TRAIN_POINTS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+# Rows per block when assigning vectors to centroids (bounds the
+# rows × nlist distance matrix held in memory)
+ASSIGN_BLOCK_ROWS = 4096
+
+
+def default_nlist(rows: int) -> int:
+    """Cluster count for ``rows`` vectors when Config.ivf_nlist is 0 (4·√N)."""
+    return max(1, int(4 * math.sqrt(rows)))
+
+
+class IVFIndex:
+    """
+    Inverted lists of matrix rows, one per k-means centroid.
+
+    Usage:
+        index = IVFIndex.train(matrix, live_rows, nlist=256)
+        candidates = index.candidates(query, nprobe=16)   # matrix rows
+        index.extend(matrix, new_rows)                     # rows appended since
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        assignments: np.ndarray,  # centroid of each row 0..n-1 (-1 = none)
+        generation: int,
+        trained_rows: int,
+    ):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.generation = generation  # NumpyVectorStore matrix generation
+        self.trained_rows = trained_rows  # live rows when the centroids were trained
+        self._centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.rows = 0  # rows [0, rows) are assigned (or were deleted)
+        self.lists: list[np.ndarray] = [
+            np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))
+        ]
+        assignments = np.asarray(assignments)
+        assigned = np.flatnonzero(assignments >= 0)
+        self._add(assigned, assignments[assigned])
+        self.rows = len(assignments)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    # ─── Building ────────────────────────────────────────
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        live_rows: np.ndarray,
+        nlist: int,
+        generation: int = 0,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Run k-means on a sample of ``live_rows`` and assign every row of ``matrix``."""
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, len(live_rows)))
+        sample_size = min(len(live_rows), nlist * TRAIN_POINTS_PER_LIST)
+        sample_rows = np.sort(rng.choice(live_rows, size=sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = _nearest(sample, centroids)
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            # Per-cluster sums over the sample sorted by cluster
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+            sums = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts, axis=0)
+            centroids[filled] = sums / counts[filled, None]
+            # Re-seed empty clusters with random sample points
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), size=len(empty))]
+
+        index = cls(centroids, np.empty(0, dtype=np.int32), generation, len(live_rows))
+        index.extend(matrix, len(matrix))
+        return index
+
+    def extend(self, matrix: np.ndarray, stop: int) -> None:
+        """Assign the rows appended to ``matrix`` since the last call, up to ``stop``."""
+        if stop > self.rows:
+            self.assign(matrix, np.arange(self.rows, stop))
+            self.rows = stop
+
+    def assign(self, matrix: np.ndarray, rows: np.ndarray) -> None:
+        """Add ``rows`` of ``matrix`` to the list of their nearest centroid."""
+        if len(rows):
+            self._add(rows, _nearest(matrix[rows], self.centroids, self._centroid_norms))
+
+    def remap(
+        self,
+        old_to_new: np.ndarray,
+        matrix: np.ndarray,
+        live: np.ndarray,
+        generation: int,
+    ) -> None:
+        """
+        Follow a compaction of the matrix: renumber rows through
+        ``old_to_new`` (-1 = row dropped) and assign any ``live`` row of the
+        new matrix that is still in no list.
+        """
+        lists = []
+        covered = np.zeros(len(live), dtype=bool)
+        for members in self.lists:
+            moved = old_to_new[members[members < len(old_to_new)]]
+            moved = np.sort(moved[moved >= 0])
+            covered[moved] = True
+            lists.append(moved)
+        self.lists = lists
+        self.generation = generation
+        self.rows = len(live)
+        self.assign(matrix, np.flatnonzero(live & ~covered))
+
+    # ─── Search ──────────────────────────────────────────
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Matrix rows in the ``nprobe`` clusters closest to ``query``."""
+        distances = self._centroid_norms - 2.0 * (self.centroids @ query)
+        nprobe = min(nprobe, self.nlist)
+        if nprobe < self.nlist:
+            probe = np.argpartition(distances, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.nlist)
+        return np.concatenate([self.lists[i] for i in probe])
+
+    # ─── Persistence ─────────────────────────────────────
+
+    def save(self, path: Path) -> None:
+        """Write centroids and row assignments atomically."""
+        assignments = np.full(self.rows, -1, dtype=np.int32)
+        for i, members in enumerate(self.lists):
+            assignments[members] = i
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assignments=assignments,
+                generation=np.int64(self.generation),
+                trained_rows=np.int64(self.trained_rows),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IVFIndex"]:
+        """The saved index, or None if there is none (or it is unreadable)."""
+        try:
+            with np.load(path) as data:
+                return cls(
+                    data["centroids"],
+                    data["assignments"],
+                    int(data["generation"]),
+                    int(data["trained_rows"]),
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _add(self, rows: np.ndarray, labels: np.ndarray) -> None:
+        if len(rows):
+            order = np.argsort(labels, kind="stable")
+            rows, labels = rows[order], labels[order]
+            bounds = np.flatnonzero(np.diff(labels)) + 1
+            for group in np.split(np.arange(len(rows)), bounds):
+                label = labels[group[0]]
+                self.lists[label] = np.concatenate([self.lists[label], rows[group]])
+
+
+def _nearest(
+    vectors: np.ndarray, centroids: np.ndarray, centroid_norms: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Index of the closest centroid (squared L2) for every vector."""
+    if centroid_norms is None:
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        # ‖v‖² is the same for every centroid, so it does not affect the argmin
+        labels[start:start + len(block)] = np.argmin(
+            centroid_norms - 2.0 * (block @ centroids.T), axis=1
+        )
+    return labels
@@ -0,0 +1,159 @@
+"""
+Answer Cache — Semantic Response Reuse
+========================================
+Reuses a previous LLM answer when a new question is a close paraphrase
+of a cached one (cosine distance between query embeddings) and the
+retriever selected exactly the same chunks for it.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from src.utils import logger
+
+
+@dataclass
+class CachedAnswer:
+    """A stored answer together with what it was generated from."""
+
+    query: str
+    answer: str
+    chunk_ids: tuple[str, ...]
+
+
+class SemanticAnswerCache:
+    """
+    Bounded LRU of (query embedding, chunk IDs) → answer.
+
+    Lookups compare the query embedding against every cached embedding
+    with one matrix-vector product. Entries are tied to the collection
+    version they were generated against; when the vector store changes
+    the whole cache is dropped.
+
+    Usage:
+        cache = SemanticAnswerCache(max_size=512, max_distance=0.08)
+        hit = cache.lookup(query_vec, chunk_ids, version)
+        if hit is None:
+            answer = llm(...)
+            cache.store(query, query_vec, chunk_ids, answer, version)
+    """
+
+    def __init__(self, max_size: int = 512, max_distance: float = 0.08):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+        self._vectors: dict[int, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[int] = []
+        self._next_key = 0
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # ─── Public API ──────────────────────────────────────
+
+    def lookup(
+        self,
+        query_embedding: list[float],
+        chunk_ids: tuple[str, ...],
+        version: int,
+    ) -> Optional[CachedAnswer]:
+        """Return the closest cached answer within max_distance, or None."""
+        query = self._normalize(query_embedding)
+
+        with self._lock:
+            self._check_version(version)
+            if not self._entries or query is None:
+                self.misses += 1
+                return None
+
+            matrix = self._get_matrix()
+            similarities = matrix @ query
+            # Closest first; stop as soon as we leave the distance window
+            for idx in np.argsort(-similarities):
+                if 1.0 - float(similarities[idx]) > self.max_distance:
+                    break
+                key = self._matrix_keys[idx]
+                entry = self._entries[key]
+                if entry.chunk_ids == chunk_ids:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query: str,
+        query_embedding: list[float],
+        chunk_ids: tuple[str, ...],
+        answer: str,
+        version: int,
+    ) -> None:
+        """Cache ``answer`` for this query embedding and chunk selection."""
+        vector = self._normalize(query_embedding)
+        if vector is None:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = CachedAnswer(query=query, answer=answer, chunk_ids=chunk_ids)
+            self._vectors[key] = vector
+            while len(self._entries) > self.max_size:
+                old_key, _ = self._entries.popitem(last=False)
+                del self._vectors[old_key]
+            self._matrix = None
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _check_version(self, version: int) -> None:
+        """Invalidate everything when the underlying collection changed."""
+        if self._version != version:
+            if self._entries:
+                logger.info("Knowledge base changed — answer cache invalidated.")
+            self._clear()
+            self._version = version
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._vectors.clear()
+        self._matrix = None
+        self._matrix_keys = []
+
+    def _get_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.vstack([self._vectors[k] for k in self._matrix_keys])
+        return self._matrix
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> Optional[np.ndarray]:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(arr))
+        if norm == 0.0:
+            return None
+        return arr / norm
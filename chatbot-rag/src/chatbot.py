@@ -5,15 +5,25 @@ Ties everything together: retrieval, LLM generation with context,
 conversational memory, source citation, and metrics tracking.
 """
 
-from dataclasses import dataclass
-from typing import Optional
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Iterator, Optional
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 from src.retriever import RAGRetriever, RetrievalResponse
 from src.embeddings_manager import EmbeddingsManager
+from src.index_manifest import ManifestEntry, SyncReport, file_sha256
+from src.ingestion import IngestionPipeline
 from src.document_loader import DocumentLoader
+from src.analytics_store import ANALYTICS_FILE_NAME, AnalyticsStore
+from src.answer_cache import SemanticAnswerCache
+from src.latency import RequestTimer
+from src.session_store import ConversationSession, SessionStore
 from src.utils import (
     Config,
     ConversationLogger,
@@ -38,6 +48,10 @@ CONTEXTO DE DOCUMENTOS:
 {context}
 """
 
+LLM_ERROR_MESSAGE = (
+    "Lo siento, hubo un error al procesar tu pregunta. Por favor, intenta nuevamente."
+)
+
 # ─── Response Model ─────────────────────────────────────
 @dataclass
 class ChatResponse:
@@ -49,14 +63,17 @@ class ChatResponse:
     response_time: float
     docs_consulted: int
     is_confident: bool  # True if confidence >= threshold
+    cached: bool = False  # True if served from the semantic answer cache
+    spans: list[dict] = field(default_factory=list)  # per-stage timings, see src/latency.py
     feedback: Optional[str] = None  # User feedback: 👍 or 👎
 
 
 class RAGChatbot:
     """
     Production-ready RAG chatbot with:
-    - Conversational memory (sliding window)
+    - Per-session conversational memory (sliding window)
     - Source citation
+    - Semantic answer cache for paraphrased questions
     - Confidence scoring
     - Metrics tracking
     - Conversation logging
@@ -64,33 +81,57 @@ class RAGChatbot:
     Usage:
         chatbot = RAGChatbot()
         chatbot.load_sample_documents()
-        response = chatbot.chat("¿Cómo instalo BillEasy en Windows?")
+        response = chatbot.chat("¿Cómo instalo BillEasy en Windows?", session_id="user-1")
         print(response.answer)
         print(response.sources)
     """
 
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(self, config: Optional[Config] = None, defer_store: bool = False):
         self.config = config or Config()
 
-        # Core components
+        # Core components (defer_store: see EmbeddingsManager / src/preload.py)
         self.doc_loader = DocumentLoader(self.config)
-        self.em = EmbeddingsManager(self.config)
+        self.em = EmbeddingsManager(self.config, defer_store=defer_store)
         self.retriever = RAGRetriever(self.em, self.config)
+        self.ingestion = IngestionPipeline(self.em, self.config)
 
         # LLM
-        self.llm = ChatOpenAI(
-            model=self.config.model_name,
-            temperature=self.config.temperature,
-            max_tokens=self.config.max_tokens,
-            openai_api_key=self.config.openai_api_key,
-        )
+        self.llm = self._create_llm()
+
+        # Memory — one sliding window per session, LRU + TTL bounded
+        self.sessions = SessionStore(self.config)
 
-        # Memory — simple list of (role, content) limited to window size
-        self.memory: list[dict] = []
+        # Semantic answer cache — skips the LLM for paraphrased FAQs
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        if self.config.answer_cache_size > 0:
+            self.answer_cache = SemanticAnswerCache(
+                max_size=self.config.answer_cache_size,
+                max_distance=self.config.answer_cache_max_distance,
+            )
+
+        # Serializes incremental re-indexing runs
+        self._sync_lock = threading.Lock()
 
         # Logging & metrics
-        self.conv_logger = ConversationLogger()
-        self.metrics = MetricsTracker()
+        self.analytics = (
+            AnalyticsStore(
+                os.getenv("ANALYTICS_DB_PATH")
+                or Path(self.config.logs_dir) / ANALYTICS_FILE_NAME
+            )
+            if self.config.analytics_store
+            else None
+        )
+        self.conv_logger = ConversationLogger(
+            log_dir=Path(self.config.logs_dir),
+            max_bytes=int(self.config.conversation_log_max_mb * 1024 * 1024),
+            rotate_daily=self.config.conversation_log_rotate_daily,
+            compress=self.config.conversation_log_compress,
+            analytics=self.analytics,
+        )
+        self.metrics = MetricsTracker(
+            Path(self.config.metrics_dir),
+            low_confidence_threshold=self.config.confidence_threshold,
+        )
 
         logger.info(
             "RAGChatbot initialized — model=%s, temp=%.1f, memory_window=%d",
@@ -99,59 +140,157 @@ class RAGChatbot:
             self.config.memory_window,
         )
 
+    def _create_llm(self) -> ChatOpenAI:
+        return ChatOpenAI(
+            model=self.config.model_name,
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens,
+            openai_api_key=self.config.openai_api_key,
+        )
+
+    def reset_after_fork(self) -> None:
+        """
+        Prepare a preloaded chatbot for use in a forked server worker.
+
+        The index, caches and documents built in the parent are inherited
+        copy-on-write; network/DB clients are re-opened and per-worker
+        mutable state (sessions, metrics) starts fresh.
+        """
+        self.em.reset_after_fork()
+        self.llm = self._create_llm()
+        self.sessions = SessionStore(self.config)
+        self.metrics = MetricsTracker(
+            Path(self.config.metrics_dir),
+            low_confidence_threshold=self.config.confidence_threshold,
+        )
+        self._sync_lock = threading.Lock()
+        logger.info("RAGChatbot reset for worker pid=%d", os.getpid())
+
     # ─── Chat ────────────────────────────────────────────
 
-    def chat(self, user_message: str) -> ChatResponse:
+    def chat(
+        self, user_message: str, session_id: Optional[str] = None
+    ) -> ChatResponse:
         """
         Process a user message through the full RAG pipeline.
 
+        Args:
+            user_message: The user's question.
+            session_id: Conversation key (e.g. WhatsApp sender). Each key
+                gets its own memory window; None uses a shared default.
+
         Steps:
             1. Start metrics timer
             2. Retrieve relevant documents
-            3. Build prompt with context + memory
-            4. Generate LLM response
+            3. Look up the semantic answer cache
+            4. On a miss, build prompt with context + memory and generate
             5. Update memory
             6. Log interaction & record metrics
             7. Return structured response
         """
-        # 1. Start timer
-        self.metrics.start_timer()
+        # 1. Start timer (one per request)
+        timer = self.metrics.timer()
 
         # 2. Retrieve context
-        retrieval = self.retriever.retrieve(user_message)
+        with timer.stage("retrieval"):
+            retrieval = self.retriever.retrieve(user_message)
+
+        # 3. Reuse a cached answer for a paraphrase over the same chunks
+        session = self.sessions.get(session_id)
+        answer = self._cached_answer(retrieval, session)
+        cache_hit = answer is not None
+
+        if not cache_hit:
+            # 4. Build prompt & generate response
+            with timer.stage("context"):
+                context_text = retrieval.get_context_text()
+            with timer.stage("prompt"):
+                messages = self._build_messages(user_message, context_text, session.messages)
+            try:
+                with timer.stage("llm"):
+                    llm_response = self.llm.invoke(messages)
+                answer = llm_response.content
+                self._cache_answer(user_message, retrieval, session, answer)
+            except Exception as e:
+                logger.error("LLM generation failed: %s", e)
+                answer = LLM_ERROR_MESSAGE
 
-        # 3. Build prompt
-        context_text = retrieval.get_context_text()
-        messages = self._build_messages(user_message, context_text)
+        # 5. Update memory
+        session.add_exchange(user_message, answer)
 
-        # 4. Generate response
-        try:
-            llm_response = self.llm.invoke(messages)
-            answer = llm_response.content
-        except Exception as e:
-            logger.error("LLM generation failed: %s", e)
-            answer = "Lo siento, hubo un error al procesar tu pregunta. Por favor, intenta nuevamente."
+        # 6–7. Record metrics & log, build response
+        return self._finalize(user_message, answer, retrieval, timer, cache_hit, session_id)
 
-        # 5. Update memory
-        self._update_memory(user_message, answer)
+    async def achat(
+        self, user_message: str, session_id: Optional[str] = None
+    ) -> ChatResponse:
+        """
+        Async variant of chat for event-loop servers (FastAPI/uvicorn).
+
+        Embedding and generation go through the async OpenAI clients;
+        ChromaDB queries and log/metrics writes run in the thread pool,
+        so many requests can be in flight on a single worker.
+        """
+        timer = self.metrics.timer()
+
+        with timer.stage("retrieval"):
+            retrieval = await self.retriever.aretrieve(user_message)
+
+        session = self.sessions.get(session_id)
+        answer = self._cached_answer(retrieval, session)
+        cache_hit = answer is not None
+
+        if not cache_hit:
+            with timer.stage("context"):
+                context_text = retrieval.get_context_text()
+            with timer.stage("prompt"):
+                messages = self._build_messages(user_message, context_text, session.messages)
+            try:
+                with timer.stage("llm"):
+                    llm_response = await self.llm.ainvoke(messages)
+                answer = llm_response.content
+                self._cache_answer(user_message, retrieval, session, answer)
+            except Exception as e:
+                logger.error("LLM generation failed: %s", e)
+                answer = LLM_ERROR_MESSAGE
+
+        session.add_exchange(user_message, answer)
+
+        timer.stop()
+        return await asyncio.to_thread(
+            self._finalize, user_message, answer, retrieval, timer, cache_hit, session_id
+        )
 
-        # 6. Record metrics & log
-        elapsed = self.metrics.elapsed()
+    def _finalize(
+        self,
+        user_message: str,
+        answer: str,
+        retrieval: RetrievalResponse,
+        timer: RequestTimer,
+        cache_hit: bool = False,
+        session_id: Optional[str] = None,
+    ) -> ChatResponse:
+        """Record metrics, log the interaction and build the ChatResponse."""
+        elapsed = timer.stop()
         confidence = retrieval.avg_confidence
         sources = retrieval.get_sources_summary()
         docs_consulted = retrieval.docs_consulted
 
-        self.metrics.record(elapsed, confidence, docs_consulted)
-        self.conv_logger.log(
-            user_message=user_message,
-            assistant_response=answer,
-            sources=sources,
-            confidence=confidence,
-            response_time=elapsed,
-            docs_consulted=docs_consulted,
+        with timer.stage("logging"):
+            self.conv_logger.log(
+                user_message=user_message,
+                assistant_response=answer,
+                sources=sources,
+                confidence=confidence,
+                response_time=elapsed,
+                docs_consulted=docs_consulted,
+                session_id=session_id,
+                cached=cache_hit,
+            )
+        self.metrics.record(
+            elapsed, confidence, docs_consulted, cache_hit=cache_hit, stages=timer.stages
         )
 
-        # 7. Build response
         return ChatResponse(
             answer=answer,
             sources=sources,
@@ -159,7 +298,181 @@ class RAGChatbot:
             response_time=elapsed,
             docs_consulted=docs_consulted,
             is_confident=confidence >= self.config.confidence_threshold,
+            cached=cache_hit,
+            spans=[span.to_dict() for span in sorted(timer.spans, key=lambda s: s.start)],
+        )
+
+    # ─── Answer Cache ────────────────────────────────────
+
+    def _cached_answer(
+        self, retrieval: RetrievalResponse, session: ConversationSession
+    ) -> Optional[str]:
+        """Return a cached answer for this retrieval, if one applies."""
+        if not self._answer_cache_applies(retrieval, session):
+            return None
+        hit = self.answer_cache.lookup(
+            retrieval.query_embedding,
+            retrieval.chunk_ids,
+            self.em.collection_version,
+        )
+        if hit is None:
+            return None
+        logger.info("Answer cache hit — reusing answer to '%s'", hit.query[:60])
+        return hit.answer
+
+    def _cache_answer(
+        self,
+        user_message: str,
+        retrieval: RetrievalResponse,
+        session: ConversationSession,
+        answer: str,
+    ) -> None:
+        """Store a freshly generated answer for future paraphrases."""
+        if not answer or not self._answer_cache_applies(retrieval, session):
+            return
+        self.answer_cache.store(
+            user_message,
+            retrieval.query_embedding,
+            retrieval.chunk_ids,
+            answer,
+            self.em.collection_version,
+        )
+
+    def _answer_cache_applies(
+        self, retrieval: RetrievalResponse, session: ConversationSession
+    ) -> bool:
+        # Answers that depend on earlier turns are not reusable, so only
+        # the first message of a conversation goes through the cache.
+        return (
+            self.answer_cache is not None
+            and retrieval.query_embedding is not None
+            and bool(retrieval.results)
+            and len(session) == 0
+        )
+
+    # ─── Streaming ───────────────────────────────────────
+
+    def chat_stream(
+        self, user_message: str, session_id: Optional[str] = None
+    ) -> Iterator[dict]:
+        """
+        Streaming variant of chat.
+
+        Yields events as they become available:
+            {"type": "retrieval", ...}  sources/confidence, before generation
+            {"type": "token", "content": str}  one per LLM chunk
+            {"type": "done", "response": ChatResponse, "time_to_first_token": float}
+        """
+        timer = self.metrics.timer()
+
+        with timer.stage("retrieval"):
+            retrieval = self.retriever.retrieve(user_message)
+        yield self._retrieval_event(retrieval)
+
+        session = self.sessions.get(session_id)
+        answer = self._cached_answer(retrieval, session)
+        cache_hit = answer is not None
+
+        ttft: Optional[float] = None
+        if cache_hit:
+            ttft = timer.elapsed
+            yield {"type": "token", "content": answer}
+        else:
+            with timer.stage("context"):
+                context_text = retrieval.get_context_text()
+            with timer.stage("prompt"):
+                messages = self._build_messages(user_message, context_text, session.messages)
+            parts: list[str] = []
+            generation_started = timer.elapsed
+            try:
+                for chunk in self.llm.stream(messages):
+                    if not chunk.content:
+                        continue
+                    if ttft is None:
+                        ttft = timer.elapsed
+                        timer.add("llm_ttft", ttft - generation_started, start=generation_started)
+                    parts.append(chunk.content)
+                    yield {"type": "token", "content": chunk.content}
+                answer = "".join(parts)
+                self._cache_answer(user_message, retrieval, session, answer)
+            except Exception as e:
+                logger.error("LLM streaming failed: %s", e)
+                if not parts:
+                    parts.append(LLM_ERROR_MESSAGE)
+                    yield {"type": "token", "content": LLM_ERROR_MESSAGE}
+                answer = "".join(parts)
+            # Generation time, including time the client took to read tokens
+            timer.add("llm", timer.elapsed - generation_started, start=generation_started)
+
+        session.add_exchange(user_message, answer)
+
+        response = self._finalize(
+            user_message, answer, retrieval, timer, cache_hit, session_id
+        )
+        yield {"type": "done", "response": response, "time_to_first_token": ttft}
+
+    async def achat_stream(
+        self, user_message: str, session_id: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Async variant of chat_stream (same event sequence)."""
+        timer = self.metrics.timer()
+
+        with timer.stage("retrieval"):
+            retrieval = await self.retriever.aretrieve(user_message)
+        yield self._retrieval_event(retrieval)
+
+        session = self.sessions.get(session_id)
+        answer = self._cached_answer(retrieval, session)
+        cache_hit = answer is not None
+
+        ttft: Optional[float] = None
+        if cache_hit:
+            ttft = timer.elapsed
+            yield {"type": "token", "content": answer}
+        else:
+            with timer.stage("context"):
+                context_text = retrieval.get_context_text()
+            with timer.stage("prompt"):
+                messages = self._build_messages(user_message, context_text, session.messages)
+            parts: list[str] = []
+            generation_started = timer.elapsed
+            try:
+                async for chunk in self.llm.astream(messages):
+                    if not chunk.content:
+                        continue
+                    if ttft is None:
+                        ttft = timer.elapsed
+                        timer.add("llm_ttft", ttft - generation_started, start=generation_started)
+                    parts.append(chunk.content)
+                    yield {"type": "token", "content": chunk.content}
+                answer = "".join(parts)
+                self._cache_answer(user_message, retrieval, session, answer)
+            except Exception as e:
+                logger.error("LLM streaming failed: %s", e)
+                if not parts:
+                    parts.append(LLM_ERROR_MESSAGE)
+                    yield {"type": "token", "content": LLM_ERROR_MESSAGE}
+                answer = "".join(parts)
+            # Generation time, including time the client took to read tokens
+            timer.add("llm", timer.elapsed - generation_started, start=generation_started)
+
+        session.add_exchange(user_message, answer)
+
+        timer.stop()
+        response = await asyncio.to_thread(
+            self._finalize, user_message, answer, retrieval, timer, cache_hit, session_id
         )
+        yield {"type": "done", "response": response, "time_to_first_token": ttft}
+
+    def _retrieval_event(self, retrieval: RetrievalResponse) -> dict:
+        """First streaming event: what was retrieved, before any token."""
+        return {
+            "type": "retrieval",
+            "sources": retrieval.get_sources_summary(),
+            "confidence": retrieval.avg_confidence,
+            "docs_consulted": retrieval.docs_consulted,
+            "is_confident": retrieval.avg_confidence >= self.config.confidence_threshold,
+        }
 
     # ─── Document Management ─────────────────────────────
 
@@ -169,17 +482,100 @@ class RAGChatbot:
             logger.warning("Sample docs directory not found: %s", DATA_DIR)
             return 0
 
-        chunks = self.doc_loader.load_directory(DATA_DIR)
-        if chunks:
-            return self.em.add_documents(chunks)
-        return 0
+        with self._sync_lock:
+            return self.ingestion.ingest_directory(DATA_DIR).chunks_embedded
 
     def load_documents_from_path(self, path: str) -> int:
         """Load documents from a custom directory path."""
-        chunks = self.doc_loader.load_directory(path)
-        if chunks:
-            return self.em.add_documents(chunks)
-        return 0
+        with self._sync_lock:
+            return self.ingestion.ingest_directory(path).chunks_embedded
+
+    def sync_directory(self, dir_path: Optional[str | Path] = None) -> SyncReport:
+        """
+        Incrementally re-index a directory (defaults to data/sample_docs/).
+
+        Uses the index manifest to skip files whose size/mtime (or, failing
+        that, content hash) are unchanged. New and changed files are
+        re-chunked and only their new chunks embedded, and the chunks they
+        kept get their positions (chunk_index/total_chunks) rewritten;
+        chunks of changed or removed files that no longer exist are deleted.
+        """
+        dir_path = Path(dir_path or DATA_DIR)
+        manifest = self.em.manifest
+        report = SyncReport()
+
+        with self._sync_lock:
+            seen: set[str] = set()
+            changed: list[tuple[Path, os.stat_result, str, Optional[ManifestEntry]]] = []
+            for file in self.doc_loader.list_files(dir_path):
+                seen.add(str(file.resolve()))
+                stat = file.stat()
+                entry = manifest.get(file)
+
+                if entry and manifest.stat_matches(entry, stat):
+                    report.unchanged_files += 1
+                    continue
+
+                sha256 = file_sha256(file)
+                if entry and entry.sha256 == sha256:
+                    # Touched but identical — just refresh the stat info
+                    entry.mtime, entry.size = stat.st_mtime, stat.st_size
+                    report.unchanged_files += 1
+                    continue
+
+                changed.append((file, stat, sha256, entry))
+
+            # New/changed files go through the parallel ingestion pipeline
+            ingest = self.ingestion.ingest_files(
+                [file for file, *_ in changed], update_existing=True
+            )
+            report.chunks_added = ingest.chunks_embedded
+
+            for file, stat, sha256, entry in changed:
+                chunk_ids = ingest.chunk_ids.get(str(file))
+                if chunk_ids is None:
+                    report.failed_files.append(file.name)
+                    continue
+
+                if entry:
+                    stale = sorted(set(entry.chunk_ids) - set(chunk_ids))
+                    report.chunks_deleted += self.em.delete_documents(stale)
+                    report.updated_files.append(file.name)
+                else:
+                    report.added_files.append(file.name)
+
+                manifest.set(
+                    file,
+                    ManifestEntry(
+                        mtime=stat.st_mtime,
+                        size=stat.st_size,
+                        sha256=sha256,
+                        chunk_ids=chunk_ids,
+                    ),
+                )
+
+            # Files that disappeared since the last sync
+            for key in manifest.files_under(dir_path):
+                if key in seen:
+                    continue
+                entry = manifest.remove(key)
+                report.chunks_deleted += self.em.delete_documents(entry.chunk_ids)
+                report.removed_files.append(Path(key).name)
+
+            manifest.save()
+
+        logger.info(
+            "Sync of %s — added=%d, updated=%d, removed=%d, unchanged=%d, "
+            "chunks +%d/-%d",
+            dir_path.name,
+            len(report.added_files),
+            len(report.updated_files),
+            len(report.removed_files),
+            report.unchanged_files,
+            report.chunks_added,
+            report.chunks_deleted,
+        )
+        return report
 
     def load_uploaded_file(self, file_content: bytes, filename: str) -> int:
         """Process an uploaded file (from Streamlit)."""
@@ -192,14 +588,16 @@ class RAGChatbot:
 
     # ─── Memory ──────────────────────────────────────────
 
-    def _build_messages(self, user_message: str, context: str) -> list:
+    def _build_messages(
+        self, user_message: str, context: str, history: Iterable[dict] = ()
+    ) -> list:
         """Build the full message list for the LLM."""
         messages = [
             SystemMessage(content=SYSTEM_PROMPT.format(context=context))
         ]
 
         # Add conversation history
-        for msg in self.memory:
+        for msg in list(history):
             if msg["role"] == "user":
                 messages.append(HumanMessage(content=msg["content"]))
             else:
@@ -209,20 +607,17 @@ class RAGChatbot:
         messages.append(HumanMessage(content=user_message))
         return messages
 
-    def _update_memory(self, user_message: str, assistant_response: str) -> None:
-        """Add exchange to memory, trimming to window size."""
-        self.memory.append({"role": "user", "content": user_message})
-        self.memory.append({"role": "assistant", "content": assistant_response})
-
-        # Keep only the last N exchanges (each exchange = 2 messages)
-        max_messages = self.config.memory_window * 2
-        if len(self.memory) > max_messages:
-            self.memory = self.memory[-max_messages:]
+    def get_history(self, session_id: Optional[str] = None) -> list[dict]:
+        """Return the remembered messages for a session."""
+        return self.sessions.history(session_id)
 
-    def clear_memory(self) -> None:
-        """Reset conversation memory."""
-        self.memory.clear()
-        logger.info("Conversation memory cleared.")
+    def clear_memory(self, session_id: Optional[str] = None) -> None:
+        """Reset one session's memory, or all sessions when session_id is None."""
+        self.sessions.clear(session_id)
+        if session_id is None:
+            logger.info("Conversation memory cleared for all sessions.")
+        else:
+            logger.info("Conversation memory cleared for session %s.", session_id)
 
     # ─── State ───────────────────────────────────────────
 
@@ -236,10 +631,14 @@ class RAGChatbot:
         """Return current chatbot status and stats."""
         return {
             "documents_loaded": self.em.document_count,
-            "memory_messages": len(self.memory),
+            "memory_messages": self.sessions.total_messages,
+            "active_sessions": self.sessions.active_sessions,
             "config": self.config.to_dict(),
             "metrics": self.metrics.summary(),
             "collection_stats": self.em.get_collection_stats(),
+            "answer_cache": (
+                self.answer_cache.stats() if self.answer_cache is not None else None
+            ),
         }
 
     def record_feedback(self, response: ChatResponse, feedback: str) -> None:
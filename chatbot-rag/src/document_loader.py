@@ -5,6 +5,7 @@ Loads PDF, TXT, DOCX, and Markdown files, then splits them into
 semantically coherent chunks for embedding.
 """
 
+import hashlib
 from pathlib import Path
 from typing import Optional
 
@@ -29,6 +30,17 @@ LOADER_MAP = {
 SUPPORTED_EXTENSIONS = set(LOADER_MAP.keys())
 
 
+def make_chunk_id(source_file: str, text: str) -> str:
+    """
+    Deterministic chunk ID: hash of the source file name + chunk text.
+
+    The same chunk always maps to the same ID, so re-ingesting an
+    unchanged document is an idempotent upsert instead of a duplicate.
+    """
+    digest = hashlib.sha256(f"{source_file}\x00{text}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
 class DocumentLoader:
     """
     Loads documents from disk, enriches them with metadata,
@@ -110,10 +122,11 @@ class DocumentLoader:
         # Split into chunks
         chunks = self.text_splitter.split_documents(raw_docs)
 
-        # Add chunk indices
+        # Add chunk indices and content-hash IDs
         for i, chunk in enumerate(chunks):
             chunk.metadata["chunk_index"] = i
             chunk.metadata["total_chunks"] = len(chunks)
+            chunk.id = make_chunk_id(file_path.name, chunk.page_content)
 
         logger.info(
             "Loaded %s → %d raw docs → %d chunks",
@@ -134,14 +147,8 @@ class DocumentLoader:
             Combined list of Document chunks from all files.
         """
         dir_path = Path(dir_path)
-        if not dir_path.is_dir():
-            raise NotADirectoryError(f"Not a directory: {dir_path}")
-
         all_chunks: list[Document] = []
-        files = sorted(
-            f for f in dir_path.iterdir()
-            if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS
-        )
+        files = self.list_files(dir_path)
 
         if not files:
             logger.warning("No supported files found in %s", dir_path)
@@ -167,6 +174,22 @@ class DocumentLoader:
         )
         return all_chunks
 
+    @staticmethod
+    def list_files(dir_path: str | Path) -> list[Path]:
+        """
+        Supported files directly inside a directory, sorted by name.
+
+        Raises:
+            NotADirectoryError: If ``dir_path`` is not a directory.
+        """
+        dir_path = Path(dir_path)
+        if not dir_path.is_dir():
+            raise NotADirectoryError(f"Not a directory: {dir_path}")
+        return sorted(
+            f for f in dir_path.iterdir()
+            if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+
     def load_uploaded_file(
         self, file_content: bytes, filename: str, save_dir: str | Path
     ) -> list[Document]:
@@ -0,0 +1,159 @@
+"""
+Embedding Backends — OpenAI or Local CPU Models
+=================================================
+Selects the embedding implementation from ``Config.embedding_model``:
+
+- ``text-embedding-3-small`` (any other name) → OpenAI API
+- ``hashing`` / ``hashing:<dim>``             → feature hashing, no download
+- ``local:<model>``                           → sentence-transformers on CPU
+
+Every backend is a LangChain ``Embeddings`` so ChromaDB and the rest of
+the pipeline do not care which one is in use.
+"""
+
+import zlib
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.lexical_index import fold, tokenize
+from src.utils import Config, logger
+
+HASHING_PREFIX = "hashing"
+LOCAL_PREFIX = "local:"
+HASHING_DEFAULT_DIM = 512
+
+# Character n-gram sizes hashed alongside whole words, so typos and
+# inflections ("limpieza" / "limpiezas") still share features
+HASHING_CHAR_NGRAMS = (3, 4)
+
+
+def is_local_model(model_name: str) -> bool:
+    """True when ``model_name`` selects an in-process (offline) backend."""
+    return model_name.startswith(HASHING_PREFIX) or model_name.startswith(LOCAL_PREFIX)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-features embeddings via the hashing trick.
+
+    Words and character n-grams are hashed (CRC32) into ``dim`` signed
+    buckets, weighted with sublinear TF and L2-normalized. No model and
+    no network: quality is lexical rather than semantic, but latency is
+    predictable and the whole pipeline runs offline.
+
+    Usage:
+        embeddings = HashingEmbeddings(dim=512)
+        vectors = embeddings.embed_documents(["Precio de la limpieza dental"])
+    """
+
+    def __init__(self, dim: int = HASHING_DEFAULT_DIM):
+        if dim <= 0:
+            raise ValueError(f"Hashing embedding dimension must be positive, got {dim}")
+        self.dim = dim
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.encode([text])[0].tolist()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encode a batch into a (len(texts), dim) float32 matrix."""
+        rows: list[int] = []
+        buckets: list[int] = []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                rows.append(row)
+                buckets.append(zlib.crc32(feature.encode("utf-8")))
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not rows:
+            return matrix
+
+        hashes = np.asarray(buckets, dtype=np.uint32)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(matrix, (np.asarray(rows), hashes % self.dim), signs)
+
+        # Sublinear TF, then unit length so cosine == dot product
+        np.copyto(matrix, np.sign(matrix) * np.log1p(np.abs(matrix)))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    @staticmethod
+    def _features(text: str) -> list[str]:
+        words = tokenize(text)
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f"<{fold(word)}>"
+            for n in HASHING_CHAR_NGRAMS:
+                features.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+        return features
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Local sentence-transformers model (optional dependency).
+
+    Encodes in batches on CPU and returns normalized vectors. The model
+    is downloaded once into the Hugging Face cache on first use.
+
+    Usage:
+        embeddings = SentenceTransformerEmbeddings("all-MiniLM-L6-v2")
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                f"embedding_model '{LOCAL_PREFIX}{model_name}' requires the "
+                "'sentence-transformers' package: pip install sentence-transformers"
+            ) from e
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.encode([text])[0].tolist()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+
+
+def create_embeddings(config: Optional[Config] = None) -> Embeddings:
+    """Build the embedding backend named by ``config.embedding_model``."""
+    config = config or Config()
+    name = config.embedding_model
+
+    if name.startswith(HASHING_PREFIX):
+        _, _, dim = name.partition(":")
+        try:
+            embeddings = HashingEmbeddings(int(dim) if dim else HASHING_DEFAULT_DIM)
+        except ValueError as e:
+            raise ValueError(f"Invalid embedding_model '{name}': {e}") from e
+        logger.info("Using local hashing embeddings (dim=%d)", embeddings.dim)
+        return embeddings
+
+    if name.startswith(LOCAL_PREFIX):
+        model_name = name[len(LOCAL_PREFIX):]
+        logger.info("Loading local embedding model '%s'...", model_name)
+        return SentenceTransformerEmbeddings(
+            model_name, batch_size=config.embedding_batch_size
+        )
+
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=name, openai_api_key=config.openai_api_key)
@@ -0,0 +1,279 @@
+"""
+Embedding Cache — Query Vector Reuse
+======================================
+Two-tier cache for query embeddings: an in-process LRU with TTL and
+an optional, size-capped SQLite tier on disk that survives restarts
+(written behind the request path). Keys are the normalized query text,
+namespaced by embedding model.
+"""
+
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from src.utils import logger
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as cache key: NFKC, case-folded, single-spaced."""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+class EmbeddingCache:
+    """
+    normalized text → embedding vector.
+
+    - Memory tier: LRU bounded by ``max_size`` entries, each valid for
+      ``ttl`` seconds (0 disables expiry).
+    - Disk tier (optional): SQLite table keyed by a hash of model + text.
+      Embeddings are deterministic per model, so disk entries do not
+      expire; the table is capped at ``disk_max_entries`` rows, oldest
+      evicted first.
+
+    put() only touches memory: new vectors are written to disk behind the
+    request by a background thread, in batches of one transaction. The
+    memory lock is never held during disk I/O.
+
+    Usage:
+        cache = EmbeddingCache("text-embedding-3-small", db_path=path)
+        vector = cache.get(query)
+        if vector is None:
+            vector = embeddings.embed_query(query)
+            cache.put(query, vector)
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_size: int = 2048,
+        ttl: float = 0.0,
+        db_path: Optional[Path] = None,
+        disk_max_entries: int = 100_000,
+        write_interval: float = 0.5,
+    ):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.write_interval = write_interval
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Disk tier: connection guarded by its own lock; vectors waiting
+        # for the writer thread, by disk key
+        self.db_path = Path(db_path) if db_path is not None else None
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: dict[str, bytes] = {}
+        self._wake = threading.Event()
+        self._writer_pid: Optional[int] = None
+        self._disk_rows = 0
+        if self.db_path is not None:
+            self._db = self._open_db(self.db_path)
+            atexit.register(self.flush)
+
+    # ─── Public API ──────────────────────────────────────
+
+    def get(self, text: str, disk: bool = True) -> Optional[list[float]]:
+        """
+        Return the cached vector for ``text``, or None on a miss.
+
+        ``disk=False`` looks in memory only (never blocks on I/O); a miss
+        is then not counted, so the caller can retry with the disk tier.
+        """
+        key = normalize_query(text)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, vector = entry
+                if not self.ttl or now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+            if not disk and self._db is not None:
+                return None
+
+        vector = self._db_get(key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self._remember(key, vector, now)
+            self.hits += 1
+            self.disk_hits += 1
+            return vector
+
+    def put(self, text: str, vector: list[float]) -> None:
+        """Store ``vector`` for ``text`` in memory, and queue it for the disk tier."""
+        key = normalize_query(text)
+        with self._lock:
+            self._remember(key, list(vector), time.monotonic())
+            if self._db is None:
+                return
+            self._pending[self._disk_key(key)] = array("f", vector).tobytes()
+        self._start_writer()
+
+    def flush(self) -> None:
+        """Write queued vectors to the disk tier now."""
+        if self._db is None or self._writer_pid not in (None, os.getpid()):
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            self._db_put_many(pending)
+
+    def clear(self) -> None:
+        """Drop all entries from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM query_embeddings WHERE model = ?", (self.namespace,))
+                self._db.commit()
+                self._disk_rows = self._count_rows()
+
+    def reopen(self) -> None:
+        """Open a new disk-tier connection (after fork; SQLite handles are per process)."""
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}  # the parent writes its own queue
+        self._writer_pid = None
+        if self.db_path is not None:
+            self._db = self._open_db(self.db_path)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "persistent": self._db is not None,
+            "disk_size": self._disk_rows,
+            "disk_pending": len(self._pending),
+        }
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _remember(self, key: str, vector: list[float], now: float) -> None:
+        self._entries[key] = (now, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _disk_key(self, key: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\x00{key}".encode("utf-8")).hexdigest()
+
+    def _start_writer(self) -> None:
+        # Threads do not survive fork(): one writer per process
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+        threading.Thread(target=self._write_loop, name="embedding-cache", daemon=True).start()
+
+    def _write_loop(self) -> None:
+        pid = os.getpid()
+        while self._writer_pid == pid:
+            self._wake.wait(self.write_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _open_db(self, db_path: Path) -> Optional[sqlite3.Connection]:
+        try:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_created"
+                " ON query_embeddings (created_at)"
+            )
+            db.commit()
+            self._disk_rows = db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            return db
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache disk tier disabled (%s): %s", db_path, e)
+            return None
+
+    def _count_rows(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+    def _db_get(self, key: str) -> Optional[list[float]]:
+        if self._db is None:
+            return None
+        disk_key = self._disk_key(key)
+        with self._lock:
+            queued = self._pending.get(disk_key)
+        if queued is not None:
+            return array("f", queued).tolist()
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE key = ?", (disk_key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache read failed: %s", e)
+            return None
+        if row is None:
+            return None
+        return array("f", row[0]).tolist()
+
+    def _db_put_many(self, vectors: dict[str, bytes]) -> None:
+        """Insert a batch in one transaction, then evict beyond ``disk_max_entries``."""
+        now = time.time()
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO query_embeddings (key, model, vector, created_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    [(key, self.namespace, blob, now) for key, blob in vectors.items()],
+                )
+                self._db.commit()
+                self._disk_rows += len(vectors)
+                # Recount only when the estimate (other workers write too) says full
+                if self.disk_max_entries and self._disk_rows > self.disk_max_entries:
+                    self._disk_rows = self._count_rows()
+                    excess = self._disk_rows - self.disk_max_entries
+                    if excess > 0:
+                        self._db.execute(
+                            "DELETE FROM query_embeddings WHERE key IN ("
+                            " SELECT key FROM query_embeddings ORDER BY created_at LIMIT ?)",
+                            (excess,),
+                        )
+                        self._db.commit()
+                        self._disk_rows -= excess
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache write of %d vectors failed: %s", len(vectors), e)
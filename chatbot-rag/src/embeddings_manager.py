@@ -1,50 +1,136 @@
 """
 Embeddings Manager — Vector Store with ChromaDB
 =================================================
-Manages document embeddings using OpenAI's text-embedding-3-small
-and persists them in a ChromaDB collection.
+Manages document embeddings (OpenAI's text-embedding-3-small by default,
+or a local backend — see embedding_backends) and persists them in a
+ChromaDB collection or a memory-mapped NumPy matrix (see vector_stores).
 """
 
+import asyncio
+import os
+import random
+import threading
+import time
 from pathlib import Path
 from typing import Optional
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 
+from src.document_loader import make_chunk_id
+from src.embedding_backends import create_embeddings, is_local_model
+from src.embedding_cache import EmbeddingCache
+from src.index_manifest import IndexManifest
+from src.latency import span
+from src.lexical_index import BM25Index
 from src.utils import Config, logger, VECTORSTORE_DIR
+from src.vector_stores import (
+    ChromaVectorStore,
+    VectorStore,
+    Where,
+    create_vector_store,
+    reset_vector_store_after_fork,
+    where_key,
+)
+
+# Page size when reading the collection to build the BM25 index
+LEXICAL_BUILD_PAGE = 5000
+
+# Distinct metadata filters whose matching chunk IDs are kept for BM25
+FILTER_ID_CACHE_SIZE = 64
+
+# HTTP statuses worth retrying when embedding (rate limit / transient)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError"}
+EMBEDDING_RETRY_MAX_DELAY = 60.0
+
+
+def _is_retryable(error: Exception) -> bool:
+    """True for rate-limit / transient API errors (checked by name and status)."""
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
 
 
 class EmbeddingsManager:
     """
-    Wraps ChromaDB + OpenAI embeddings for storing and querying
+    Wraps a vector store backend + an embedding backend for storing and querying
     document vectors.
 
     Usage:
         manager = EmbeddingsManager(config)
         manager.add_documents(chunks)
         results = manager.similarity_search("query", k=4)
+        # or, from async code
+        results = await manager.asimilarity_search("query", k=4)
     """
 
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(self, config: Optional[Config] = None, defer_store: bool = False):
+        """
+        Args:
+            config: Pipeline configuration.
+            defer_store: Do not open the vector store until first use. Required in
+                a process that will fork workers (see src/preload.py):
+                Chroma's native client hangs in a child forked after the
+                parent has run any collection operation.
+        """
         self.config = config or Config()
 
         # Ensure persist directory exists
         persist_dir = Path(self.config.persist_directory)
         persist_dir.mkdir(parents=True, exist_ok=True)
 
-        # Initialize OpenAI embeddings
-        self.embeddings = OpenAIEmbeddings(
-            model=self.config.embedding_model,
-            openai_api_key=self.config.openai_api_key,
-        )
+        # Initialize the embedding backend (OpenAI or local, per config)
+        self.embeddings = create_embeddings(self.config)
 
-        # Initialize ChromaDB
-        self.vectorstore = Chroma(
-            collection_name=self.config.collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=str(persist_dir),
-        )
+        # Bumped on every write (ours or, via the change stamp, another
+        # process's) so dependent caches can invalidate themselves
+        self._collection_version = 0
+
+        # Rewritten on every write so other processes sharing the
+        # collection (gunicorn workers, the API) notice it
+        self._stamp_path = persist_dir / f"{self.config.collection_name}.changed"
+        self._seen_stamp = self._read_stamp()
+
+        # Which files produced which chunks (for incremental syncs)
+        self.manifest = IndexManifest(persist_dir, self.config.collection_name)
+
+        # BM25 index for hybrid/lexical retrieval, built from the
+        # collection on first use and kept in sync on every write
+        self.lexical_index: Optional[BM25Index] = None
+        self._lexical_lock = threading.Lock()
+        # Chunk IDs passing each metadata filter, for filtered BM25 search
+        # (valid for one collection_version)
+        self._filter_ids: dict[tuple, set[str]] = {}
+        self._filter_ids_version = 0
+
+        # Query embedding cache (memory LRU + optional SQLite tier)
+        self.query_cache: Optional[EmbeddingCache] = None
+        if self.config.embedding_cache_size > 0:
+            self.query_cache = EmbeddingCache(
+                namespace=self.config.embedding_model,
+                max_size=self.config.embedding_cache_size,
+                ttl=self.config.embedding_cache_ttl,
+                disk_max_entries=self.config.embedding_cache_disk_max,
+                db_path=(
+                    persist_dir / "query_embedding_cache.sqlite3"
+                    if self.config.embedding_cache_persist
+                    else None
+                ),
+            )
+
+        # Vector store backend, opened on first access when deferred
+        self._vectorstore: Optional[VectorStore] = None
+        self._store_lock = threading.Lock()
+        if defer_store:
+            logger.info(
+                "EmbeddingsManager initialized — model=%s, collection=%s (store deferred)",
+                self.config.embedding_model,
+                self.config.collection_name,
+            )
+            return
 
         logger.info(
             "EmbeddingsManager initialized — model=%s, collection=%s, docs=%d",
@@ -53,35 +139,156 @@ class EmbeddingsManager:
             self.document_count,
         )
 
+    @property
+    def vectorstore(self) -> VectorStore:
+        """The vector store backend (Config.vector_backend), opened lazily."""
+        if self._vectorstore is None:
+            with self._store_lock:
+                if self._vectorstore is None:
+                    self._vectorstore = create_vector_store(self.config, self.embeddings)
+        return self._vectorstore
+
     # ─── Public API ──────────────────────────────────────
 
     def add_documents(self, documents: list[Document]) -> int:
         """
         Embed and store a list of Document chunks.
 
+        Chunks are keyed by a content hash (see make_chunk_id), and chunks
+        already in the collection are skipped before embedding, so calling
+        this again with an unchanged corpus costs no embedding calls and
+        never grows the index.
+
         Args:
             documents: LangChain Document objects to embed.
 
         Returns:
-            Number of documents added.
+            Number of new chunks embedded and stored.
         """
         if not documents:
             logger.warning("No documents to add.")
             return 0
 
-        self.vectorstore.add_documents(documents)
-        count = len(documents)
+        # Deduplicate by deterministic ID (within the batch, then against the store)
+        unique: dict[str, Document] = {}
+        for doc in documents:
+            doc_id = doc.id or make_chunk_id(
+                doc.metadata.get("source_file", ""), doc.page_content
+            )
+            doc.id = doc_id
+            unique.setdefault(doc_id, doc)
+
+        existing = self.existing_ids(list(unique))
+        new_docs = [doc for doc_id, doc in unique.items() if doc_id not in existing]
+
+        if not new_docs:
+            logger.info(
+                "All %d chunks already indexed in '%s' — nothing to embed.",
+                len(unique),
+                self.config.collection_name,
+            )
+            return 0
+
+        # Upsert: a concurrent writer inserting the same chunk is harmless
+        batch_size = self.config.embedding_batch_size
+        for start in range(0, len(new_docs), batch_size):
+            batch = new_docs[start:start + batch_size]
+            vectors = self.embed_documents([doc.page_content for doc in batch])
+            self.upsert_embeddings(batch, vectors)
+        count = len(new_docs)
 
         logger.info(
-            "Added %d chunks to collection '%s' (total: %d)",
+            "Added %d chunks to collection '%s' (%d already present, total: %d)",
             count,
             self.config.collection_name,
+            len(unique) - count,
             self.document_count,
         )
         return count
 
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed a batch of texts, retrying rate-limit and transient errors
+        with exponential backoff plus jitter.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                attempt += 1
+                if attempt > self.config.embedding_max_retries or not _is_retryable(e):
+                    raise
+                delay = min(
+                    self.config.embedding_retry_base_delay * 2 ** (attempt - 1),
+                    EMBEDDING_RETRY_MAX_DELAY,
+                )
+                delay *= 0.5 + random.random()
+                logger.warning(
+                    "Embedding batch of %d failed (%s) — retry %d/%d in %.1fs",
+                    len(texts),
+                    type(e).__name__,
+                    attempt,
+                    self.config.embedding_max_retries,
+                    delay,
+                )
+                time.sleep(delay)
+
+    def upsert_embeddings(
+        self, documents: list[Document], embeddings: list[list[float]]
+    ) -> None:
+        """Bulk-write precomputed embeddings (documents must carry IDs)."""
+        if not documents:
+            return
+        self.vectorstore.upsert(
+            ids=[doc.id for doc in documents],
+            embeddings=embeddings,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+        )
+        with self._lexical_lock:
+            if self.lexical_index is not None:
+                self.lexical_index.add_many((doc.id, doc.page_content) for doc in documents)
+        self._collection_changed()
+
+    def update_metadata(self, documents: list[Document]) -> None:
+        """Rewrite the metadata of stored chunks (documents must carry IDs); no re-embedding."""
+        if not documents:
+            return
+        self.vectorstore.update_metadata(
+            [doc.id for doc in documents], [doc.metadata for doc in documents]
+        )
+        self._collection_changed()
+
+    def delete_documents(self, ids: list[str]) -> int:
+        """
+        Remove chunks by ID.
+
+        Returns:
+            Number of IDs requested for deletion.
+        """
+        if not ids:
+            return 0
+        self.vectorstore.delete(ids)
+        with self._lexical_lock:
+            if self.lexical_index is not None:
+                for doc_id in ids:
+                    self.lexical_index.remove(doc_id)
+        self._collection_changed()
+        logger.info(
+            "Deleted %d chunks from collection '%s' (total: %d)",
+            len(ids),
+            self.config.collection_name,
+            self.document_count,
+        )
+        return len(ids)
+
+    def existing_ids(self, ids: list[str]) -> set[str]:
+        """Return the subset of ``ids`` already stored in the collection."""
+        return self.vectorstore.existing_ids(ids)
+
     def similarity_search(
-        self, query: str, k: Optional[int] = None
+        self, query: str, k: Optional[int] = None, where: Optional[Where] = None
     ) -> list[tuple[Document, float]]:
         """
         Perform similarity search and return documents with scores.
@@ -89,42 +296,327 @@ class EmbeddingsManager:
         Args:
             query: Search query string.
             k: Number of results (defaults to config.top_k).
+            where: Metadata filter, e.g. {"source_file": "04_precios.md"}
+                (see vector_stores).
 
         Returns:
             List of (Document, similarity_score) tuples,
             sorted by relevance (highest first).
         """
-        k = k or self.config.top_k
-        results = self.vectorstore.similarity_search_with_relevance_scores(
-            query, k=k
+        embedding = self.embed_query(query)
+        return self.similarity_search_by_vector(embedding, k, query=query, where=where)
+
+    async def asimilarity_search(
+        self, query: str, k: Optional[int] = None, where: Optional[Where] = None
+    ) -> list[tuple[Document, float]]:
+        """
+        Async variant of similarity_search.
+
+        The query is embedded with the async OpenAI client; the vector
+        store lookup (local disk) runs in the default thread pool so the
+        event loop is never blocked.
+        """
+        embedding = await self.aembed_query(query)
+        return await self.asimilarity_search_by_vector(embedding, k, query=query, where=where)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: Optional[int] = None,
+        query: str = "",
+        where: Optional[Where] = None,
+    ) -> list[tuple[Document, float]]:
+        """
+        Like similarity_search, for callers that already hold the query embedding.
+
+        ``query`` is only used for logging.
+        """
+        results = self._search_by_vector(embedding, k or self.config.top_k, where)
+        self._log_search(query, results)
+        return results
+
+    async def asimilarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: Optional[int] = None,
+        query: str = "",
+        where: Optional[Where] = None,
+    ) -> list[tuple[Document, float]]:
+        """Async variant of similarity_search_by_vector (search runs in a thread)."""
+        results = await asyncio.to_thread(
+            self._search_by_vector, embedding, k or self.config.top_k, where
         )
+        self._log_search(query, results)
+        return results
+
+    def similarity_search_many_by_vector(
+        self,
+        embeddings: list[list[float]],
+        k: Optional[int] = None,
+        where: Optional[Where] = None,
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        similarity_search_by_vector for a batch of query embeddings, run
+        as one vector store operation (one result list per embedding).
+        """
+        k = k or self.config.top_k
+        with span("vector_search"):
+            results = self.vectorstore.search_many(embeddings, k, where)
+        logger.info("Batch search → %d queries, k=%d", len(embeddings), k)
+        return results
+
+    def lexical_search(
+        self, query: str, k: int, where: Optional[Where] = None
+    ) -> list[tuple[str, float]]:
+        """BM25 search over chunk text. Returns (chunk_id, bm25_score) pairs."""
+        index = self.get_lexical_index()
+        allowed_ids = self.ids_matching(where) if where else None
+        with span("lexical_search"):
+            return index.search(query, k, allowed_ids=allowed_ids)
+
+    def ids_matching(self, where: Where) -> set[str]:
+        """IDs of the chunks passing a metadata filter (cached until the next write)."""
+        key = where_key(where)
+        if self._filter_ids_version != self.collection_version:
+            self._filter_ids = {}
+            self._filter_ids_version = self.collection_version
+        ids = self._filter_ids.get(key)
+        if ids is None:
+            ids = self.vectorstore.ids_matching(where)
+            if len(self._filter_ids) >= FILTER_ID_CACHE_SIZE:
+                self._filter_ids.pop(next(iter(self._filter_ids)))
+            self._filter_ids[key] = ids
+        return ids
+
+    def partition_centroids(self, field: str) -> dict[str, np.ndarray]:
+        """Mean chunk vector per value of a metadata field (see TopicRouter)."""
+        return self.vectorstore.partition_centroids(field)
+
+    def get_documents(self, ids: list[str]) -> dict[str, Document]:
+        """Fetch stored chunks by ID."""
+        if not ids:
+            return {}
+        return self.vectorstore.get_documents(ids)
+
+    def relevance_scores(
+        self, embedding: list[float], ids: list[str]
+    ) -> dict[str, float]:
+        """
+        Relevance of stored chunks to a query embedding, on the same scale
+        as similarity_search (for chunks found by other means, e.g. BM25).
+        """
+        return self.vectorstore.relevance_scores(embedding, ids)
+
+    def embed_query(self, query: str) -> list[float]:
+        """Embed a query, reusing the cached vector for repeated questions."""
+        if self.query_cache is not None:
+            cached = self.query_cache.get(query)
+            if cached is not None:
+                return cached
+
+        embedding = self.embeddings.embed_query(query)
+        if self.query_cache is not None:
+            self.query_cache.put(query, embedding)
+        return embedding
+
+    def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """
+        Embed several queries with a single embedding request.
+
+        Cached and repeated queries are not sent; only the distinct
+        misses go out, in one embed_documents call.
+        """
+        embeddings, misses = self._cached_embeddings(queries)
+        if misses:
+            vectors = self.embed_documents(misses)
+            return self._fill_embeddings(queries, embeddings, misses, vectors)
+        return embeddings
+
+    async def aembed_queries(self, queries: list[str]) -> list[list[float]]:
+        """Async variant of embed_queries."""
+        if self.query_cache is not None and self.query_cache.db_path is not None:
+            # Lookups may read the disk tier: keep them off the event loop
+            embeddings, misses = await asyncio.to_thread(self._cached_embeddings, queries)
+        else:
+            embeddings, misses = self._cached_embeddings(queries)
+        if misses:
+            vectors = await self.embeddings.aembed_documents(misses)
+            return self._fill_embeddings(queries, embeddings, misses, vectors)
+        return embeddings
+
+    async def aembed_query(self, query: str) -> list[float]:
+        """Async variant of embed_query (disk cache lookups run in a thread)."""
+        if self.query_cache is not None:
+            cached = self.query_cache.get(query, disk=False)
+            if cached is None and self.query_cache.db_path is not None:
+                cached = await asyncio.to_thread(self.query_cache.get, query)
+            if cached is not None:
+                return cached
+
+        embedding = await self.embeddings.aembed_query(query)
+        if self.query_cache is not None:
+            self.query_cache.put(query, embedding)
+        return embedding
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _cached_embeddings(
+        self, queries: list[str]
+    ) -> tuple[list[Optional[list[float]]], list[str]]:
+        """Cached vector per query (None on a miss) and the distinct missed queries."""
+        embeddings: list[Optional[list[float]]] = []
+        misses: dict[str, None] = {}
+        for query in queries:
+            cached = self.query_cache.get(query) if self.query_cache is not None else None
+            embeddings.append(cached)
+            if cached is None:
+                misses[query] = None
+        return embeddings, list(misses)
+
+    def _fill_embeddings(
+        self,
+        queries: list[str],
+        embeddings: list[Optional[list[float]]],
+        misses: list[str],
+        vectors: list[list[float]],
+    ) -> list[list[float]]:
+        """Complete _cached_embeddings' result with freshly embedded misses."""
+        fresh = dict(zip(misses, vectors))
+        if self.query_cache is not None:
+            for query, vector in fresh.items():
+                self.query_cache.put(query, vector)
+        return [
+            embedding if embedding is not None else fresh[query]
+            for query, embedding in zip(queries, embeddings)
+        ]
 
+    def _search_by_vector(
+        self, embedding: list[float], k: int, where: Optional[Where] = None
+    ) -> list[tuple[Document, float]]:
+        """Query the vector store with a precomputed embedding, returning relevance scores."""
+        with span("vector_search"):
+            return self.vectorstore.search(embedding, k, where)
+
+    def get_lexical_index(self) -> BM25Index:
+        """Return the BM25 index, building it from the collection on first use."""
+        self._sync_with_disk()
+        if self.lexical_index is not None:
+            return self.lexical_index
+        with self._lexical_lock:
+            if self.lexical_index is None:
+                started = time.perf_counter()
+                index = BM25Index()
+                for ids, texts in self.vectorstore.iter_documents(LEXICAL_BUILD_PAGE):
+                    index.add_many(zip(ids, texts))
+                self.lexical_index = index
+                logger.info(
+                    "BM25 index built — %d chunks in %.0fms",
+                    len(index),
+                    (time.perf_counter() - started) * 1000,
+                )
+        return self.lexical_index
+
+    @staticmethod
+    def _log_search(query: str, results: list[tuple[Document, float]]) -> None:
         logger.info(
             "Search for '%s' → %d results (top score: %.3f)",
             query[:60],
             len(results),
             results[0][1] if results else 0.0,
         )
-        return results
+
+    # ─── Cross-Process Changes ───────────────────────────
+
+    @property
+    def collection_version(self) -> int:
+        """Changes whenever the collection does, in this process or another."""
+        self._sync_with_disk()
+        return self._collection_version
+
+    def set_lexical_index(self, index: BM25Index) -> None:
+        """Adopt a BM25 index built elsewhere from the collection as it is now."""
+        with self._lexical_lock:
+            self.lexical_index = index
+            self._seen_stamp = self._read_stamp()
+
+    def _read_stamp(self) -> Optional[str]:
+        try:
+            return self._stamp_path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _collection_changed(self) -> None:
+        """After a write here: bump the version and tell the other processes."""
+        with self._lexical_lock:
+            # Changes by another process since our last look are not in
+            # our BM25 index; we must not mark them as seen
+            if self._read_stamp() != self._seen_stamp:
+                self.lexical_index = None
+            stamp = f"{os.getpid()}-{time.time_ns()}"
+            tmp_path = self._stamp_path.with_suffix(".changed.tmp")
+            try:
+                tmp_path.write_text(stamp, encoding="utf-8")
+                os.replace(tmp_path, self._stamp_path)
+                self._seen_stamp = stamp
+            except OSError as e:
+                logger.warning("Could not write collection change stamp: %s", e)
+            self._collection_version += 1
+
+    def _sync_with_disk(self) -> None:
+        """Drop the BM25 index if another process changed the collection."""
+        stamp = self._read_stamp()
+        if stamp == self._seen_stamp:
+            return
+        with self._lexical_lock:
+            if stamp == self._seen_stamp:
+                return
+            self._seen_stamp = stamp
+            self._collection_version += 1
+            if self.lexical_index is not None:
+                self.lexical_index = None
+                logger.info(
+                    "Collection '%s' changed in another process — BM25 index will be rebuilt",
+                    self.config.collection_name,
+                )
+
+    # ─── Process Lifecycle ───────────────────────────────
+
+    def reset_after_fork(self) -> None:
+        """
+        Drop process-bound clients in a freshly forked worker.
+
+        The vector store client, the OpenAI HTTP pool and the SQLite cache
+        connection must not be shared across processes; they are
+        re-opened here or on first use. The BM25 index, the in-memory
+        query cache and local embedding models are plain memory and stay
+        shared copy-on-write with the parent (as does the numpy backend's
+        read-only matrix mapping, once re-opened).
+        """
+        reset_vector_store_after_fork(self.config)
+        self._vectorstore = None
+        self._store_lock = threading.Lock()
+        if not is_local_model(self.config.embedding_model):
+            self.embeddings = create_embeddings(self.config)
+        if self.query_cache is not None:
+            self.query_cache.reopen()
+        self._lexical_lock = threading.Lock()
+
+    # ─── Collection Management ───────────────────────────
 
     def clear_collection(self) -> None:
         """Delete all documents from the current collection."""
-        self.vectorstore.delete_collection()
-
-        # Re-create the empty collection
-        persist_dir = Path(self.config.persist_directory)
-        self.vectorstore = Chroma(
-            collection_name=self.config.collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=str(persist_dir),
-        )
+        self.vectorstore.clear()
+        self._collection_changed()
+        self.manifest.clear()
+        if self.lexical_index is not None:
+            self.lexical_index.clear()
         logger.info("Collection '%s' cleared.", self.config.collection_name)
 
     @property
     def document_count(self) -> int:
         """Number of document chunks currently stored."""
         try:
-            return self.vectorstore._collection.count()
+            return self.vectorstore.count()
         except Exception:
             return 0
 
@@ -134,7 +626,11 @@ class EmbeddingsManager:
             "collection_name": self.config.collection_name,
             "document_count": self.document_count,
             "embedding_model": self.config.embedding_model,
+            "vector_backend": self.config.vector_backend,
             "persist_directory": self.config.persist_directory,
+            "query_embedding_cache": (
+                self.query_cache.stats() if self.query_cache is not None else None
+            ),
         }
 
     def get_retriever(self, k: Optional[int] = None):
@@ -145,10 +641,26 @@ class EmbeddingsManager:
             k: Number of documents to retrieve.
 
         Returns:
-            LangChain VectorStoreRetriever.
+            LangChain retriever (a VectorStoreRetriever for ChromaDB).
         """
         k = k or self.config.top_k
-        return self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": k},
-        )
+        if isinstance(self.vectorstore, ChromaVectorStore):
+            return self.vectorstore.langchain.as_retriever(
+                search_type="similarity",
+                search_kwargs={"k": k},
+            )
+        return _ManagerRetriever(manager=self, k=k)
+
+
+class _ManagerRetriever(BaseRetriever):
+    """LangChain retriever over EmbeddingsManager.similarity_search."""
+
+    manager: EmbeddingsManager
+    k: int
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return [doc for doc, _ in self.manager.similarity_search(query, k=self.k)]
@@ -0,0 +1,124 @@
+"""
+Index Manifest — Incremental Re-indexing State
+================================================
+Records, for every ingested file, its mtime, size, content hash and
+the chunk IDs it produced. Persisted as JSON next to the ChromaDB
+``persist_directory`` so a directory sync only re-embeds what changed.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from src.utils import logger
+
+
+def file_sha256(path: Path) -> str:
+    """Content hash of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """What we know about one indexed file."""
+
+    mtime: float
+    size: int
+    sha256: str
+    chunk_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SyncReport:
+    """Outcome of a directory sync."""
+
+    added_files: list[str] = field(default_factory=list)
+    updated_files: list[str] = field(default_factory=list)
+    removed_files: list[str] = field(default_factory=list)
+    unchanged_files: int = 0
+    failed_files: list[str] = field(default_factory=list)
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class IndexManifest:
+    """
+    JSON-backed map of resolved file path → ManifestEntry, one file per
+    collection (``<collection>_manifest.json``).
+
+    Usage:
+        manifest = IndexManifest(persist_dir, "billeasy_docs")
+        entry = manifest.get(path)
+        manifest.set(path, ManifestEntry(...))
+        manifest.save()
+    """
+
+    def __init__(self, persist_dir: str | Path, collection_name: str):
+        self.path = Path(persist_dir) / f"{collection_name}_manifest.json"
+        self.entries: dict[str, ManifestEntry] = {}
+        self._load()
+
+    # ─── Public API ──────────────────────────────────────
+
+    def get(self, file_path: str | Path) -> Optional[ManifestEntry]:
+        return self.entries.get(self._key(file_path))
+
+    def set(self, file_path: str | Path, entry: ManifestEntry) -> None:
+        self.entries[self._key(file_path)] = entry
+
+    def remove(self, file_path: str | Path) -> Optional[ManifestEntry]:
+        return self.entries.pop(self._key(file_path), None)
+
+    def files_under(self, dir_path: str | Path) -> list[str]:
+        """Manifest keys for files directly inside ``dir_path``."""
+        dir_key = self._key(dir_path)
+        return [key for key in self.entries if str(Path(key).parent) == dir_key]
+
+    def clear(self) -> None:
+        """Forget every file (used when the collection is wiped)."""
+        self.entries.clear()
+        self.save()
+
+    def save(self) -> None:
+        """Write the manifest atomically (temp file + rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {key: asdict(entry) for key, entry in self.entries.items()},
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def stat_matches(entry: ManifestEntry, stat: os.stat_result) -> bool:
+        """Cheap change check: same size and mtime as last time."""
+        return entry.size == stat.st_size and entry.mtime == stat.st_mtime
+
+    # ─── Internals ───────────────────────────────────────
+
+    @staticmethod
+    def _key(file_path: str | Path) -> str:
+        return str(Path(file_path).resolve())
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.entries = {key: ManifestEntry(**value) for key, value in raw.items()}
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning("Ignoring unreadable index manifest %s: %s", self.path, e)
+            self.entries = {}
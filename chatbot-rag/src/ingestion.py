@@ -0,0 +1,339 @@
+"""
+Ingestion Pipeline — Parallel Parse, Chunk, Embed & Store
+===========================================================
+Three overlapping stages for large document sets:
+
+1. Parse + chunk files in a process pool (PyPDF / docx2txt are CPU-bound)
+2. Embed new chunks in bounded concurrent batches, with retry/backoff
+3. Write vectors to ChromaDB in bulk upserts
+
+Each stage starts as soon as the previous one produces work, and the
+pipeline reports per-stage throughput.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from src.document_loader import DocumentLoader
+from src.embeddings_manager import EmbeddingsManager
+from src.index_manifest import ManifestEntry, file_sha256
+from src.utils import Config, logger
+
+# Rough chars-per-token ratio used for throughput reporting
+CHARS_PER_TOKEN = 4
+
+# Below this many files, process start-up costs more than it saves
+PROCESS_POOL_MIN_FILES = 16
+
+# Per-process loader, created lazily inside pool workers
+_worker_loader: Optional[DocumentLoader] = None
+
+
+def _parse_and_chunk(
+    file_path: str, chunk_size: int, chunk_overlap: int
+) -> list[Document]:
+    """Process-pool entry point: load one file and split it into chunks."""
+    global _worker_loader
+    if _worker_loader is None:
+        _worker_loader = DocumentLoader(
+            Config(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        )
+    return _worker_loader.load_file(file_path)
+
+
+@dataclass
+class IngestionReport:
+    """Counts and per-stage timings of one ingestion run."""
+
+    files: int = 0
+    files_failed: list[str] = field(default_factory=list)
+    chunks: int = 0
+    chunks_skipped: int = 0  # already present in the collection
+    chunks_updated: int = 0  # already present; metadata rewritten (update_existing)
+    chunks_embedded: int = 0
+    tokens_embedded: int = 0  # estimated
+    parse_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    write_seconds: float = 0.0
+    total_seconds: float = 0.0
+    chunk_ids: dict[str, list[str]] = field(default_factory=dict)  # file path → IDs
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.parse_seconds if self.parse_seconds else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_embedded / self.embed_seconds if self.embed_seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens_embedded / self.embed_seconds if self.embed_seconds else 0.0
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d.pop("chunk_ids")
+        d.update(
+            files_per_second=round(self.files_per_second, 2),
+            chunks_per_second=round(self.chunks_per_second, 2),
+            tokens_per_second=round(self.tokens_per_second, 2),
+        )
+        return d
+
+
+class IngestionPipeline:
+    """
+    Pipelined, parallel ingestion into an EmbeddingsManager.
+
+    Usage:
+        pipeline = IngestionPipeline(embeddings_manager, config)
+        report = pipeline.ingest_directory("data/sample_docs")
+        print(report.to_dict())
+    """
+
+    def __init__(
+        self,
+        embeddings_manager: EmbeddingsManager,
+        config: Optional[Config] = None,
+    ):
+        self.em = embeddings_manager
+        self.config = config or Config()
+
+    # ─── Public API ──────────────────────────────────────
+
+    def ingest_directory(self, dir_path: str | Path) -> IngestionReport:
+        """
+        Ingest every supported file directly inside ``dir_path``.
+
+        Files the index manifest does not know yet are recorded in it, so
+        a later sync of the directory skips them. Files it already knows
+        are left to the sync, which also deletes the chunks an edit left
+        behind.
+        """
+        files = DocumentLoader.list_files(dir_path)
+        manifest = self.em.manifest
+        untracked = {
+            str(file): (file.stat(), file_sha256(file))
+            for file in files
+            if manifest.get(file) is None
+        }
+        report = self.ingest_files(files)
+
+        recorded = False
+        for file, (stat, sha256) in untracked.items():
+            chunk_ids = report.chunk_ids.get(file)
+            if chunk_ids is None:
+                continue  # failed to parse; the next sync retries it
+            manifest.set(
+                file,
+                ManifestEntry(
+                    mtime=stat.st_mtime, size=stat.st_size, sha256=sha256, chunk_ids=chunk_ids
+                ),
+            )
+            recorded = True
+        if recorded:
+            manifest.save()
+        return report
+
+    def ingest_files(
+        self, files: list[str | Path], update_existing: bool = False
+    ) -> IngestionReport:
+        """
+        Parse, chunk, embed and store ``files``; only new chunks are embedded.
+
+        With ``update_existing`` the chunks already in the collection get
+        their metadata rewritten (an edit elsewhere in a file moves the
+        ``chunk_index``/``total_chunks`` of the chunks it kept).
+        """
+        report = IngestionReport(files=len(files))
+        if not files:
+            return report
+
+        start = time.perf_counter()
+        parse_pool = self._make_parse_pool(len(files))
+        embed_pool = ThreadPoolExecutor(
+            max_workers=max(self.config.embedding_concurrency, 1),
+            thread_name_prefix="embed",
+        )
+
+        seen_ids: set[str] = set()
+        pending_chunks: list[Document] = []
+        retained: Optional[list[Document]] = [] if update_existing else None
+        in_flight: dict[Future, list[Document]] = {}
+        to_write: list[tuple[Document, list[float]]] = []
+        embed_started: Optional[float] = None
+
+        try:
+            futures = {
+                parse_pool.submit(
+                    _parse_and_chunk,
+                    str(f),
+                    self.config.chunk_size,
+                    self.config.chunk_overlap,
+                ): Path(f)
+                for f in files
+            }
+
+            # Stage 1 → 2: as files finish parsing, queue their new chunks
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    logger.error("Skipping %s: %s", file.name, e)
+                    report.files_failed.append(file.name)
+                    continue
+
+                report.chunks += len(chunks)
+                report.chunk_ids[str(file)] = [chunk.id for chunk in chunks]
+                pending_chunks.extend(self._new_chunks(chunks, seen_ids, report, retained))
+
+                while len(pending_chunks) >= self.config.embedding_batch_size:
+                    embed_started = embed_started or time.perf_counter()
+                    self._submit_batch(embed_pool, pending_chunks, in_flight)
+                    self._drain(in_flight, to_write, report, block=False)
+                    self._flush_writes(to_write, report, force=False)
+
+            report.parse_seconds = time.perf_counter() - start
+
+            # Remaining partial batch, then wait for every embedding
+            if pending_chunks:
+                embed_started = embed_started or time.perf_counter()
+                self._submit_batch(embed_pool, pending_chunks, in_flight)
+            while in_flight:
+                self._drain(in_flight, to_write, report, block=True)
+                self._flush_writes(to_write, report, force=False)
+            if embed_started is not None:
+                report.embed_seconds = time.perf_counter() - embed_started
+
+            # Stage 3: final bulk upsert
+            self._flush_writes(to_write, report, force=True)
+            if retained:
+                started = time.perf_counter()
+                self.em.update_metadata(retained)
+                report.chunks_updated = len(retained)
+                report.write_seconds += time.perf_counter() - started
+        finally:
+            parse_pool.shutdown(cancel_futures=True)
+            embed_pool.shutdown(cancel_futures=True)
+
+        report.total_seconds = time.perf_counter() - start
+        logger.info(
+            "Ingested %d files → %d chunks (%d new, %d skipped) in %.2fs — "
+            "%.1f files/s, %.1f chunks/s, ~%.0f tokens/s",
+            report.files,
+            report.chunks,
+            report.chunks_embedded,
+            report.chunks_skipped,
+            report.total_seconds,
+            report.files_per_second,
+            report.chunks_per_second,
+            report.tokens_per_second,
+        )
+        return report
+
+    # ─── Stages ──────────────────────────────────────────
+
+    def _make_parse_pool(self, n_files: int):
+        """Process pool for parsing; in-process thread for tiny jobs or workers=1."""
+        workers = self.config.ingest_workers or os.cpu_count() or 1
+        workers = min(workers, n_files)
+        if workers <= 1 or n_files < PROCESS_POOL_MIN_FILES:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse")
+        # spawn: forking a process that already holds DB/HTTP clients and
+        # threads is unsafe
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def _new_chunks(
+        self,
+        chunks: list[Document],
+        seen_ids: set[str],
+        report: IngestionReport,
+        retained: Optional[list[Document]] = None,
+    ) -> list[Document]:
+        """
+        Drop chunks seen earlier in this run or already in the collection
+        (those in the collection are added to ``retained`` when given).
+        """
+        fresh = []
+        for chunk in chunks:
+            if chunk.id in seen_ids:
+                report.chunks_skipped += 1
+                continue
+            seen_ids.add(chunk.id)
+            fresh.append(chunk)
+
+        existing = self.em.existing_ids([chunk.id for chunk in fresh])
+        report.chunks_skipped += len(existing)
+        if retained is not None:
+            retained.extend(chunk for chunk in fresh if chunk.id in existing)
+        return [chunk for chunk in fresh if chunk.id not in existing]
+
+    def _submit_batch(
+        self,
+        pool: ThreadPoolExecutor,
+        pending: list[Document],
+        in_flight: dict[Future, list[Document]],
+    ) -> None:
+        """Move one batch from ``pending`` to the embedding pool."""
+        batch = pending[: self.config.embedding_batch_size]
+        del pending[: len(batch)]
+        future = pool.submit(self.em.embed_documents, [c.page_content for c in batch])
+        in_flight[future] = batch
+
+    def _drain(
+        self,
+        in_flight: dict[Future, list[Document]],
+        to_write: list[tuple[Document, list[float]]],
+        report: IngestionReport,
+        block: bool,
+    ) -> None:
+        """Collect finished embedding batches (blocking when over the cap)."""
+        limit = max(self.config.embedding_concurrency, 1)
+        if not in_flight:
+            return
+        if block or len(in_flight) > limit:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        else:
+            done = [f for f in in_flight if f.done()]
+
+        for future in done:
+            batch = in_flight.pop(future)
+            vectors = future.result()  # re-raises after retries are exhausted
+            to_write.extend(zip(batch, vectors))
+            report.chunks_embedded += len(batch)
+            report.tokens_embedded += sum(
+                len(c.page_content) // CHARS_PER_TOKEN for c in batch
+            )
+
+    def _flush_writes(
+        self,
+        to_write: list[tuple[Document, list[float]]],
+        report: IngestionReport,
+        force: bool,
+    ) -> None:
+        """Bulk-upsert buffered vectors once a full write batch is ready."""
+        batch_size = self.config.upsert_batch_size
+        while to_write and (force or len(to_write) >= batch_size):
+            batch = to_write[:batch_size]
+            del to_write[: len(batch)]
+            started = time.perf_counter()
+            self.em.upsert_embeddings([d for d, _ in batch], [v for _, v in batch])
+            report.write_seconds += time.perf_counter() - started
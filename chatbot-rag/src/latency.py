@@ -0,0 +1,233 @@
+"""
+Latency — Request Timers, Spans and Streaming Quantile Sketches
+=================================================================
+Building blocks for MetricsTracker: a per-request stopwatch that
+records named spans (retrieval, embedding, llm, ...) and a small,
+mergeable sketch that answers p50/p95/p99 queries over an unbounded
+stream of latencies in bounded memory.
+
+Code deep in the pipeline (retriever, vector store, Twilio sender)
+times itself with ``span("name")``: the span is added to the request
+timer active in the current context, if any, and always observed in
+the ``rag_stage_duration_seconds`` Prometheus histogram.
+
+Standard library only.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from src.prometheus import REGISTRY
+
+# Values at or below this (ms) share one bucket; keeps log() finite
+_MIN_TRACKED_MS = 1e-3
+
+
+class LatencySketch:
+    """
+    Streaming quantiles with bounded relative error (log-spaced buckets).
+
+    Every value lands in bucket ``ceil(log_gamma(value))``; any quantile
+    is then within ``relative_accuracy`` of the exact one. Latencies from
+    1µs to a day need under 1,500 buckets at 1% accuracy, and two
+    sketches merge by adding bucket counts — per-thread sketches can be
+    combined without coordination.
+
+    Usage:
+        sketch = LatencySketch()
+        sketch.add(123.4)             # milliseconds
+        sketch.quantile(0.95)
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        if value <= _MIN_TRACKED_MS:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add ``other``'s observations to this sketch (same accuracy assumed)."""
+        # .copy() is atomic, so ``other`` may be updated by its thread meanwhile
+        for key, n in other.buckets.copy().items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def since(self, earlier: "LatencySketch") -> "LatencySketch":
+        """Observations added after ``earlier`` (an older copy of this sketch)."""
+        delta = LatencySketch(self.relative_accuracy)
+        for key, n in self.buckets.items():
+            n -= earlier.buckets.get(key, 0)
+            if n:
+                delta.buckets[key] = n
+        delta.zero_count = self.zero_count - earlier.zero_count
+        delta.count = self.count - earlier.count
+        delta.total = self.total - earlier.total
+        delta.max = self.max  # a max cannot be split; merging takes the larger anyway
+        return delta
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0 ≤ q ≤ 1); None while empty."""
+        if self.count == 0:
+            return None
+        rank = max(math.ceil(q * self.count) - 1, 0)  # nearest-rank, 0-based
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of (gamma^(key-1), gamma^key] in relative terms
+                return min(2 * self._gamma ** key / (self._gamma + 1), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """Count, mean and p50/p95/p99 rounded for display."""
+        def _r(value: Optional[float]) -> Optional[float]:
+            return round(value, 2) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean": _r(self.total / self.count) if self.count else None,
+            "p50": _r(self.quantile(0.50)),
+            "p95": _r(self.quantile(0.95)),
+            "p99": _r(self.quantile(0.99)),
+            "max": _r(self.max) if self.count else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): n for k, n in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencySketch":
+        sketch = cls(data.get("relative_accuracy", 0.01))
+        sketch.buckets = {int(k): int(n) for k, n in data.get("buckets", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.total = data.get("total", 0.0)
+        sketch.max = data.get("max", 0.0)
+        return sketch
+
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Time spent per pipeline stage", ["stage"]
+)
+
+# Timer of the request being processed in this context (thread / task)
+_active_timer: ContextVar[Optional["RequestTimer"]] = ContextVar("active_timer", default=None)
+
+
+@dataclass
+class Span:
+    """One timed stage of a request (seconds, start relative to the request)."""
+
+    name: str
+    start: float
+    duration: float
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2),
+        }
+
+
+class RequestTimer:
+    """
+    Stopwatch for one request — create one per call, never share it.
+
+    Usage:
+        timer = RequestTimer()
+        with timer.stage("retrieval"):
+            ...                         # span("embedding") in here nests
+        timer.add("llm", 0.8)           # durations measured elsewhere
+        elapsed = timer.stop()          # seconds; timer.stages / timer.spans
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.spans: list[Span] = []
+        self.total: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the ``with`` block as ``name`` (repeated stages accumulate).
+
+        While it runs this timer is the active one, so ``span()`` calls
+        further down the stack are attributed to it. Do not ``yield``
+        from a generator inside the block.
+        """
+        token = _active_timer.set(self)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _active_timer.reset(token)
+            self.add(name, time.perf_counter() - start, start=start - self.started)
+
+    def add(self, name: str, seconds: float, start: Optional[float] = None) -> None:
+        """Record a span of ``seconds``; ``start`` defaults to "ended just now"."""
+        if start is None:
+            start = time.perf_counter() - self.started - seconds
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.spans.append(Span(name, start, seconds))
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the timer was created (or the final total once stopped)."""
+        if self.total is not None:
+            return self.total
+        return time.perf_counter() - self.started
+
+    def stop(self) -> float:
+        """Freeze and return the total request time in seconds."""
+        if self.total is None:
+            self.total = time.perf_counter() - self.started
+        return self.total
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block as stage ``name`` of the active request (Prometheus only if none)."""
+    timer = _active_timer.get()
+    if timer is not None:
+        with timer.stage(name):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
@@ -0,0 +1,203 @@
+"""
+Lexical Index — In-Process BM25 over Chunks
+=============================================
+Inverted index with Spanish-aware tokenization (accent folding,
+stopwords, thousands separators) so exact matches on prices, treatment
+names and codes ("3,500", "endodoncia") are found even when the
+embedding search ranks them low.
+"""
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Iterable, Optional
+
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[a-z0-9]+")
+
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual
+cuales cuando de del desde donde durante e el ella ellas ellos en entre era es
+esa esas ese eso esos esta estan estas este esto estos fue fueron ha han hasta
+hay la las le les lo los mas me mi mis muy no nos o otra otras otro otros para
+pero por porque que quien se sea ser si sin sobre son su sus te tiene tienen tu
+tus un una unas uno unos y ya yo
+""".split())
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents: 'Endodóncia' → 'endodoncia'."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into index terms.
+
+    - accents folded and lowercased
+    - numbers keep their digits only ("3,500" / "3.500" → "3500")
+    - Spanish stopwords dropped
+    - trailing plural "s" folded on longer words ("brackets" → "bracket")
+    """
+    terms = []
+    for token in _TOKEN.findall(fold(text)):
+        if token[0].isdigit():
+            terms.append(token.replace(",", "").replace(".", ""))
+            continue
+        if token in SPANISH_STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 4 and token.endswith("s"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[list[str]], k: int = 60
+) -> list[tuple[str, float]]:
+    """Fuse ranked ID lists: score(d) = Σ 1 / (k + rank_i(d)), rank starting at 1."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Incrementally updatable Okapi BM25 index keyed by chunk ID.
+
+    Query cost is proportional to the postings of the query terms, not
+    to the corpus size, so lookups stay well under a millisecond for
+    typical questions even with ~100k chunks.
+
+    Usage:
+        index = BM25Index()
+        index.add("chunk-1", "Blanqueamiento dental: $3,500")
+        index.search("cuánto cuesta el blanqueamiento", k=5)
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_terms: dict[str, tuple[str, ...]] = {}
+        self._doc_len: dict[str, int] = {}
+        self._total_len = 0
+        self._norms: Optional[dict[str, float]] = None  # per-doc length norm, lazily rebuilt
+        self._lock = threading.Lock()
+
+    # ─── Updates ─────────────────────────────────────────
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index (or re-index) one chunk."""
+        terms = tokenize(text)
+        counts = Counter(terms)
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._doc_terms[doc_id] = tuple(counts)
+            self._doc_len[doc_id] = len(terms)
+            self._total_len += len(terms)
+            self._norms = None
+
+    def add_many(self, items: Iterable[tuple[str, str]]) -> None:
+        """Index several (doc_id, text) pairs."""
+        for doc_id, text in items:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str) -> None:
+        """Drop one chunk from the index (no-op if unknown)."""
+        with self._lock:
+            self._remove(doc_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0
+            self._norms = None
+
+    # ─── Search ──────────────────────────────────────────
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        allowed_ids: Optional[set[str]] = None,
+    ) -> list[tuple[str, float]]:
+        """
+        Top-k chunk IDs by BM25 score (highest first).
+
+        Args:
+            query: Free-text query.
+            k: Number of results.
+            allowed_ids: If given, only these chunk IDs are scored.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            norms = self._get_norms()
+            scores: dict[str, float] = {}
+            get_score = scores.get
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                weight = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)) * (self.k1 + 1.0)
+                if allowed_ids is not None:
+                    postings = {d: tf for d, tf in postings.items() if d in allowed_ids}
+                for doc_id, tf in postings.items():
+                    scores[doc_id] = get_score(doc_id, 0.0) + weight * tf / (tf + norms[doc_id])
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __getstate__(self) -> dict:
+        # Picklable (e.g. built in a warm-up process); the lock is not
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _get_norms(self) -> dict[str, float]:
+        """k1 · (1 − b + b · len/avg_len) per doc; recomputed only after writes."""
+        if self._norms is None:
+            avg_len = self._total_len / len(self._doc_len) or 1.0
+            k1, b = self.k1, self.b
+            self._norms = {
+                doc_id: k1 * (1.0 - b + b * length / avg_len)
+                for doc_id, length in self._doc_len.items()
+            }
+        return self._norms
+
+    def _remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        self._norms = None
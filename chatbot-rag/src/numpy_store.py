@@ -0,0 +1,893 @@
+"""
+NumPy Vector Store — Memory-Mapped Exact Search
+=================================================
+Keeps every chunk vector in one contiguous float32 (or float16) matrix,
+persisted as a ``.npy`` file and memory-mapped read-only, with chunk
+text and metadata in a compact SQLite side table:
+
+    <persist_directory>/<collection>.npvec/
+        vectors.npy      capacity × dim matrix (rows past ``rows`` unused)
+        chunks.sqlite3   chunks(row, id, document, metadata) + meta
+
+A search is one matrix-vector product plus ``argpartition`` over the
+squared L2 distances — the same distance (and relevance scale) as a
+default ChromaDB collection. Gunicorn workers map the same file, so the
+page cache holds a single copy of the matrix for all of them.
+
+Writes are serialized across processes by SQLite (``BEGIN IMMEDIATE``).
+New vectors are appended past the rows other processes know about and
+deletes only touch the side table, so readers never see a half-written
+row; they pick up changes when the ``version`` in ``meta`` moves (the
+writer itself patches its snapshot with the rows it just wrote instead
+of re-reading the side table). When the matrix is full it is rewritten
+at double capacity (dropping deleted rows) and swapped in with
+``os.replace``.
+
+Metadata filters are answered from per-partition row lists, kept for
+every value of ``Config.partition_fields`` (source_file, file_type):
+a filtered search scores only that partition's rows. Other fields are
+resolved through the side table, still before any vector is scanned.
+
+With ``Config.ann_index = "ivf"`` large collections (``ann_min_rows``
+and up) are searched through an inverted-file index instead of the
+full matrix — see src/ann_index.py.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.ann_index import IVFIndex, default_nlist
+from src.utils import Config, logger
+from src.vector_stores import (
+    VectorStore,
+    Where,
+    check_embedding_model,
+    l2_relevance,
+    normalize_where,
+)
+
+SUPPORTED_DTYPES = ("float32", "float16")
+ANN_INDEXES = ("none", "ivf")
+
+# Rows allocated for a new matrix; doubled whenever it fills up
+INITIAL_CAPACITY = 1024
+
+# Queries per matrix product in search_many (bounds the rows × queries
+# distance matrix held in memory)
+SEARCH_BLOCK_QUERIES = 64
+
+# IDs per SQLite IN (...) lookup (older SQLite caps bound parameters at 999)
+ID_LOOKUP_BATCH = 900
+
+# Rows converted per step when the matrix is float16 (NumPy has no
+# float16 BLAS, so blocks are upcast to float32 before the product)
+HALF_BLOCK_ROWS = 16_384
+
+# Retrain the IVF centroids once the collection is this many times
+# larger than when they were trained
+IVF_RETRAIN_GROWTH = 4.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,             -- row in vectors.npy
+    id TEXT NOT NULL UNIQUE,
+    document TEXT NOT NULL,
+    metadata TEXT NOT NULL               -- JSON object
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+@dataclass
+class _Snapshot:
+    """What one process currently knows about the store (replaced, never mutated by readers)."""
+
+    version: int = 0
+    generation: int = 0  # bumped whenever vectors.npy is rewritten
+    matrix: Optional[np.ndarray] = None  # read-only memmap, rows [0, rows)
+    rows: int = 0
+    norms: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
+    row_ids: list[Optional[str]] = field(default_factory=list)  # None = deleted
+    id_rows: dict[str, int] = field(default_factory=dict)
+    # partition field → value → rows holding that value (deleted rows included)
+    partitions: dict[str, dict[str, np.ndarray]] = field(default_factory=dict)
+
+
+@dataclass
+class _Delta:
+    """A write this process just committed, applied to the snapshot without a reload."""
+
+    base_version: int  # version the write was made on top of
+    version: int
+    rows: int
+    added: dict[str, int] = field(default_factory=dict)  # id → its new row
+    metadatas: dict[int, dict] = field(default_factory=dict)  # new row → metadata
+    removed: list[str] = field(default_factory=list)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Chunk vectors in a memory-mapped NumPy matrix.
+
+    Usage:
+        store = NumpyVectorStore(Config(vector_backend="numpy"))
+        store.upsert(ids, vectors, texts, metadatas)
+        store.search(query_vector, k=4)    # [(Document, relevance), ...]
+    """
+
+    def __init__(self, config: Config):
+        if config.vector_dtype not in SUPPORTED_DTYPES:
+            raise ValueError(
+                f"Unknown vector_dtype '{config.vector_dtype}'. "
+                f"Supported: {', '.join(SUPPORTED_DTYPES)}"
+            )
+        if config.ann_index not in ANN_INDEXES:
+            raise ValueError(
+                f"Unknown ann_index '{config.ann_index}'. Supported: {', '.join(ANN_INDEXES)}"
+            )
+        self.config = config
+        self.directory = Path(config.persist_directory) / f"{config.collection_name}.npvec"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / "vectors.npy"
+        self.db_path = self.directory / "chunks.sqlite3"
+        self.ann_path = self.directory / "ivf.npz"
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot()
+
+        # Approximate index (Config.ann_index), built or loaded on first use
+        self._ann: Optional[IVFIndex] = None
+        self._ann_mtime: Optional[float] = None
+        self._ann_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        meta = self._read_meta(conn)
+        check_embedding_model(config, meta.get("embedding_model"))
+        stored_dtype = meta.get("dtype")
+        if stored_dtype and stored_dtype != config.vector_dtype:
+            logger.warning(
+                "Vector store '%s' holds %s vectors; ignoring vector_dtype=%s",
+                config.collection_name,
+                stored_dtype,
+                config.vector_dtype,
+            )
+        self._refresh()
+
+    # ─── Writes ──────────────────────────────────────────
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("upsert() needs one embedding per id")
+
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._read_meta(conn)
+                check_embedding_model(self.config, meta.get("embedding_model"))
+                dim = int(meta.get("dim", vectors.shape[1]))
+                if vectors.shape[1] != dim:
+                    raise ValueError(
+                        f"Embedding dimension {vectors.shape[1]} does not match "
+                        f"the store ({dim})"
+                    )
+                dtype = meta.get("dtype", self.config.vector_dtype)
+                rows = int(meta.get("rows", 0))
+                generation = int(meta.get("generation", 0))
+
+                # Every write goes to fresh rows past the ones readers know
+                # about; a re-upserted id leaves its old row behind as
+                # deleted (INSERT OR REPLACE drops it from the side table)
+                batch_rows: dict[str, int] = {}
+                for doc_id in ids:
+                    batch_rows.setdefault(doc_id, len(batch_rows))
+                if rows + len(batch_rows) > self._capacity():
+                    rows, generation = self._grow(
+                        conn, rows, len(batch_rows), dim, dtype, generation
+                    )
+                targets = [rows + batch_rows[doc_id] for doc_id in ids]
+                version = int(meta.get("version", 0))
+                delta = None
+                if generation == int(meta.get("generation", 0)):
+                    delta = _Delta(
+                        base_version=version,
+                        version=version + 1,
+                        rows=rows + len(batch_rows),
+                        added={doc_id: row for doc_id, row in zip(ids, targets)},
+                        metadatas={row: metadata or {} for row, metadata in zip(targets, metadatas)},
+                    )
+
+                matrix = np.lib.format.open_memmap(self.vectors_path, mode="r+")
+                matrix[np.asarray(targets)] = vectors.astype(dtype)
+                matrix.flush()
+                del matrix
+
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (row, id, document, metadata) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (row, doc_id, text, json.dumps(metadata or {}, ensure_ascii=False))
+                        for row, doc_id, text, metadata in zip(
+                            targets, ids, documents, metadatas
+                        )
+                    ],
+                )
+                self._write_meta(
+                    conn,
+                    dim=dim,
+                    dtype=dtype,
+                    rows=rows + len(batch_rows),
+                    generation=generation,
+                    version=version + 1,
+                    embedding_model=self.config.embedding_model,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._refresh(delta)
+
+        ann = self._ann
+        snapshot = self._snapshot
+        if ann is not None and len(snapshot.id_rows) > IVF_RETRAIN_GROWTH * ann.trained_rows:
+            with self._ann_lock:
+                self._train_ann(snapshot)
+
+    def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+                meta = self._read_meta(conn)
+                version = int(meta.get("version", 0))
+                self._write_meta(conn, version=version + 1)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._refresh(
+            _Delta(version, version + 1, int(meta.get("rows", 0)), removed=list(ids))
+        )
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]) -> None:
+        if not ids:
+            return
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE id = ?",
+                    [
+                        (json.dumps(metadata or {}, ensure_ascii=False), doc_id)
+                        for doc_id, metadata in zip(ids, metadatas)
+                    ],
+                )
+                meta = self._read_meta(conn)
+                version = int(meta.get("version", 0))
+                self._write_meta(conn, version=version + 1)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        # Rows and partition values are unchanged
+        self._refresh(_Delta(version, version + 1, int(meta.get("rows", 0))))
+
+    def clear(self) -> None:
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._read_meta(conn)
+                conn.execute("DELETE FROM chunks")
+                conn.execute(
+                    "DELETE FROM meta WHERE key IN ('dim', 'dtype', 'rows', 'embedding_model')"
+                )
+                self._write_meta(
+                    conn,
+                    generation=int(meta.get("generation", 0)) + 1,
+                    version=int(meta.get("version", 0)) + 1,
+                )
+                self.vectors_path.unlink(missing_ok=True)
+                self.ann_path.unlink(missing_ok=True)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._refresh()
+
+    # ─── Reads ───────────────────────────────────────────
+
+    def search(
+        self, embedding: list[float], k: int, where: Optional[Where] = None
+    ) -> list[tuple[Document, float]]:
+        return self.search_many([embedding], k, where)[0]
+
+    def search_many(
+        self, embeddings: list[list[float]], k: int, where: Optional[Where] = None
+    ) -> list[list[tuple[Document, float]]]:
+        snapshot = self._current()
+        if snapshot.matrix is None or k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32)
+        k = min(k, len(snapshot.id_rows))
+
+        if where:
+            # Only the partition's rows are scored, exactly: a partition is
+            # a small slice of the collection, so IVF is not needed there
+            rows = self._rows_matching(snapshot, where)
+            ranked = self._exact_top_k(snapshot, queries, k, rows)
+        else:
+            ann = self._ann_for(snapshot)
+            if ann is None:
+                ranked = self._exact_top_k(snapshot, queries, k)
+            else:
+                ranked = [self._ivf_top_k(snapshot, ann, query, k) for query in queries]
+
+        # Fetched by id, not row (ids survive a concurrent compaction),
+        # with one side-table lookup for the whole batch
+        ids_per_query = [[snapshot.row_ids[row] for row in rows] for rows, _ in ranked]
+        documents = self.get_documents(
+            list(dict.fromkeys(doc_id for ids in ids_per_query for doc_id in ids))
+        )
+        return [
+            [
+                (documents[doc_id], l2_relevance(float(distance)))
+                for doc_id, distance in zip(ids, distances)
+                if doc_id in documents
+            ]
+            for ids, (_, distances) in zip(ids_per_query, ranked)
+        ]
+
+    def ids_matching(self, where: Where) -> set[str]:
+        snapshot = self._current()
+        return {
+            snapshot.row_ids[row]
+            for row in self._rows_matching(snapshot, where)
+            if snapshot.row_ids[row] is not None
+        }
+
+    def partition_centroids(self, field: str) -> dict[str, np.ndarray]:
+        snapshot = self._current()
+        if snapshot.matrix is None:
+            return {}
+        centroids = {}
+        for value, rows in self._partition(snapshot, field).items():
+            rows = rows[np.isfinite(snapshot.norms[rows])]
+            if len(rows):
+                centroids[value] = np.asarray(snapshot.matrix[rows], dtype=np.float32).mean(axis=0)
+        return centroids
+
+    def relevance_scores(self, embedding: list[float], ids: list[str]) -> dict[str, float]:
+        snapshot = self._current()
+        rows = [(doc_id, snapshot.id_rows[doc_id]) for doc_id in ids if doc_id in snapshot.id_rows]
+        if not rows:
+            return {}
+        query = np.asarray(embedding, dtype=np.float32)
+        vectors = np.asarray(snapshot.matrix[[row for _, row in rows]], dtype=np.float32)
+        distances = np.maximum(((vectors - query) ** 2).sum(axis=1), 0.0)
+        return {
+            doc_id: l2_relevance(float(distance))
+            for (doc_id, _), distance in zip(rows, distances)
+        }
+
+    def existing_ids(self, ids: list[str]) -> set[str]:
+        found: set[str] = set()
+        conn = self._conn()
+        for start in range(0, len(ids), ID_LOOKUP_BATCH):
+            batch = ids[start:start + ID_LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                row[0]
+                for row in conn.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({placeholders})", batch
+                )
+            )
+        return found
+
+    def get_documents(self, ids: list[str]) -> dict[str, Document]:
+        documents: dict[str, Document] = {}
+        conn = self._conn()
+        for start in range(0, len(ids), ID_LOOKUP_BATCH):
+            batch = ids[start:start + ID_LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            for doc_id, text, metadata in conn.execute(
+                f"SELECT id, document, metadata FROM chunks WHERE id IN ({placeholders})",
+                batch,
+            ):
+                documents[doc_id] = Document(
+                    id=doc_id, page_content=text, metadata=json.loads(metadata)
+                )
+        return documents
+
+    def iter_documents(self, page_size: int) -> Iterator[tuple[list[str], list[str]]]:
+        conn = self._conn()
+        last_row = -1
+        while True:
+            page = conn.execute(
+                "SELECT row, id, document FROM chunks WHERE row > ? ORDER BY row LIMIT ?",
+                (last_row, page_size),
+            ).fetchall()
+            yield [r[1] for r in page], [r[2] for r in page]
+            if len(page) < page_size:
+                return
+            last_row = page[-1][0]
+
+    def count(self) -> int:
+        return len(self._current().id_rows)
+
+    def warm_up(self) -> None:
+        """Build (or load) the ANN index now rather than on the first query."""
+        self._ann_for(self._current())
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _exact_top_k(
+        self,
+        snapshot: _Snapshot,
+        queries: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        (rows, distances) of the ``k`` nearest rows for each query, scanning
+        every row or only ``rows``.
+        """
+        ranked = []
+        for start in range(0, len(queries), SEARCH_BLOCK_QUERIES):
+            block = queries[start:start + SEARCH_BLOCK_QUERIES]
+            distances = self._distances(snapshot, block, rows)  # rows × queries
+            for column in distances.T:
+                top = _top_k(column, k)
+                ranked.append((top if rows is None else rows[top], column[top]))
+        return ranked
+
+    def _rows_matching(self, snapshot: _Snapshot, where: Where) -> np.ndarray:
+        """Sorted rows whose metadata passes ``where`` (may include deleted rows)."""
+        matched: Optional[np.ndarray] = None
+        for field_name, values in normalize_where(where).items():
+            if field_name in snapshot.partitions:
+                index = snapshot.partitions[field_name]
+                parts = [index[str(value)] for value in values if str(value) in index]
+                rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            else:
+                rows = self._rows_with_values(field_name, values)
+            matched = rows if matched is None else np.intersect1d(matched, rows)
+        return matched[matched < snapshot.rows]
+
+    def _partition(self, snapshot: _Snapshot, field_name: str) -> dict[str, np.ndarray]:
+        """value → rows for one metadata field (precomputed for partition fields)."""
+        if field_name in snapshot.partitions:
+            return snapshot.partitions[field_name]
+        partition: dict[str, list[int]] = {}
+        for row, value in self._conn().execute(
+            "SELECT row, json_extract(metadata, ?) FROM chunks", (_json_path(field_name),)
+        ):
+            if value is not None:
+                partition.setdefault(str(value), []).append(row)
+        return {value: np.array(rows, dtype=np.int64) for value, rows in partition.items()}
+
+    def _rows_with_values(self, field_name: str, values: tuple) -> np.ndarray:
+        """Rows whose metadata ``field_name`` is one of ``values``, from the side table."""
+        placeholders = ",".join("?" * len(values))
+        rows = self._conn().execute(
+            f"SELECT row FROM chunks WHERE json_extract(metadata, ?) IN ({placeholders}) "
+            "ORDER BY row",
+            (_json_path(field_name), *values),
+        ).fetchall()
+        return np.array([row for (row,) in rows], dtype=np.int64)
+
+    def _ivf_top_k(
+        self, snapshot: _Snapshot, ann: IVFIndex, query: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(rows, distances) of the ``k`` nearest rows among the IVF candidates."""
+        rows = ann.candidates(query, self.config.ivf_nprobe)
+        if ann.rows < snapshot.rows:
+            # Rows appended since the index last caught up: scan them too
+            rows = np.concatenate([rows, np.arange(ann.rows, snapshot.rows)])
+        rows = rows[rows < snapshot.rows]
+        distances = self._distances(snapshot, query[None, :], rows)[:, 0]
+        top = _top_k(distances, k)
+        return rows[top], distances[top]
+
+    def _distances(
+        self, snapshot: _Snapshot, queries: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Squared L2 distances (rows × queries) from every row, or from
+        ``rows`` only, to each query (inf for deleted rows).
+        """
+        if rows is None:
+            matrix = snapshot.matrix[:snapshot.rows]
+            norms = snapshot.norms
+        else:
+            matrix = snapshot.matrix[rows]  # gathers just the candidates
+            norms = snapshot.norms[rows]
+        if matrix.dtype == np.float32:
+            dots = matrix @ queries.T
+        else:
+            dots = np.empty((len(matrix), len(queries)), dtype=np.float32)
+            for start in range(0, len(matrix), HALF_BLOCK_ROWS):
+                block = matrix[start:start + HALF_BLOCK_ROWS]
+                dots[start:start + len(block)] = block.astype(np.float32) @ queries.T
+        distances = norms[:, None] - 2.0 * dots + np.einsum("ij,ij->i", queries, queries)
+        return np.maximum(distances, 0.0, out=distances)
+
+    def _ann_for(self, snapshot: _Snapshot) -> Optional[IVFIndex]:
+        """The IVF index for ``snapshot``, or None when exact search applies."""
+        if (
+            self.config.ann_index != "ivf"
+            or snapshot.matrix is None
+            or len(snapshot.id_rows) < self.config.ann_min_rows
+        ):
+            return None
+        if self._ann_current(snapshot):
+            return self._ann
+        with self._ann_lock:
+            if self._ann_current(snapshot):
+                return self._ann
+            # Another process may already have trained one
+            loaded = IVFIndex.load(self.ann_path)
+            mtime = self._ann_file_mtime()
+            if (
+                loaded is None
+                or loaded.centroids.shape[1] != snapshot.matrix.shape[1]
+                or len(snapshot.id_rows) > IVF_RETRAIN_GROWTH * loaded.trained_rows
+            ):
+                return self._train_ann(snapshot)
+            if loaded.generation != snapshot.generation:
+                # The matrix was compacted since: the centroids still hold,
+                # only the row assignments need redoing
+                loaded = IVFIndex(
+                    loaded.centroids,
+                    np.empty(0, dtype=np.int32),
+                    snapshot.generation,
+                    loaded.trained_rows,
+                )
+                loaded.extend(snapshot.matrix, snapshot.rows)
+                loaded.save(self.ann_path)
+                mtime = self._ann_file_mtime()
+            else:
+                loaded.extend(snapshot.matrix, snapshot.rows)
+            self._ann, self._ann_mtime = loaded, mtime
+            return loaded
+
+    def _train_ann(self, snapshot: _Snapshot) -> IVFIndex:
+        """Run k-means over the live rows and save the index (caller holds _ann_lock)."""
+        started = time.perf_counter()
+        live_rows = np.flatnonzero(np.isfinite(snapshot.norms))
+        nlist = self.config.ivf_nlist or default_nlist(len(live_rows))
+        ann = IVFIndex.train(
+            snapshot.matrix[:snapshot.rows], live_rows, nlist, generation=snapshot.generation
+        )
+        ann.save(self.ann_path)
+        self._ann, self._ann_mtime = ann, self._ann_file_mtime()
+        logger.info(
+            "IVF index trained — %d lists over %d chunks in %.1fs",
+            ann.nlist,
+            len(live_rows),
+            time.perf_counter() - started,
+        )
+        return ann
+
+    def _sync_ann(self, previous: _Snapshot, snapshot: _Snapshot) -> None:
+        """Carry the in-memory IVF index over to a new snapshot (caller holds _lock)."""
+        ann = self._ann
+        if ann is None:
+            return
+        if snapshot.matrix is None:
+            self._ann = None
+        elif ann.generation == snapshot.generation:
+            ann.extend(snapshot.matrix, snapshot.rows)  # incremental inserts
+        elif ann.generation == previous.generation:
+            # Compaction renumbered the rows; follow them by id
+            old_to_new = np.array(
+                [snapshot.id_rows.get(doc_id, -1) if doc_id else -1 for doc_id in previous.row_ids],
+                dtype=np.int64,
+            )
+            ann.remap(
+                old_to_new, snapshot.matrix, np.isfinite(snapshot.norms), snapshot.generation
+            )
+
+    def _ann_current(self, snapshot: _Snapshot) -> bool:
+        """True if the in-memory index matches ``snapshot`` and the saved file."""
+        ann = self._ann
+        return (
+            ann is not None
+            and ann.generation == snapshot.generation
+            and self._ann_file_mtime() == self._ann_mtime
+        )
+
+    def _ann_file_mtime(self) -> Optional[float]:
+        try:
+            return self.ann_path.stat().st_mtime
+        except OSError:
+            return None
+
+    def _current(self) -> _Snapshot:
+        """The snapshot, reloaded first if another process has written since."""
+        version = self._conn().execute(
+            "SELECT value FROM meta WHERE key = 'version'"
+        ).fetchone()
+        if version is not None and int(version[0]) != self._snapshot.version:
+            self._refresh()
+        return self._snapshot
+
+    def _refresh(self, delta: Optional[_Delta] = None) -> None:
+        """
+        Bring the snapshot up to date. ``delta`` is a write this process
+        just committed: when nothing else changed the store since, it is
+        applied in time proportional to the write; otherwise (another
+        process wrote, the matrix was rewritten) the snapshot is rebuilt
+        from disk (row map, mmap, squared norms).
+        """
+        with self._lock:
+            if delta is not None:
+                if self._snapshot.version == delta.version:
+                    return  # another thread already reloaded past it
+                if self._snapshot.version == delta.base_version and self._snapshot.version:
+                    self._apply(delta)
+                    return
+            conn = self._conn()
+            # One read transaction, so rows and meta agree with each other
+            previous = self._snapshot
+            conn.execute("BEGIN")
+            try:
+                meta = self._read_meta(conn)
+                if int(meta.get("version", 0)) == previous.version and previous.version:
+                    return
+                pairs = conn.execute("SELECT row, id FROM chunks").fetchall()
+                generation = int(meta.get("generation", 0))
+                # Partition values of the rows this process has not seen
+                same_file = previous.matrix is not None and previous.generation == generation
+                first_new = previous.rows if same_file else 0
+                fields = tuple(self.config.partition_fields)
+                columns = ", ".join("json_extract(metadata, ?)" for _ in fields)
+                new_values = conn.execute(
+                    f"SELECT row{', ' + columns if fields else ''} FROM chunks WHERE row >= ?",
+                    (*map(_json_path, fields), first_new),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+
+            version = int(meta.get("version", 0))
+            rows = int(meta.get("rows", 0))
+
+            matrix = None
+            if rows and self.vectors_path.exists():
+                if previous.matrix is not None and previous.generation == generation:
+                    matrix = previous.matrix  # same file; new rows are already mapped
+                    if len(matrix) < rows:
+                        matrix = None
+                if matrix is None:
+                    matrix = np.load(self.vectors_path, mmap_mode="r")
+
+            row_ids: list[Optional[str]] = [None] * rows
+            id_rows: dict[str, int] = {}
+            for row, doc_id in pairs:
+                if row < rows:
+                    row_ids[row] = doc_id
+                    id_rows[doc_id] = row
+
+            norms = np.full(rows, np.inf, dtype=np.float32)
+            if matrix is not None:
+                # Rows are never rewritten within a generation, so only
+                # the appended ones need their norms computed
+                reuse = 0
+                if previous.generation == generation and previous.matrix is not None:
+                    reuse = min(previous.rows, rows)
+                    norms[:reuse] = previous.norms[:reuse]
+                for start in range(reuse, rows, HALF_BLOCK_ROWS):
+                    stop = min(start + HALF_BLOCK_ROWS, rows)
+                    block = np.asarray(matrix[start:stop], dtype=np.float32)
+                    norms[start:stop] = np.einsum("ij,ij->i", block, block)
+                dead = np.fromiter((doc_id is None for doc_id in row_ids), dtype=bool, count=rows)
+                norms[dead] = np.inf
+
+            partitions = {}
+            for i, field_name in enumerate(fields, 1):
+                grouped: dict[str, list[int]] = {}
+                for record in new_values:
+                    if record[i] is not None and record[0] < rows:
+                        grouped.setdefault(str(record[i]), []).append(record[0])
+                known = previous.partitions.get(field_name, {}) if first_new else {}
+                partition = dict(known)
+                for value, value_rows in grouped.items():
+                    added = np.array(value_rows, dtype=np.int64)
+                    partition[value] = (
+                        np.concatenate([known[value], added]) if value in known else added
+                    )
+                partitions[field_name] = partition
+
+            self._snapshot = _Snapshot(
+                version=version,
+                generation=generation,
+                matrix=matrix,
+                rows=rows,
+                norms=norms,
+                row_ids=row_ids,
+                id_rows=id_rows,
+                partitions=partitions,
+            )
+            self._sync_ann(previous, self._snapshot)
+
+    def _apply(self, delta: _Delta) -> None:
+        """Apply this process's own write to the snapshot (caller holds _lock)."""
+        previous = self._snapshot
+        rows = delta.rows
+        matrix = previous.matrix
+        if rows and (matrix is None or len(matrix) < rows):
+            matrix = np.load(self.vectors_path, mmap_mode="r")
+
+        # Copies, not in-place edits: readers may still hold the old snapshot
+        row_ids = previous.row_ids + [None] * (rows - previous.rows)
+        id_rows = dict(previous.id_rows)
+        norms = np.full(rows, np.inf, dtype=np.float32)
+        norms[:previous.rows] = previous.norms
+        dead = []
+        for doc_id in delta.removed:
+            row = id_rows.pop(doc_id, None)
+            if row is not None:
+                row_ids[row] = None
+                dead.append(row)
+        for doc_id, row in delta.added.items():
+            old_row = id_rows.get(doc_id)
+            if old_row is not None and old_row != row:
+                row_ids[old_row] = None
+                dead.append(old_row)
+            id_rows[doc_id] = row
+            row_ids[row] = doc_id
+        if rows > previous.rows:
+            block = np.asarray(matrix[previous.rows:rows], dtype=np.float32)
+            norms[previous.rows:rows] = np.einsum("ij,ij->i", block, block)
+        norms[dead] = np.inf
+
+        partitions = {}
+        for field_name in self.config.partition_fields:
+            grouped: dict[str, list[int]] = {}
+            for row, metadata in delta.metadatas.items():
+                value = _partition_value(metadata.get(field_name))
+                if value is not None:
+                    grouped.setdefault(value, []).append(row)
+            partition = dict(previous.partitions.get(field_name, {}))
+            for value, value_rows in grouped.items():
+                added = np.array(value_rows, dtype=np.int64)
+                partition[value] = (
+                    np.concatenate([partition[value], added]) if value in partition else added
+                )
+            partitions[field_name] = partition
+
+        self._snapshot = _Snapshot(
+            version=delta.version,
+            generation=previous.generation,
+            matrix=matrix if rows else None,
+            rows=rows,
+            norms=norms,
+            row_ids=row_ids,
+            id_rows=id_rows,
+            partitions=partitions,
+        )
+        self._sync_ann(previous, self._snapshot)
+
+    def _grow(
+        self,
+        conn: sqlite3.Connection,
+        rows: int,
+        incoming: int,
+        dim: int,
+        dtype: str,
+        generation: int,
+    ) -> tuple[int, int]:
+        """
+        Rewrite vectors.npy with room for ``incoming`` more rows, dropping
+        deleted rows. Runs inside the caller's write transaction; returns the new
+        (rows, generation).
+        """
+        live = conn.execute("SELECT row FROM chunks ORDER BY row").fetchall()
+        live_rows = [row for (row,) in live]
+        capacity = max(INITIAL_CAPACITY, self._capacity())
+        required = len(live_rows) + incoming
+        while capacity < required:
+            capacity *= 2
+
+        tmp_path = self.vectors_path.with_suffix(".npy.tmp")
+        new_matrix = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.dtype(dtype), shape=(capacity, dim)
+        )
+        if live_rows:
+            old_matrix = np.load(self.vectors_path, mmap_mode="r")
+            for start in range(0, len(live_rows), HALF_BLOCK_ROWS):
+                chunk = live_rows[start:start + HALF_BLOCK_ROWS]
+                new_matrix[start:start + len(chunk)] = old_matrix[chunk]
+            del old_matrix
+        new_matrix.flush()
+        del new_matrix
+        os.replace(tmp_path, self.vectors_path)
+
+        # Ascending order never collides: a row only moves down into a
+        # slot that is free or has already been vacated
+        conn.executemany(
+            "UPDATE chunks SET row = ? WHERE row = ?",
+            [(new, old) for new, old in enumerate(live_rows) if new != old],
+        )
+        if rows:
+            logger.info(
+                "Vector matrix grown to %d rows (%d live, %d deleted dropped)",
+                capacity,
+                len(live_rows),
+                rows - len(live_rows),
+            )
+        return len(live_rows), generation + 1
+
+    def _capacity(self) -> int:
+        if not self.vectors_path.exists():
+            return 0
+        return len(np.load(self.vectors_path, mmap_mode="r"))
+
+    @staticmethod
+    def _read_meta(conn: sqlite3.Connection) -> dict[str, str]:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    @staticmethod
+    def _write_meta(conn: sqlite3.Connection, **values) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread, reopened after fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+def _json_path(field_name: str) -> str:
+    """SQLite JSON path of a top-level metadata key."""
+    return '$."' + field_name.replace('"', '\\"') + '"'
+
+
+def _partition_value(value) -> Optional[str]:
+    """A metadata value as _refresh reads it back through json_extract."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value)
+
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` smallest finite distances, closest first."""
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(distances):
+        top = np.argpartition(distances, k - 1)[:k]
+    else:
+        top = np.arange(len(distances))
+    top = top[np.argsort(distances[top], kind="stable")]
+    return top[np.isfinite(distances[top])]  # deleted rows
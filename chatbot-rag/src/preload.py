@@ -0,0 +1,65 @@
+"""
+Preload — Fork-Safe Warm-Up for Pre-Forking Servers
+=====================================================
+Builds a RAGChatbot in a server master process (gunicorn ``preload_app``)
+so forked workers inherit the imported libraries, embedding model, caches
+and — when ``retrieval_mode`` uses it (lexical / hybrid) — the BM25 index
+copy-on-write.
+
+ChromaDB's native client cannot be used in a process that later forks:
+its internal thread pools do not survive ``fork()`` and the first query
+in the child hangs. All collection work of the warm-up (bootstrapping an
+empty store, reading the chunks for the BM25 index) therefore runs in a
+short-lived *spawned* process, and the master only receives the built
+lexical index (nothing in vector mode). Workers open ChromaDB themselves
+after the fork.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from src.chatbot import RAGChatbot
+from src.lexical_index import BM25Index
+from src.utils import Config, logger
+
+
+def _bootstrap(config: Config, load_samples_if_empty: bool) -> Optional[BM25Index]:
+    """
+    Spawned-process entry point: make sure the store has data, return its
+    BM25 index (None in vector mode, where it is never queried).
+    """
+    chatbot = RAGChatbot(config)
+    if load_samples_if_empty and chatbot.em.document_count == 0:
+        logger.warning("Vector store empty — loading sample documents.")
+        chatbot.load_sample_documents()
+    # Saved next to the store (numpy backend + ANN), so workers load it
+    chatbot.em.vectorstore.warm_up()
+    if config.retrieval_mode == "vector":
+        return None
+    return chatbot.em.get_lexical_index()
+
+
+def preload_chatbot(
+    config: Optional[Config] = None, load_samples_if_empty: bool = True
+) -> RAGChatbot:
+    """
+    Build a chatbot that is safe to fork.
+
+    Call ``chatbot.reset_after_fork()`` in every worker before use.
+    """
+    config = config or Config()
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        lexical_index = pool.submit(_bootstrap, config, load_samples_if_empty).result()
+
+    chatbot = RAGChatbot(config, defer_store=True)
+    if lexical_index is None:
+        logger.info("Chatbot preloaded (vector retrieval, no BM25 index)")
+    else:
+        chatbot.em.set_lexical_index(lexical_index)
+        logger.info(
+            "Chatbot preloaded — %d chunks in the shared BM25 index", len(lexical_index)
+        )
+    return chatbot
@@ -0,0 +1,319 @@
+"""
+Prometheus — Counters, Histograms and Text Exposition
+=======================================================
+A dependency-free subset of the Prometheus client: labelled counters
+and histograms kept in a process-wide registry and rendered in the
+text exposition format for the ``/metrics`` endpoints of the FastAPI
+app and the WhatsApp webhook.
+
+Every process counts in memory. Under gunicorn a scrape reaches a
+single worker, so with ``PROMETHEUS_MULTIPROC_DIR`` set (gunicorn.conf.py
+sets it) each process also saves its series to ``<dir>/<pid>-<start>.json``
+about once a second, and ``render()`` sums the files of all workers:
+counters and histogram buckets add up, and the files of exited workers
+stay, so totals never go backwards. The directory must be emptied
+before the server starts (gunicorn.conf.py does it).
+Without it each process reports only its own series.
+
+Standard library only.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Iterable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+MULTIPROC_FLUSH_INTERVAL = 1.0  # seconds between saves of a process's series
+
+# Seconds — from a cached embedding lookup to a slow LLM completion
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally labelled."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> dict[tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def combine(total: float, value: float) -> float:
+        return total + value
+
+    def samples(self, values: Optional[dict] = None) -> list[str]:
+        if values is None:
+            values = self.snapshot()
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally labelled."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values → [bucket counts..., sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-1] += value
+
+    def snapshot(self) -> dict[tuple[str, ...], list[float]]:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def combine(total: list[float], series: list[float]) -> list[float]:
+        return [a + b for a, b in zip(total, series)]
+
+    def samples(self, values: Optional[dict] = None) -> list[str]:
+        if values is None:
+            values = self.snapshot()
+        lines = []
+        for key, series in sorted(values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    """
+    Named metrics of one process, optionally summed with other processes
+    sharing ``multiprocess_dir`` (see the module docstring).
+
+    Usage:
+        requests = REGISTRY.counter("rag_requests", "Chat requests", ["cache"])
+        requests.inc(cache="miss")
+        REGISTRY.render()             # text for GET /metrics
+    """
+
+    def __init__(self, multiprocess_dir: Optional[str | Path] = None):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir = Path(multiprocess_dir) if multiprocess_dir else None
+        self._flusher_pid: Optional[int] = None
+        self._save_lock = threading.Lock()
+        self._file_name = _process_file_name()
+        if self.multiprocess_dir is not None:
+            self.multiprocess_dir.mkdir(parents=True, exist_ok=True)
+            # A forked child starts from zero: its parent's counts are
+            # already in the parent's file
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()._after_fork())
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Optional[Iterable[float]] = None,
+    ) -> Histogram:
+        return self._register(
+            Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS)
+        )
+
+    def _register(self, metric):
+        # Idempotent, so modules that get re-imported reuse their series
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        self._start_flusher()
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = {metric.name: metric for metric in self._metrics.values()}
+        values = {name: metric.snapshot() for name, metric in metrics.items()}
+        if self.multiprocess_dir is not None:
+            self.save()
+            for name, (metric, series) in self._other_processes().items():
+                metrics.setdefault(name, metric)
+                merged = values.setdefault(name, {})
+                for key, value in series.items():
+                    merged[key] = metric.combine(merged[key], value) if key in merged else value
+
+        lines: list[str] = []
+        for name in sorted(metrics):
+            metric = metrics[name]
+            exposed = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {exposed} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {exposed} {metric.kind}")
+            lines.extend(metric.samples(values[name]))
+        return "\n".join(lines) + "\n"
+
+    # ─── Multiprocess ────────────────────────────────────
+
+    def save(self) -> None:
+        """Write this process's series to its file in ``multiprocess_dir``."""
+        if self.multiprocess_dir is None:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        state = {}
+        for metric in metrics:
+            series = metric.snapshot()
+            if series:
+                state[metric.name] = {
+                    "kind": metric.kind,
+                    "documentation": metric.documentation,
+                    "labelnames": list(metric.labelnames),
+                    "buckets": [b for b in getattr(metric, "buckets", ()) if b != math.inf],
+                    "series": [[list(key), value] for key, value in series.items()],
+                }
+        path = self.multiprocess_dir / self._file_name
+        if not state and not path.exists():
+            return
+        with self._save_lock:
+            tmp_path = path.with_suffix(".json.tmp")
+            tmp_path.write_text(json.dumps(state), encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    def _other_processes(self) -> dict[str, tuple[Counter | Histogram, dict]]:
+        """Series saved by every other process, summed per metric."""
+        merged: dict[str, tuple[Counter | Histogram, dict]] = {}
+        for path in self.multiprocess_dir.glob("*.json"):
+            if path.name == self._file_name:
+                continue
+            try:
+                state = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue  # removed or half-written meanwhile
+            for name, saved in state.items():
+                if name not in merged:
+                    if saved["kind"] == "counter":
+                        metric = Counter(name, saved["documentation"], saved["labelnames"])
+                    else:
+                        metric = Histogram(
+                            name, saved["documentation"], saved["labelnames"], saved["buckets"]
+                        )
+                    merged[name] = (metric, {})
+                metric, totals = merged[name]
+                for key, value in saved["series"]:
+                    key = tuple(key)
+                    totals[key] = metric.combine(totals[key], value) if key in totals else value
+        return merged
+
+    def _start_flusher(self) -> None:
+        if self.multiprocess_dir is None or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        ref = weakref.ref(self)
+
+        def run() -> None:
+            while True:
+                time.sleep(MULTIPROC_FLUSH_INTERVAL)
+                registry = ref()
+                if registry is None or registry._flusher_pid != os.getpid():
+                    return
+                try:
+                    registry.save()
+                except OSError:
+                    pass  # next round; render() saves before reading anyway
+                del registry
+
+        threading.Thread(target=run, name="prometheus-flush", daemon=True).start()
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+        self._file_name = _process_file_name()
+        self._flusher_pid = None
+        if self._metrics:
+            self._start_flusher()
+
+
+def _process_file_name() -> str:
+    """File of this process in the multiprocess dir (unique even if a pid is reused)."""
+    return f"{os.getpid()}-{time.time_ns()}.json"
+
+
+REGISTRY = Registry(os.getenv(MULTIPROC_DIR_ENV) or None)
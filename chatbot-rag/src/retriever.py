@@ -5,13 +5,23 @@ Wraps the EmbeddingsManager to provide structured retrieval
 results with confidence evaluation and source metadata.
 """
 
-from dataclasses import dataclass
+import asyncio
+import time
+from dataclasses import dataclass, field
 from typing import Optional
 
 from langchain_core.documents import Document
 
 from src.embeddings_manager import EmbeddingsManager
+from src.latency import span
+from src.lexical_index import reciprocal_rank_fusion
+from src.reranker import RERANKS, create_reranker
+from src.topic_router import TopicRouter
 from src.utils import Config, logger
+from src.vector_stores import Where, where_key
+
+# "vector": embeddings only · "lexical": BM25 only · "hybrid": both, fused with RRF
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
 
 
 @dataclass
@@ -24,6 +34,7 @@ class RetrievalResult:
     total_chunks: int
     similarity_score: float
     is_relevant: bool  # True if score >= confidence_threshold
+    chunk_id: str = ""
 
     def to_dict(self) -> dict:
         return {
@@ -45,6 +56,13 @@ class RetrievalResponse:
     avg_confidence: float
     has_relevant_results: bool
     docs_consulted: int
+    query_embedding: Optional[list[float]] = field(default=None, repr=False)
+    filter: Optional[Where] = None  # metadata filter the search ran with
+
+    @property
+    def chunk_ids(self) -> tuple[str, ...]:
+        """IDs of the retrieved chunks, in rank order."""
+        return tuple(r.chunk_id for r in self.results)
 
     def get_context_text(self) -> str:
         """Format results into a context string for the LLM."""
@@ -74,8 +92,13 @@ class RetrievalResponse:
 
 class RAGRetriever:
     """
-    Orchestrates semantic search over the vector store with
-    relevance evaluation and structured output.
+    Orchestrates semantic (and optionally BM25) search over the vector
+    store with relevance evaluation and structured output.
+
+    The search strategy follows ``config.retrieval_mode``; in hybrid mode
+    vector and BM25 rankings are merged with reciprocal rank fusion, and
+    every result keeps its vector relevance score so confidence means
+    the same thing in all modes.
 
     Usage:
         retriever = RAGRetriever(embeddings_manager, config)
@@ -84,6 +107,18 @@ class RAGRetriever:
         if response.has_relevant_results:
             context = response.get_context_text()
             sources = response.get_sources_summary()
+
+        # many questions at once (evaluation, coalesced messages)
+        responses = retriever.retrieve_many(["¿Precios?", "¿Horarios?"])
+
+        # restricted to some documents (metadata filter)
+        response = retriever.retrieve("¿Precios?", where={"source_file": "04_precios.md"})
+
+    With ``config.topic_router`` on, unfiltered queries are narrowed to
+    the closest partitions (see topic_router); if that finds nothing the
+    query falls back to the whole collection. With ``config.reranker``
+    set, ``rerank_candidates`` chunks are fetched and the reranker picks
+    the best top_k within ``rerank_budget_ms`` (see reranker).
     """
 
     def __init__(
@@ -93,9 +128,16 @@ class RAGRetriever:
     ):
         self.em = embeddings_manager
         self.config = config or Config()
+        if self.config.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(
+                f"Unknown retrieval_mode '{self.config.retrieval_mode}'. "
+                f"Supported: {', '.join(RETRIEVAL_MODES)}"
+            )
+        self.router = TopicRouter(self.em, self.config) if self.config.topic_router else None
+        self.reranker = create_reranker(self.config)
 
     def retrieve(
-        self, query: str, top_k: Optional[int] = None
+        self, query: str, top_k: Optional[int] = None, where: Optional[Where] = None
     ) -> RetrievalResponse:
         """
         Search the vector store and return structured results.
@@ -103,6 +145,8 @@ class RAGRetriever:
         Args:
             query: The user's question.
             top_k: Number of results to return (defaults to config).
+            where: Metadata filter, e.g. {"source_file": "04_precios.md"};
+                overrides the topic router.
 
         Returns:
             RetrievalResponse with results, confidence info, and context.
@@ -110,8 +154,270 @@ class RAGRetriever:
         k = top_k or self.config.top_k
 
         # Perform similarity search
-        raw_results = self.em.similarity_search(query, k=k)
+        with span("embedding"):
+            embedding = self.em.embed_query(query)
+        with span("search"):
+            raw_results, where = self._routed_search(
+                query, embedding, self._candidates_k(k), where
+            )
+        raw_results = self._rerank(query, raw_results, k)
+        return self._build_response(query, raw_results, embedding, where)
+
+    async def aretrieve(
+        self, query: str, top_k: Optional[int] = None, where: Optional[Where] = None
+    ) -> RetrievalResponse:
+        """Async variant of retrieve, for use from the FastAPI event loop."""
+        k = top_k or self.config.top_k
+        with span("embedding"):
+            embedding = await self.em.aembed_query(query)
+        with span("search"):
+            raw_results, where = await asyncio.to_thread(
+                self._routed_search, query, embedding, self._candidates_k(k), where
+            )
+        if self.reranker is not None:
+            raw_results = await asyncio.to_thread(self._rerank, query, raw_results, k)
+        return self._build_response(query, raw_results, embedding, where)
+
+    def retrieve_many(
+        self,
+        queries: list[str],
+        top_k: Optional[int] = None,
+        where: Optional[Where] = None,
+    ) -> list[RetrievalResponse]:
+        """
+        retrieve() for a batch of queries.
+
+        All queries are embedded in one embedding request and the vector
+        side of the search is one batched vector store operation, so the
+        cost of N queries is one round trip rather than N.
+
+        Args:
+            queries: The questions, in the order results are wanted.
+            top_k: Number of results per query (defaults to config).
+            where: Metadata filter applied to every query (see retrieve).
 
+        Returns:
+            One RetrievalResponse per query, in the same order.
+        """
+        if not queries:
+            return []
+        k = top_k or self.config.top_k
+        with span("embedding"):
+            embeddings = self.em.embed_queries(queries)
+        with span("search"):
+            raw_results, filters = self._routed_search_many(
+                queries, embeddings, self._candidates_k(k), where
+            )
+        raw_results = self._rerank_many(queries, raw_results, k)
+        return [
+            self._build_response(query, raw, embedding, query_where)
+            for query, raw, embedding, query_where in zip(
+                queries, raw_results, embeddings, filters
+            )
+        ]
+
+    async def aretrieve_many(
+        self,
+        queries: list[str],
+        top_k: Optional[int] = None,
+        where: Optional[Where] = None,
+    ) -> list[RetrievalResponse]:
+        """Async variant of retrieve_many."""
+        if not queries:
+            return []
+        k = top_k or self.config.top_k
+        with span("embedding"):
+            embeddings = await self.em.aembed_queries(queries)
+        with span("search"):
+            raw_results, filters = await asyncio.to_thread(
+                self._routed_search_many, queries, embeddings, self._candidates_k(k), where
+            )
+        if self.reranker is not None:
+            raw_results = await asyncio.to_thread(self._rerank_many, queries, raw_results, k)
+        return [
+            self._build_response(query, raw, embedding, query_where)
+            for query, raw, embedding, query_where in zip(
+                queries, raw_results, embeddings, filters
+            )
+        ]
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _routed_search(
+        self, query: str, embedding: list[float], k: int, where: Optional[Where]
+    ) -> tuple[list[tuple[Document, float]], Optional[Where]]:
+        """
+        _search with the caller's filter, or else the topic router's.
+        Returns the results and the filter they were found with.
+        """
+        if where or self.router is None:
+            return self._search(query, embedding, k, where=where), where
+        routed = self.router.route(embedding)
+        if routed:
+            results = self._search(query, embedding, k, where=routed)
+            if results:
+                return results, routed
+        return self._search(query, embedding, k), None
+
+    def _routed_search_many(
+        self,
+        queries: list[str],
+        embeddings: list[list[float]],
+        k: int,
+        where: Optional[Where],
+    ) -> tuple[list[list[tuple[Document, float]]], list[Optional[Where]]]:
+        """_routed_search for a batch: one batched search per distinct filter."""
+        if where or self.router is None:
+            filters = [where] * len(queries)
+        else:
+            filters = [self.router.route(embedding) for embedding in embeddings]
+
+        groups: dict[Optional[tuple], list[int]] = {}
+        for i, query_where in enumerate(filters):
+            groups.setdefault(where_key(query_where), []).append(i)
+        results: list[list[tuple[Document, float]]] = [[] for _ in queries]
+        for members in groups.values():
+            group_where = filters[members[0]]
+            found = self._search_many(
+                [queries[i] for i in members], [embeddings[i] for i in members], k, group_where
+            )
+            for i, hits in zip(members, found):
+                results[i] = hits
+
+        # Routed queries that found nothing fall back to the whole collection
+        if not where:
+            empty = [i for i, hits in enumerate(results) if not hits and filters[i]]
+            if empty:
+                found = self._search_many(
+                    [queries[i] for i in empty], [embeddings[i] for i in empty], k
+                )
+                for i, hits in zip(empty, found):
+                    results[i], filters[i] = hits, None
+        return results, filters
+
+    def _search(
+        self,
+        query: str,
+        embedding: list[float],
+        k: int,
+        vector_hits: Optional[list[tuple[Document, float]]] = None,
+        where: Optional[Where] = None,
+    ) -> list[tuple[Document, float]]:
+        """
+        Run the configured search strategy, returning (Document, relevance).
+
+        ``vector_hits`` are the query's vector search results when the
+        caller already has them (batched search); they must hold ``k``
+        hits in vector mode and ``_fetch_k(k)`` in hybrid mode. ``where``
+        restricts both the vector and the BM25 side to matching chunks.
+        """
+        mode = self.config.retrieval_mode
+        if mode == "vector":
+            if vector_hits is not None:
+                return vector_hits
+            return self.em.similarity_search_by_vector(embedding, k=k, query=query, where=where)
+
+        fetch_k = self._fetch_k(k)
+        lexical_ids = [
+            doc_id for doc_id, _ in self.em.lexical_search(query, fetch_k, where=where)
+        ]
+
+        if mode == "lexical":
+            vector_hits = []
+            ranked_ids = lexical_ids[:k]
+        else:
+            if vector_hits is None:
+                vector_hits = self.em.similarity_search_by_vector(
+                    embedding, k=fetch_k, query=query, where=where
+                )
+            fused = reciprocal_rank_fusion(
+                [[doc.id for doc, _ in vector_hits], lexical_ids],
+                k=self.config.rrf_k,
+            )
+            ranked_ids = [doc_id for doc_id, _ in fused[:k]]
+
+        # Lexical-only hits: fetch their text and score them against the query vector
+        found = {doc.id: (doc, score) for doc, score in vector_hits}
+        missing = [doc_id for doc_id in ranked_ids if doc_id not in found]
+        if missing:
+            docs = self.em.get_documents(missing)
+            scores = self.em.relevance_scores(embedding, missing)
+            for doc_id, doc in docs.items():
+                found[doc_id] = (doc, scores.get(doc_id, 0.0))
+
+        return [found[doc_id] for doc_id in ranked_ids if doc_id in found]
+
+    def _search_many(
+        self,
+        queries: list[str],
+        embeddings: list[list[float]],
+        k: int,
+        where: Optional[Where] = None,
+    ) -> list[list[tuple[Document, float]]]:
+        """_search for a batch, with the vector searches run as one operation."""
+        mode = self.config.retrieval_mode
+        if mode == "lexical":
+            batch_hits: list[Optional[list]] = [None] * len(queries)
+        else:
+            fetch_k = k if mode == "vector" else self._fetch_k(k)
+            batch_hits = self.em.similarity_search_many_by_vector(
+                embeddings, k=fetch_k, where=where
+            )
+        return [
+            self._search(query, embedding, k, vector_hits=hits, where=where)
+            for query, embedding, hits in zip(queries, embeddings, batch_hits)
+        ]
+
+    def _candidates_k(self, k: int) -> int:
+        """Chunks to search for: over-fetched when a reranker picks the final k."""
+        if self.reranker is None:
+            return k
+        return max(self.config.rerank_candidates, k)
+
+    def _rerank(
+        self, query: str, candidates: list[tuple[Document, float]], k: int
+    ) -> list[tuple[Document, float]]:
+        """
+        The best ``k`` candidates by the reranker, or the first ``k`` in
+        search order when there is none. Candidates the reranker had no
+        time for keep their search order (see reranker).
+        """
+        if self.reranker is None or len(candidates) < 2:
+            return candidates[:k]
+        deadline = time.perf_counter() + self.config.rerank_budget_ms / 1000
+        with span("rerank"):
+            ranked, scored = self.reranker.rerank(query, candidates, k, deadline)
+        if scored < len(candidates):
+            RERANKS.inc(outcome="partial" if scored else "skipped")
+            logger.warning(
+                "Rerank for '%s' scored %d/%d candidates within the %.0fms budget",
+                query[:60],
+                scored,
+                len(candidates),
+                self.config.rerank_budget_ms,
+            )
+        else:
+            RERANKS.inc(outcome="applied")
+        return ranked
+
+    def _rerank_many(
+        self, queries: list[str], candidates: list[list[tuple[Document, float]]], k: int
+    ) -> list[list[tuple[Document, float]]]:
+        """_rerank for a batch; each query has its own time budget."""
+        return [self._rerank(query, hits, k) for query, hits in zip(queries, candidates)]
+
+    def _fetch_k(self, k: int) -> int:
+        """Candidates taken from each ranking before hybrid fusion."""
+        return max(self.config.hybrid_fetch_k, k)
+
+    def _build_response(
+        self,
+        query: str,
+        raw_results: list[tuple[Document, float]],
+        query_embedding: Optional[list[float]] = None,
+        where: Optional[Where] = None,
+    ) -> RetrievalResponse:
+        """Turn raw (Document, score) pairs into a RetrievalResponse."""
         if not raw_results:
             logger.info("No results found for query: '%s'", query[:60])
             return RetrievalResponse(
@@ -120,6 +426,8 @@ class RAGRetriever:
                 avg_confidence=0.0,
                 has_relevant_results=False,
                 docs_consulted=0,
+                query_embedding=query_embedding,
+                filter=where,
             )
 
         # Build structured results
@@ -133,6 +441,7 @@ class RAGRetriever:
                     total_chunks=doc.metadata.get("total_chunks", 1),
                     similarity_score=score,
                     is_relevant=score >= self.config.confidence_threshold,
+                    chunk_id=doc.id or "",
                 )
             )
 
@@ -154,4 +463,6 @@ class RAGRetriever:
             avg_confidence=avg_confidence,
             has_relevant_results=has_relevant,
             docs_consulted=len(results),
+            query_embedding=query_embedding,
+            filter=where,
         )
@@ -0,0 +1,157 @@
+"""
+Session Store — Per-Conversation Memory
+=========================================
+Keeps one bounded conversation history per session key (WhatsApp
+sender, API session_id, Streamlit tab) with LRU + TTL eviction.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from src.utils import Config, logger
+
+DEFAULT_SESSION = "default"
+
+# Minimum seconds between full sweeps triggered by get(), so sessions of
+# senders who never come back are freed without scanning on every call
+SWEEP_INTERVAL = 60.0
+
+
+class ConversationSession:
+    """
+    Sliding window of the last N exchanges for a single conversation.
+
+    Backed by a ``deque`` with ``maxlen``, so appending an exchange is
+    O(1) and the oldest messages fall off automatically.
+    """
+
+    def __init__(self, memory_window: int):
+        self.messages: deque[dict] = deque(maxlen=max(memory_window, 0) * 2)
+        self.last_access = time.monotonic()
+
+    def add_exchange(self, user_message: str, assistant_response: str) -> None:
+        """Append a user/assistant pair to the window."""
+        self.messages.append({"role": "user", "content": user_message})
+        self.messages.append({"role": "assistant", "content": assistant_response})
+
+    def touch(self) -> None:
+        """Refresh the last-access timestamp."""
+        self.last_access = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+
+class SessionStore:
+    """
+    Bounded map of session key → ConversationSession.
+
+    - LRU: when ``max_sessions`` is reached the least recently used
+      session is evicted.
+    - TTL: sessions idle for longer than ``session_ttl`` seconds are
+      dropped on access and by a sweep that ``get()`` runs at most
+      every ``SWEEP_INTERVAL`` seconds.
+
+    The store lock only guards the key → session map; each chat turn
+    works on its own session, so concurrent conversations never
+    contend on a shared history list.
+
+    Usage:
+        store = SessionStore(config)
+        session = store.get("whatsapp:+5491123456789")
+        session.add_exchange("Hola", "¡Bienvenido!")
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    # ─── Public API ──────────────────────────────────────
+
+    def get(self, session_id: Optional[str] = None) -> ConversationSession:
+        """Return the session for ``session_id``, creating it if needed."""
+        key = session_id or DEFAULT_SESSION
+        now = time.monotonic()
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self._last_sweep = now
+            self.sweep()
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and self._is_expired(session, now):
+                del self._sessions[key]
+                session = None
+
+            if session is None:
+                session = ConversationSession(self.config.memory_window)
+                self._sessions[key] = session
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(key)
+
+            session.touch()
+            return session
+
+    def history(self, session_id: Optional[str] = None) -> list[dict]:
+        """Return a snapshot of the messages stored for ``session_id``."""
+        key = session_id or DEFAULT_SESSION
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or self._is_expired(session, time.monotonic()):
+                return []
+            return list(session.messages)
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        """Drop one session, or every session when ``session_id`` is None."""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def sweep(self) -> int:
+        """Remove all expired sessions. Returns how many were dropped."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, session in self._sessions.items()
+                if self._is_expired(session, now)
+            ]
+            for key in expired:
+                del self._sessions[key]
+        if expired:
+            logger.info("Expired %d idle sessions.", len(expired))
+        return len(expired)
+
+    @property
+    def active_sessions(self) -> int:
+        """Number of sessions currently held in memory."""
+        return len(self._sessions)
+
+    @property
+    def total_messages(self) -> int:
+        """Total messages held across all sessions."""
+        with self._lock:
+            return sum(len(s) for s in self._sessions.values())
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _is_expired(self, session: ConversationSession, now: float) -> bool:
+        ttl = self.config.session_ttl
+        return ttl > 0 and now - session.last_access > ttl
+
+    def _evict(self, now: float) -> None:
+        """Drop expired sessions from the LRU end, then enforce the size cap."""
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if not self._is_expired(oldest, now):
+                break
+            self._sessions.popitem(last=False)
+
+        while len(self._sessions) > self.config.max_sessions:
+            key, _ = self._sessions.popitem(last=False)
+            logger.debug("Evicted least recently used session: %s", key)
@@ -0,0 +1,172 @@
+"""
+Startup — Background Warm-Up and Import Profiling
+===================================================
+Helpers that keep web entry points responsive while the RAG stack
+(langchain, ChromaDB, OpenAI clients, the vector index) loads: the
+chatbot is built in a background thread, liveness answers at once and
+readiness flips when the warm-up finishes. ``profile_startup`` reports
+where cold-start time goes (``--profile-startup`` on the entry points).
+
+This module must stay cheap to import: standard library only.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundWarmup(Generic[T]):
+    """
+    Build an expensive object once, off the request path.
+
+    Usage:
+        warmup = BackgroundWarmup("RAG chatbot", RAGChatbot).start()
+        chatbot = warmup.get(timeout=10)   # None if still loading / failed
+        warmup.status()                    # for a /ready endpoint
+    """
+
+    def __init__(self, name: str, builder: Callable[[], T]):
+        self.name = name
+        self.builder = builder
+        self.value: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.seconds: Optional[float] = None
+        self._done = threading.Event()
+        self._started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "BackgroundWarmup[T]":
+        """Begin building in a daemon thread (idempotent)."""
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.perf_counter()
+                threading.Thread(target=self._build, name=f"warmup-{self.name}", daemon=True).start()
+        return self
+
+    def run(self) -> "BackgroundWarmup[T]":
+        """Build synchronously in the calling thread (e.g. a preforking master)."""
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.perf_counter()
+            else:
+                return self
+        self._build()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def get(self, timeout: Optional[float] = 0.0) -> Optional[T]:
+        """The built object, waiting up to ``timeout`` seconds; None if not available."""
+        if not self._done.is_set() and timeout != 0:
+            self._done.wait(timeout)
+        return self.value if self.ready else None
+
+    def status(self) -> dict:
+        if self._started_at is None:
+            state = "not_started"
+        elif not self._done.is_set():
+            state = "warming_up"
+        else:
+            state = "ready" if self.error is None else "failed"
+        return {
+            "component": self.name,
+            "state": state,
+            "ready": self.ready,
+            "warmup_seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "error": repr(self.error) if self.error else None,
+        }
+
+    def _build(self) -> None:
+        try:
+            self.value = self.builder()
+        except BaseException as e:  # reported via status(); the process keeps serving /health
+            self.error = e
+            print(f"⚠️ Warm-up of {self.name} failed: {e}", file=sys.stderr)
+        finally:
+            self.seconds = time.perf_counter() - self._started_at
+            self._done.set()
+
+
+# ─── Import Profiling ───────────────────────────────────
+
+_PROFILE_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__({module!r}, fromlist=["_"])
+imported = time.perf_counter()
+warmup = getattr(module, {warmup_attr!r}, None)
+if warmup is not None:
+    warmup.start()
+    warmup.get(timeout=None)
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "ready_seconds": time.perf_counter() - start,
+    "warmup": warmup.status() if warmup is not None else None,
+}}))
+"""
+
+
+def profile_startup(
+    module: str,
+    cwd: Optional[str] = None,
+    warmup_attr: str = "warmup",
+    top: int = 15,
+) -> dict:
+    """
+    Import ``module`` in a fresh interpreter with ``-X importtime`` and
+    wait for its warm-up, returning timings and the slowest packages.
+
+    ``import_seconds`` is the critical path to serving ``/health``;
+    ``ready_seconds`` includes the background warm-up.
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         _PROFILE_SNIPPET.format(module=module, warmup_attr=warmup_attr)],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    result_lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not result_lines:
+        raise RuntimeError(f"Startup profile of {module} failed:\n{proc.stderr[-2000:]}")
+    report = json.loads(result_lines[-1])
+
+    # "import time: self [us] | cumulative | imported package", one line per module
+    self_us: dict[str, int] = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        self_us[parts[2].strip().split(".")[0]] += int(parts[0])
+
+    report["packages"] = [
+        (package, round(us / 1e6, 3))
+        for package, us in sorted(self_us.items(), key=lambda item: item[1], reverse=True)[:top]
+    ]
+    return report
+
+
+def print_startup_profile(module: str, cwd: Optional[str] = None) -> None:
+    """Human-readable report for the ``--profile-startup`` flags."""
+    report = profile_startup(module, cwd=cwd)
+    print(f"\nStartup profile — {module}")
+    print(f"  import (time to /health): {report['import_seconds']:.3f}s")
+    print(f"  ready  (after warm-up):   {report['ready_seconds']:.3f}s")
+    if report["warmup"] and report["warmup"]["error"]:
+        print(f"  warm-up error: {report['warmup']['error']}")
+    print("\n  Import time by top-level package (self time, all threads):")
+    for package, seconds in report["packages"]:
+        print(f"    {package:<28} {seconds:>7.3f}s")
@@ -0,0 +1,80 @@
+"""
+Topic Router — Narrow a Query to its Closest Partitions
+=========================================================
+Lightweight router for RAGRetriever (``Config.topic_router``): every
+value of ``Config.router_field`` (one partition per source document by
+default) is summarised by the mean vector of its chunks, and a query is
+sent to the ``router_top_n`` partitions whose centroids are closest to
+its embedding. The search then runs as a filtered search over those
+partitions only.
+
+Routing costs one small matrix-vector product (one row per partition);
+centroids are recomputed from the vector store after each write.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from src.utils import Config, logger
+from src.vector_stores import Where
+
+if TYPE_CHECKING:
+    from src.embeddings_manager import EmbeddingsManager
+
+
+class TopicRouter:
+    """
+    Nearest-centroid routing of query embeddings to metadata partitions.
+
+    Usage:
+        router = TopicRouter(embeddings_manager, config)
+        where = router.route(query_embedding)   # e.g. {"source_file": [...]}
+        # None: routing would not narrow the search
+    """
+
+    def __init__(self, embeddings_manager: "EmbeddingsManager", config: Optional[Config] = None):
+        self.em = embeddings_manager
+        self.config = config or Config()
+        self.field = self.config.router_field
+        self.top_n = max(1, self.config.router_top_n)
+        self._values: list[str] = []
+        self._centroids: Optional[np.ndarray] = None  # unit rows, one per value
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # ─── Public API ──────────────────────────────────────
+
+    def route(self, query_embedding: list[float]) -> Optional[Where]:
+        """Filter selecting the closest partitions, or None to search everything."""
+        centroids, values = self._fitted()
+        if centroids is None or len(values) <= self.top_n:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarities = centroids @ query
+        closest = np.argpartition(-similarities, self.top_n - 1)[:self.top_n]
+        closest = closest[np.argsort(-similarities[closest])]
+        return {self.field: [values[i] for i in closest]}
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _fitted(self) -> tuple[Optional[np.ndarray], list[str]]:
+        """Centroids for the current collection version, recomputed when stale."""
+        with self._lock:
+            if self._version != self.em.collection_version:
+                centroids = self.em.partition_centroids(self.field)
+                self._values = sorted(centroids)
+                if self._values:
+                    matrix = np.stack([centroids[value] for value in self._values])
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    self._centroids = matrix / np.maximum(norms, 1e-12)
+                else:
+                    self._centroids = None
+                self._version = self.em.collection_version
+                logger.info(
+                    "Topic router fitted — %d partitions by '%s'",
+                    len(self._values),
+                    self.field,
+                )
+            return self._centroids, self._values
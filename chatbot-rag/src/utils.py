@@ -6,16 +6,28 @@ and performance metrics tracking for the RAG chatbot.
 """
 
 import os
+import gzip
 import json
+import queue
+import atexit
+import shutil
 import time
 import logging
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Iterator, Optional
 
 from dotenv import load_dotenv
 
+from src.latency import LatencySketch, RequestTimer
+from src.prometheus import REGISTRY
+
+if TYPE_CHECKING:
+    from src.analytics_store import AnalyticsStore
+
 load_dotenv()
 
 # ─── Paths ──────────────────────────────────────────────
@@ -38,6 +50,15 @@ class Config:
     # Retrieval
     top_k: int = 4
     confidence_threshold: float = 0.7
+    retrieval_mode: str = "vector"  # "vector", "lexical" or "hybrid" (BM25 + vector, RRF)
+    hybrid_fetch_k: int = 20  # candidates taken from each ranking before fusion
+    rrf_k: int = 60  # reciprocal rank fusion damping constant
+    topic_router: bool = False  # narrow unfiltered queries to the closest partitions
+    router_field: str = "source_file"  # metadata field the router partitions by
+    router_top_n: int = 2  # partitions searched per routed query
+    reranker: str = "none"  # "none", "lexical" or "cross-encoder:<model>" (sentence-transformers)
+    rerank_candidates: int = 20  # chunks fetched for the reranker; the best top_k are kept
+    rerank_budget_ms: float = 150.0  # per query; search order kept when exceeded
 
     # LLM
     model_name: str = "gpt-4o-mini"
@@ -47,10 +68,45 @@ class Config:
 
     # Memory
     memory_window: int = 5
-
-    # ChromaDB
+    max_sessions: int = 10_000
+    session_ttl: float = 3600.0  # seconds of inactivity before a session expires
+
+    # Ingestion
+    ingest_workers: int = 0  # parse/chunk processes (0 = one per CPU, 1 = in-process)
+    embedding_batch_size: int = 128  # chunks per embedding request
+    embedding_concurrency: int = 4  # embedding requests in flight during ingestion
+    embedding_max_retries: int = 5
+    embedding_retry_base_delay: float = 1.0  # seconds, doubled per retry
+    upsert_batch_size: int = 1000  # chunks per ChromaDB bulk upsert
+
+    # Query embedding cache
+    embedding_cache_size: int = 2048  # in-memory LRU entries (0 disables the cache)
+    embedding_cache_ttl: float = 86400.0  # seconds; 0 = no expiry
+    embedding_cache_persist: bool = True  # SQLite tier next to the vector store
+    embedding_cache_disk_max: int = 100_000  # SQLite tier rows (oldest evicted; 0 = no cap)
+
+    # Semantic answer cache
+    answer_cache_size: int = 512  # cached answers (0 disables the cache)
+    answer_cache_max_distance: float = 0.08  # max cosine distance between queries
+
+    # Conversation log
+    conversation_log_max_mb: float = 50.0  # rotate beyond this size (0 = size never rotates)
+    conversation_log_rotate_daily: bool = True
+    conversation_log_compress: bool = True  # gzip rotated files
+    analytics_store: bool = True  # mirror the log into an indexed SQLite store
+
+    # Vector store
+    vector_backend: str = "chroma"  # "chroma" or "numpy" (memory-mapped matrix)
+    vector_dtype: str = "float32"  # numpy backend: "float16" halves RAM/disk, searches slower
+    ann_index: str = "none"  # numpy backend: "none" (exact) or "ivf" (approximate)
+    ann_min_rows: int = 20_000  # exact search below this many chunks
+    ivf_nlist: int = 0  # IVF clusters (0 = 4·√chunks)
+    ivf_nprobe: int = 16  # clusters scanned per query: higher = better recall, slower
+    partition_fields: tuple = ("source_file", "file_type")  # numpy backend: precomputed filter indexes
     collection_name: str = "billeasy_docs"
     persist_directory: str = str(VECTORSTORE_DIR)
+    logs_dir: str = str(LOGS_DIR)  # conversation log and (unless ANALYTICS_DB_PATH) analytics DB
+    metrics_dir: str = str(METRICS_DIR)  # metrics.json
 
     # API Key
     openai_api_key: str = field(default_factory=lambda: os.getenv("OPENAI_API_KEY", ""))
@@ -81,11 +137,10 @@ def setup_logging(level: int = logging.INFO) -> logging.Logger:
     console.setFormatter(fmt)
     logger.addHandler(console)
 
-    # File handler
-    LOGS_DIR.mkdir(parents=True, exist_ok=True)
-    file_handler = logging.FileHandler(
-        LOGS_DIR / "app.log", encoding="utf-8"
-    )
+    # File handler (APP_LOG_FILE overrides the location, e.g. for tests)
+    log_file = Path(os.getenv("APP_LOG_FILE", LOGS_DIR / "app.log"))
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    file_handler = logging.FileHandler(log_file, encoding="utf-8")
     file_handler.setFormatter(fmt)
     logger.addHandler(file_handler)
 
@@ -96,13 +151,86 @@ logger = setup_logging()
 
 
 # ─── Conversation Logger ────────────────────────────────
-class ConversationLogger:
-    """Persists every user↔assistant exchange to a JSONL file for analysis."""
+def _tail_lines(path: Path, n: int, block_size: int = 64 * 1024) -> list[bytes]:
+    """Last ``n`` non-empty lines of a file, reading backwards from the end."""
+    if n <= 0:
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        # n + 1 newlines guarantee n complete lines (the first may be partial)
+        while position > 0 and data.count(b"\n") <= n:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = [line for line in data.split(b"\n") if line.strip()]
+    if position > 0:
+        lines = lines[1:]  # started mid-line
+    return lines[-n:]
+
 
-    def __init__(self, log_dir: Path = LOGS_DIR):
+class ConversationLogger:
+    """
+    Persists every user↔assistant exchange to a JSONL file for analysis.
+
+    - log() only enqueues the entry (bounded queue; entries are dropped,
+      and counted, rather than blocking a request when the disk stalls)
+    - a background thread appends batches with one write() per batch,
+      so several gunicorn workers can share the file (O_APPEND)
+    - the file is rotated when it exceeds ``max_bytes`` or the day
+      changes; rotated files are gzip-compressed if ``compress``
+    - get_history() reads from the end of the file: O(last_n), not
+      O(file size)
+    - flush() (and so get_history()) waits only for the entries queued
+      before it, with a timeout, so steady traffic cannot stall it
+    - with an ``analytics`` store (src/analytics_store.py) every batch
+      is also inserted there, and older logs are imported on first use
+
+    Usage:
+        conv_logger = ConversationLogger()
+        conv_logger.log("¿Horarios?", "Lunes a viernes...", [], 0.82, 1.4, 3)
+        conv_logger.get_history(20)
+    """
+
+    FILE_NAME = "conversations.jsonl"
+
+    def __init__(
+        self,
+        log_dir: Path = LOGS_DIR,
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_daily: bool = True,
+        compress: bool = True,
+        queue_size: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        analytics: Optional["AnalyticsStore"] = None,
+    ):
         self.log_dir = log_dir
         self.log_dir.mkdir(parents=True, exist_ok=True)
-        self.log_file = self.log_dir / "conversations.jsonl"
+        self.log_file = self.log_dir / self.FILE_NAME
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.analytics = analytics
+        self.dropped = 0
+
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        # Entries queued / written by this process, so flush() can wait
+        # for what was queued before it and not for later traffic
+        self._queued = 0
+        self._written = 0
+        self._put_lock = threading.Lock()
+        self._progress = threading.Condition()
+        self._fd: Optional[int] = None
+        self._fd_date: Optional[str] = None
+        atexit.register(self.flush)
 
     def log(
         self,
@@ -112,19 +240,33 @@ class ConversationLogger:
         confidence: float,
         response_time: float,
         docs_consulted: int,
+        session_id: Optional[str] = None,
+        cached: bool = False,
     ) -> None:
-        """Append a single interaction to the JSONL log."""
+        """Queue a single interaction for the JSONL log (never blocks)."""
         entry = {
             "timestamp": datetime.now().isoformat(),
+            "session_id": session_id,
             "user_message": user_message,
             "assistant_response": assistant_response,
             "sources": sources,
             "confidence": round(confidence, 4),
             "response_time_ms": round(response_time * 1000, 2),
             "docs_consulted": docs_consulted,
+            "cached": cached,
         }
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        entries = self._writer_queue()
+        try:
+            with self._put_lock:
+                entries.put_nowait(entry)
+                self._queued += 1
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(
+                    "Conversation log queue full — %d entries dropped so far", self.dropped
+                )
+            return
 
         logger.info(
             "Logged interaction — confidence=%.2f, time=%.0fms, docs=%d",
@@ -133,78 +275,437 @@ class ConversationLogger:
             docs_consulted,
         )
 
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """
+        Wait until the entries queued before this call have been written
+        (entries logged meanwhile are not waited for).
+
+        Returns:
+            False if ``timeout`` seconds passed first.
+        """
+        if self._queue is None or self._pid != os.getpid():
+            return True
+        target = self._queued
+        with self._progress:
+            return self._progress.wait_for(lambda: self._written >= target, timeout)
+
     def get_history(self, last_n: int = 50) -> list[dict]:
-        """Read the last N logged interactions."""
-        if not self.log_file.exists():
+        """Read the last N logged interactions (newest last)."""
+        self.flush()
+        if last_n <= 0 or not self.log_file.exists():
             return []
-        with open(self.log_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        return [json.loads(line) for line in lines[-last_n:]]
+        lines = _tail_lines(self.log_file, last_n)
+
+        # Not enough in the live file: continue into the newest rotated ones
+        for rotated in reversed(self.rotated_files()):
+            if len(lines) >= last_n:
+                break
+            missing = last_n - len(lines)
+            if rotated.suffix == ".gz":
+                with gzip.open(rotated, "rb") as f:
+                    older = [line for line in f.read().split(b"\n") if line.strip()][-missing:]
+            else:
+                older = _tail_lines(rotated, missing)
+            lines = older + lines
+
+        history = []
+        for line in lines:
+            try:
+                history.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # torn line from a crash mid-write
+        return history
+
+    def rotated_files(self) -> list[Path]:
+        """Rotated logs, oldest first."""
+        stem = self.log_file.stem
+        return sorted(
+            list(self.log_dir.glob(f"{stem}-*.jsonl"))
+            + list(self.log_dir.glob(f"{stem}-*.jsonl.gz"))
+        )
+
+    # ─── Writer thread ───────────────────────────────────
+
+    def _writer_queue(self) -> queue.Queue:
+        # Threads (and queue locks) do not survive fork(): start afresh in
+        # whichever process logs — each gunicorn worker
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.queue_size)
+                    self._fd = None
+                    self._queued = self._written = 0
+                    self._put_lock = threading.Lock()
+                    self._progress = threading.Condition()
+                    threading.Thread(
+                        target=self._run, args=(self._queue,), name="conversation-log", daemon=True
+                    ).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, entries: queue.Queue) -> None:
+        if self.analytics is not None:
+            try:
+                self.analytics.backfill(self.rotated_files() + [self.log_file])
+            except Exception as e:
+                logger.error("Analytics backfill failed: %s", e)
+        while True:
+            try:
+                batch = [entries.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(entries.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(
+                    "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in batch).encode("utf-8")
+                )
+            except OSError as e:
+                logger.error("Could not write %d conversation log entries: %s", len(batch), e)
+            try:
+                if self.analytics is not None:
+                    self.analytics.add(batch)
+            except Exception as e:
+                logger.error("Could not add %d entries to the analytics store: %s", len(batch), e)
+            finally:
+                with self._progress:
+                    self._written += len(batch)
+                    self._progress.notify_all()
+
+    def _write(self, data: bytes) -> None:
+        fd = self._open()
+        if self._should_rotate(fd, len(data)):
+            self._rotate(fd)
+            fd = self._open()
+        os.write(fd, data)  # one O_APPEND write per batch: no interleaving between workers
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            mtime = os.fstat(self._fd).st_mtime
+            self._fd_date = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d")
+        return self._fd
+
+    def _should_rotate(self, fd: int, incoming: int) -> bool:
+        try:
+            current = os.stat(self.log_file)
+        except FileNotFoundError:
+            current = None
+        if current is None or current.st_ino != os.fstat(fd).st_ino:
+            # Another worker rotated it: just follow the new file
+            os.close(fd)
+            self._fd = None
+            self._open()
+            return False
+        if current.st_size == 0:
+            return False
+        if self.max_bytes and current.st_size + incoming > self.max_bytes:
+            return True
+        return self.rotate_daily and self._fd_date != datetime.now().strftime("%Y-%m-%d")
+
+    def _rotate(self, fd: int) -> None:
+        os.close(fd)
+        self._fd = None
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        rotated = self.log_dir / f"{self.log_file.stem}-{stamp}-{os.getpid()}.jsonl"
+        try:
+            os.replace(self.log_file, rotated)
+        except FileNotFoundError:
+            return  # rotated by another worker in the meantime
+        logger.info("Rotated conversation log to %s", rotated.name)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
 
 
 # ─── Metrics Tracker ────────────────────────────────────
-class MetricsTracker:
-    """Tracks performance metrics across sessions."""
+CHAT_REQUESTS = REGISTRY.counter(
+    "rag_chat_requests", "Answered chat requests", ["cache"]
+)
+LOW_CONFIDENCE_ANSWERS = REGISTRY.counter(
+    "rag_low_confidence_answers",
+    "Answers whose retrieval confidence was below Config.confidence_threshold",
+)
+CHAT_SECONDS = REGISTRY.histogram(
+    "rag_chat_duration_seconds", "End-to-end chat latency", ["cache"]
+)
+
+
+@contextmanager
+def _exclusive_lock(path: Path) -> Iterator[None]:
+    """Inter-process lock on ``path`` (flock; a no-op where fcntl is missing)."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: no multi-worker server there
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _QueryStats:
+    """Counters and latency sketches for a set of queries (one per thread)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.cache_hits = 0
+        self.low_confidence = 0
+        self.response_ms = 0.0
+        self.cache_hit_ms = 0.0
+        self.confidence = 0.0
+        self.docs_consulted = 0.0
+        self.latency: dict[str, LatencySketch] = {}
+
+    TOTALS = ("queries", "cache_hits", "low_confidence", "response_ms",
+              "cache_hit_ms", "confidence", "docs_consulted")
+
+    def merge(self, other: "_QueryStats") -> None:
+        for name in self.TOTALS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for stage, sketch in list(other.latency.items()):
+            self.latency.setdefault(stage, LatencySketch()).merge(sketch)
+
+    def since(self, earlier: "_QueryStats") -> "_QueryStats":
+        """What was recorded after ``earlier`` (an older merged copy)."""
+        delta = _QueryStats()
+        for name in self.TOTALS:
+            setattr(delta, name, getattr(self, name) - getattr(earlier, name))
+        for stage, sketch in self.latency.items():
+            previous = earlier.latency.get(stage)
+            delta.latency[stage] = sketch.since(previous) if previous else sketch
+        return delta
+
 
-    def __init__(self, metrics_dir: Path = METRICS_DIR):
+class MetricsTracker:
+    """
+    Tracks performance metrics across sessions.
+
+    - record() only updates per-thread counters and latency sketches:
+      no lock and no disk I/O on the request path
+    - p50/p95/p99 per stage (total, retrieval, embedding, llm, ...) via
+      mergeable LatencySketch instances, merged when summarized
+    - a daemon thread adds what this process recorded since its last
+      flush to metrics.json every ``flush_interval`` seconds, and once
+      more at interpreter exit: read-modify-write under an exclusive
+      lock (metrics.json.lock), then temp file + atomic rename, so
+      every gunicorn worker's queries add up in the one file
+    - summary() is metrics.json (all processes, earlier runs included)
+      plus this process's queries not flushed yet
+
+    Usage:
+        metrics = MetricsTracker()
+        timer = metrics.timer()
+        with timer.stage("retrieval"):
+            ...
+        metrics.record(timer.stop(), confidence, docs, stages=timer.stages)
+        metrics.summary()["latency_ms"]["total"]["p95"]
+    """
+
+    def __init__(
+        self,
+        metrics_dir: Path = METRICS_DIR,
+        flush_interval: float = 5.0,
+        low_confidence_threshold: float = 0.7,
+    ):
         self.metrics_dir = metrics_dir
         self.metrics_dir.mkdir(parents=True, exist_ok=True)
-        self._start_time: Optional[float] = None
         self.metrics_file = self.metrics_dir / "metrics.json"
-        self._load()
-
-    def _load(self) -> None:
-        """Load persisted metrics."""
-        if self.metrics_file.exists():
-            with open(self.metrics_file, "r", encoding="utf-8") as f:
-                self.data = json.load(f)
-        else:
-            self.data = {
-                "total_queries": 0,
-                "avg_response_time_ms": 0,
-                "avg_confidence": 0,
-                "avg_docs_consulted": 0,
-                "low_confidence_count": 0,
-            }
-
-    def _save(self) -> None:
-        """Persist metrics to disk."""
-        with open(self.metrics_file, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2)
-
-    def start_timer(self) -> None:
-        """Mark the start of a query."""
-        self._start_time = time.perf_counter()
-
-    def elapsed(self) -> float:
-        """Seconds since start_timer was called."""
-        if self._start_time is None:
-            return 0.0
-        return time.perf_counter() - self._start_time
+        self.lock_file = self.metrics_dir / "metrics.json.lock"
+        self.flush_interval = flush_interval
+        self.low_confidence_threshold = low_confidence_threshold
+
+        self._local = threading.local()
+        self._threads: list[_QueryStats] = []
+        self._registry_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._recorded = 0  # approximate; only used to detect changes
+        self._flushed = 0
+        self._flusher_pid: Optional[int] = None
+        # This process's totals as of the last flush (already in metrics.json)
+        self._flushed_stats = _QueryStats()
+
+        atexit.register(self.flush)
+
+    @staticmethod
+    def timer() -> RequestTimer:
+        """A fresh per-request timer (safe to use concurrently)."""
+        return RequestTimer()
 
     def record(
-        self, response_time: float, confidence: float, docs_consulted: int
+        self,
+        response_time: float,
+        confidence: float,
+        docs_consulted: int,
+        cache_hit: bool = False,
+        stages: Optional[dict[str, float]] = None,
     ) -> None:
-        """Record metrics for one query, updating running averages."""
-        n = self.data["total_queries"]
-        self.data["total_queries"] = n + 1
-
-        # Running averages
-        self.data["avg_response_time_ms"] = (
-            (self.data["avg_response_time_ms"] * n + response_time * 1000)
-            / (n + 1)
-        )
-        self.data["avg_confidence"] = (
-            (self.data["avg_confidence"] * n + confidence) / (n + 1)
-        )
-        self.data["avg_docs_consulted"] = (
-            (self.data["avg_docs_consulted"] * n + docs_consulted) / (n + 1)
-        )
-        if confidence < 0.7:
-            self.data["low_confidence_count"] += 1
-
-        self._save()
+        """Record metrics for one query (response_time and stages in seconds).
+
+        Answers served from the semantic cache are also averaged on their
+        own, next to LLM-generated ones, so the latency win is visible.
+        """
+        stats = self._thread_stats()
+        response_ms = response_time * 1000
+        stats.queries += 1
+        stats.response_ms += response_ms
+        stats.confidence += confidence
+        stats.docs_consulted += docs_consulted
+        low_confidence = confidence < self.low_confidence_threshold
+        if low_confidence:
+            stats.low_confidence += 1
+        if cache_hit:
+            stats.cache_hits += 1
+            stats.cache_hit_ms += response_ms
+
+        self._observe(stats, "total", response_ms)
+        cache = "hit" if cache_hit else "miss"
+        CHAT_REQUESTS.inc(cache=cache)
+        CHAT_SECONDS.observe(response_time, cache=cache)
+        if low_confidence:
+            LOW_CONFIDENCE_ANSWERS.inc()
+        for stage, seconds in (stages or {}).items():
+            self._observe(stats, stage, seconds * 1000)
+
+        self._recorded += 1
+        self._ensure_flusher()
 
     def summary(self) -> dict:
-        """Return a copy of current metrics."""
-        return {k: round(v, 2) if isinstance(v, float) else v for k, v in self.data.items()}
+        """Return current metrics: running averages plus ``latency_ms`` percentiles."""
+        with self._flush_lock:  # no flush half-way between the file and our totals
+            stats = self._load()
+            stats.merge(self._merged().since(self._flushed_stats))
+        return self._summarize(stats)
+
+    def flush(self) -> None:
+        """Add what was recorded since the last flush to metrics.json."""
+        with self._flush_lock:
+            recorded = self._recorded
+            if recorded == self._flushed:
+                return
+            own = self._merged()
+            try:
+                with _exclusive_lock(self.lock_file):
+                    stats = self._load()
+                    stats.merge(own.since(self._flushed_stats))
+                    data = self._summarize(stats)
+                    # Raw sums, so the next flush adds to exact totals, not
+                    # to averages rounded for display
+                    data["totals"] = {name: getattr(stats, name) for name in _QueryStats.TOTALS}
+                    data["latency_sketches"] = {
+                        stage: sketch.to_dict() for stage, sketch in stats.latency.items()
+                    }
+                    tmp = self.metrics_file.with_name(
+                        f"{self.metrics_file.name}.{os.getpid()}.tmp"
+                    )
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(data, f, indent=2)
+                    os.replace(tmp, self.metrics_file)
+                self._flushed_stats = own
+                self._flushed = recorded
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.metrics_file, e)
+
+    # ─── Internals ───────────────────────────────────────
+
+    @staticmethod
+    def _summarize(stats: _QueryStats) -> dict:
+        n, hits = stats.queries, stats.cache_hits
+        generated = n - hits
+        data = {
+            "total_queries": n,
+            "avg_response_time_ms": stats.response_ms / n if n else 0,
+            "avg_confidence": stats.confidence / n if n else 0,
+            "avg_docs_consulted": stats.docs_consulted / n if n else 0,
+            "low_confidence_count": stats.low_confidence,
+            "answer_cache_hits": hits,
+            "avg_cache_hit_time_ms": stats.cache_hit_ms / hits if hits else 0,
+            "avg_llm_response_time_ms": (
+                (stats.response_ms - stats.cache_hit_ms) / generated if generated else 0
+            ),
+        }
+        summary = {k: round(v, 2) if isinstance(v, float) else v for k, v in data.items()}
+        summary["latency_ms"] = {
+            stage: sketch.summary() for stage, sketch in sorted(stats.latency.items())
+        }
+        return summary
+
+    @staticmethod
+    def _observe(stats: _QueryStats, stage: str, value_ms: float) -> None:
+        sketch = stats.latency.get(stage)
+        if sketch is None:
+            sketch = stats.latency[stage] = LatencySketch()
+        sketch.add(value_ms)
+
+    def _thread_stats(self) -> _QueryStats:
+        stats = getattr(self._local, "stats", None)
+        if stats is None:
+            stats = self._local.stats = _QueryStats()
+            with self._registry_lock:  # once per thread
+                self._threads.append(stats)
+        return stats
+
+    def _merged(self) -> _QueryStats:
+        """This process's totals (all threads)."""
+        merged = _QueryStats()
+        with self._registry_lock:
+            threads = list(self._threads)
+        for stats in threads:
+            merged.merge(stats)
+        return merged
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive fork(): (re)start in the recording process
+        if self._flusher_pid == os.getpid() or self.flush_interval <= 0:
+            return
+        with self._registry_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _load(self) -> _QueryStats:
+        """Totals flushed by every process so far."""
+        stats = _QueryStats()
+        if not self.metrics_file.exists():
+            return stats
+        try:
+            with open(self.metrics_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable metrics file %s: %s", self.metrics_file, e)
+            return stats
+
+        totals = data.get("totals")
+        if totals is not None:
+            for name in _QueryStats.TOTALS:
+                setattr(stats, name, totals.get(name, 0))
+        else:
+            # Files written before the raw sums were kept: rebuild them
+            # from the (rounded) averages
+            n = data.get("total_queries", 0)
+            hits = data.get("answer_cache_hits", 0)
+            stats.queries = n
+            stats.cache_hits = hits
+            stats.low_confidence = data.get("low_confidence_count", 0)
+            stats.response_ms = data.get("avg_response_time_ms", 0) * n
+            stats.cache_hit_ms = data.get("avg_cache_hit_time_ms", 0) * hits
+            stats.confidence = data.get("avg_confidence", 0) * n
+            stats.docs_consulted = data.get("avg_docs_consulted", 0) * n
+        stats.latency = {
+            stage: LatencySketch.from_dict(sketch)
+            for stage, sketch in data.get("latency_sketches", {}).items()
+        }
+        return stats
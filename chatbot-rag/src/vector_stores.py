@@ -0,0 +1,354 @@
+"""
+Vector Stores — Pluggable Storage for Chunk Embeddings
+========================================================
+Selects where EmbeddingsManager keeps vectors, from
+``Config.vector_backend``:
+
+- ``chroma`` → ChromaDB collection (default)
+- ``numpy``  → contiguous NumPy matrix, memory-mapped from disk, with a
+               SQLite side table for text and metadata (src/numpy_store.py)
+
+Both report relevance on the same scale — LangChain's euclidean
+relevance over squared L2 distance, as Chroma does by default — so
+confidence thresholds mean the same thing whichever backend is used.
+
+Searches accept a metadata filter (``where``): a dict of field → value,
+or field → list of accepted values, with all fields required to match:
+
+    {"source_file": "04_precios.md"}
+    {"source_file": ["02_precios_y_financiamiento.md", "04_precios.md"]}
+
+Backends apply it before ranking (Chroma's metadata index, the NumPy
+backend's precomputed partitions), never by filtering a global top-k.
+"""
+
+import math
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.utils import Config
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+# Max IDs per ChromaDB get()/delete() call
+ID_LOOKUP_BATCH = 1000
+
+
+Where = dict[str, object]
+
+
+def normalize_where(where: Optional[Where]) -> Optional[dict[str, tuple]]:
+    """Filter as field → tuple of accepted values (None = no filter)."""
+    if not where:
+        return None
+    return {
+        field: tuple(value) if isinstance(value, (list, tuple, set, frozenset)) else (value,)
+        for field, value in where.items()
+    }
+
+
+def where_key(where: Optional[Where]) -> Optional[tuple]:
+    """Hashable form of a filter, for caches and grouping."""
+    normalized = normalize_where(where)
+    if normalized is None:
+        return None
+    return tuple(
+        sorted((field, tuple(sorted(map(str, values)))) for field, values in normalized.items())
+    )
+
+
+def to_chroma_where(where: Optional[Where]) -> Optional[dict]:
+    """Translate a filter into ChromaDB's ``where`` syntax."""
+    normalized = normalize_where(where)
+    if normalized is None:
+        return None
+    clauses = [
+        {field: values[0]} if len(values) == 1 else {field: {"$in": list(values)}}
+        for field, values in normalized.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def l2_relevance(distance: float) -> float:
+    """Relevance from a squared L2 distance (LangChain's euclidean relevance fn)."""
+    return 1.0 - distance / math.sqrt(2)
+
+
+class VectorStore:
+    """
+    Interface shared by the vector store backends.
+
+    Relevance scores (not raw distances) are returned everywhere, highest
+    first, on the scale described in the module docstring.
+    """
+
+    def upsert(
+        self,
+        ids: list[str],
+        embeddings: list[list[float]],
+        documents: list[str],
+        metadatas: list[dict],
+    ) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]) -> None:
+        raise NotImplementedError
+
+    def existing_ids(self, ids: list[str]) -> set[str]:
+        raise NotImplementedError
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]) -> None:
+        """
+        Replace the metadata of stored chunks, keeping their vectors.
+        Partition fields (``Config.partition_fields``) must not change.
+        """
+        raise NotImplementedError
+
+    def get_documents(self, ids: list[str]) -> dict[str, Document]:
+        raise NotImplementedError
+
+    def search(
+        self, embedding: list[float], k: int, where: Optional[Where] = None
+    ) -> list[tuple[Document, float]]:
+        raise NotImplementedError
+
+    def search_many(
+        self, embeddings: list[list[float]], k: int, where: Optional[Where] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """search() for several query embeddings at once (one result list each)."""
+        return [self.search(embedding, k, where) for embedding in embeddings]
+
+    def ids_matching(self, where: Where) -> set[str]:
+        """IDs of the chunks that pass a metadata filter."""
+        raise NotImplementedError
+
+    def partition_centroids(self, field: str) -> dict[str, np.ndarray]:
+        """Mean chunk vector for each value of a metadata field."""
+        raise NotImplementedError
+
+    def relevance_scores(self, embedding: list[float], ids: list[str]) -> dict[str, float]:
+        raise NotImplementedError
+
+    def iter_documents(self, page_size: int) -> Iterator[tuple[list[str], list[str]]]:
+        """Yield (ids, texts) pages over every stored chunk."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def warm_up(self) -> None:
+        """Build any lazily created search structures ahead of the first query."""
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    ChromaDB collection behind the VectorStore interface.
+
+    Usage:
+        store = ChromaVectorStore(config, embeddings)
+        store.upsert(ids, vectors, texts, metadatas)
+        store.search(query_vector, k=4)
+    """
+
+    def __init__(self, config: Config, embeddings: Embeddings):
+        self.config = config
+        self.embeddings = embeddings
+        self.langchain = self._open()
+
+    def upsert(self, ids, embeddings, documents, metadatas) -> None:
+        self.langchain._collection.upsert(
+            ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas
+        )
+
+    def delete(self, ids: list[str]) -> None:
+        for start in range(0, len(ids), ID_LOOKUP_BATCH):
+            self.langchain.delete(ids=ids[start:start + ID_LOOKUP_BATCH])
+
+    def existing_ids(self, ids: list[str]) -> set[str]:
+        found: set[str] = set()
+        for start in range(0, len(ids), ID_LOOKUP_BATCH):
+            result = self.langchain.get(ids=ids[start:start + ID_LOOKUP_BATCH], include=[])
+            found.update(result["ids"])
+        return found
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]) -> None:
+        for start in range(0, len(ids), ID_LOOKUP_BATCH):
+            self.langchain._collection.update(
+                ids=ids[start:start + ID_LOOKUP_BATCH],
+                metadatas=metadatas[start:start + ID_LOOKUP_BATCH],
+            )
+
+    def get_documents(self, ids: list[str]) -> dict[str, Document]:
+        if not ids:
+            return {}
+        result = self.langchain.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(
+                result["ids"], result["documents"], result["metadatas"]
+            )
+        }
+
+    def search(
+        self, embedding: list[float], k: int, where: Optional[Where] = None
+    ) -> list[tuple[Document, float]]:
+        results = self.langchain.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=to_chroma_where(where)
+        )
+        # Chroma returns raw distances here; convert them the same way
+        # similarity_search_with_relevance_scores does.
+        relevance_fn = self.langchain._select_relevance_score_fn()
+        return [(doc, relevance_fn(distance)) for doc, distance in results]
+
+    def search_many(
+        self, embeddings: list[list[float]], k: int, where: Optional[Where] = None
+    ) -> list[list[tuple[Document, float]]]:
+        if not len(embeddings):
+            return []
+        # One collection query for the whole batch
+        result = self.langchain._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=to_chroma_where(where),
+            include=["documents", "metadatas", "distances"],
+        )
+        relevance_fn = self.langchain._select_relevance_score_fn()
+        return [
+            [
+                (
+                    Document(id=doc_id, page_content=text, metadata=metadata or {}),
+                    relevance_fn(distance),
+                )
+                for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                result["ids"], result["documents"], result["metadatas"], result["distances"]
+            )
+        ]
+
+    def ids_matching(self, where: Where) -> set[str]:
+        return set(self.langchain.get(where=to_chroma_where(where), include=[])["ids"])
+
+    def partition_centroids(self, field: str) -> dict[str, np.ndarray]:
+        sums: dict[str, np.ndarray] = {}
+        counts: dict[str, int] = {}
+        offset = 0
+        while True:
+            page = self.langchain.get(
+                include=["embeddings", "metadatas"], limit=ID_LOOKUP_BATCH, offset=offset
+            )
+            for vector, metadata in zip(page["embeddings"], page["metadatas"]):
+                value = (metadata or {}).get(field)
+                if value is None:
+                    continue
+                value = str(value)
+                sums[value] = sums.get(value, 0.0) + np.asarray(vector, dtype=np.float32)
+                counts[value] = counts.get(value, 0) + 1
+            if len(page["ids"]) < ID_LOOKUP_BATCH:
+                break
+            offset += ID_LOOKUP_BATCH
+        return {value: sums[value] / counts[value] for value in sums}
+
+    def relevance_scores(self, embedding: list[float], ids: list[str]) -> dict[str, float]:
+        if not ids:
+            return {}
+        result = self.langchain.get(ids=ids, include=["embeddings"])
+        space = self._distance_space()
+        relevance_fn = self.langchain._select_relevance_score_fn()
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = {}
+        for doc_id, vector in zip(result["ids"], result["embeddings"]):
+            vector = np.asarray(vector, dtype=np.float32)
+            if space == "cosine":
+                denom = float(np.linalg.norm(query) * np.linalg.norm(vector)) or 1.0
+                distance = 1.0 - float(query @ vector) / denom
+            elif space == "ip":
+                distance = 1.0 - float(query @ vector)
+            else:  # l2 — Chroma reports squared euclidean distance
+                diff = query - vector
+                distance = float(diff @ diff)
+            scores[doc_id] = relevance_fn(distance)
+        return scores
+
+    def iter_documents(self, page_size: int) -> Iterator[tuple[list[str], list[str]]]:
+        offset = 0
+        while True:
+            page = self.langchain.get(include=["documents"], limit=page_size, offset=offset)
+            yield page["ids"], page["documents"]
+            if len(page["ids"]) < page_size:
+                return
+            offset += page_size
+
+    def count(self) -> int:
+        return self.langchain._collection.count()
+
+    def clear(self) -> None:
+        self.langchain.delete_collection()
+        self.langchain = self._open()  # re-create the empty collection
+
+    @staticmethod
+    def reset_after_fork() -> None:
+        """Chroma keeps one System per path; drop any copy inherited from the parent."""
+        from chromadb.api.client import SharedSystemClient
+
+        SharedSystemClient.clear_system_cache()
+
+    # ─── Internals ───────────────────────────────────────
+
+    def _open(self) -> Chroma:
+        vectorstore = Chroma(
+            collection_name=self.config.collection_name,
+            embedding_function=self.embeddings,
+            persist_directory=str(Path(self.config.persist_directory)),
+            collection_metadata={"embedding_model": self.config.embedding_model},
+        )
+        metadata = vectorstore._collection.metadata or {}
+        check_embedding_model(self.config, metadata.get("embedding_model"))
+        return vectorstore
+
+    def _distance_space(self) -> str:
+        """Distance metric of the collection ("l2", "cosine" or "ip")."""
+        configuration = self.langchain._collection.configuration or {}
+        for index in ("hnsw", "spann"):
+            space = (configuration.get(index) or {}).get("space")
+            if space:
+                return space
+        return "l2"
+
+
+def check_embedding_model(config: Config, stored: Optional[str]) -> None:
+    """Refuse to mix vectors from different embedding models in one collection."""
+    if stored and stored != config.embedding_model:
+        raise ValueError(
+            f"Collection '{config.collection_name}' was built with "
+            f"embedding_model='{stored}', not '{config.embedding_model}'. "
+            "Use a different collection_name or clear the collection first."
+        )
+
+
+def create_vector_store(config: Config, embeddings: Embeddings) -> VectorStore:
+    """Open the backend selected by ``config.vector_backend``."""
+    backend = config.vector_backend
+    if backend == "chroma":
+        return ChromaVectorStore(config, embeddings)
+    if backend == "numpy":
+        from src.numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore(config)
+    raise ValueError(
+        f"Unknown vector_backend '{backend}'. Supported: {', '.join(VECTOR_BACKENDS)}"
+    )
+
+
+def reset_vector_store_after_fork(config: Config) -> None:
+    """Process-wide cleanup a backend needs in a freshly forked worker."""
+    if config.vector_backend == "chroma":
+        ChromaVectorStore.reset_after_fork()
@@ -114,6 +114,15 @@ init_session_state()
 chatbot: RAGChatbot = st.session_state.chatbot
 
 
+def stream_tokens(events, state: dict):
+    """Yield the answer text from chat_stream(), keeping the final ChatResponse in state."""
+    for event in events:
+        if event["type"] == "token":
+            yield event["content"]
+        elif event["type"] == "done":
+            state["response"] = event["response"]
+
+
 # ─── Sidebar ─────────────────────────────────────────────
 with st.sidebar:
     st.markdown("## 📁 Documentos")
@@ -218,6 +227,20 @@ with st.sidebar:
         </div>
         """, unsafe_allow_html=True)
 
+    # Historical analytics — indexed SQLite queries, no log scan
+    if chatbot.analytics is not None:
+        with st.expander("📈 Analítica (últimos 30 días)"):
+            latency = chatbot.analytics.latency_distribution(days=30)
+            if latency["count"]:
+                st.caption(
+                    f"Latencia — p50 {latency['p50']:.0f}ms · "
+                    f"p95 {latency['p95']:.0f}ms · p99 {latency['p99']:.0f}ms"
+                )
+            st.markdown("**Documentos más citados**")
+            st.dataframe(chatbot.analytics.top_sources(limit=5, days=30), hide_index=True)
+            st.markdown("**Baja confianza por día**")
+            st.dataframe(chatbot.analytics.low_confidence_by_day(days=30), hide_index=True)
+
     # Configuration
     st.markdown("---")
     st.markdown("### 🎛️ Configuración")
@@ -309,10 +332,9 @@ if prompt := st.chat_input("Escribe tu pregunta sobre BillEasy..."):
 
     # Generate response
     with st.chat_message("assistant", avatar="🧾"):
-        with st.spinner("Buscando en la documentación..."):
-            response: ChatResponse = chatbot.chat(prompt)
-
-        st.markdown(response.answer)
+        stream_state: dict = {}
+        st.write_stream(stream_tokens(chatbot.chat_stream(prompt), stream_state))
+        response: ChatResponse = stream_state["response"]
 
         # Sources
         if response.sources:
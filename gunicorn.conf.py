@@ -0,0 +1,69 @@
+"""
+Gunicorn Configuration — Preloaded, Copy-on-Write Workers
+===========================================================
+The app (RAGChatbot, vector index, BM25 index, caches) is imported once
+in the master and workers are forked from it, so they share that memory
+copy-on-write instead of each building their own, and the empty-store
+bootstrap runs exactly once. After the fork every worker opens its own
+ChromaDB / HTTP / SQLite clients and starts with its own sessions and
+metrics. Prometheus series are shared through PROMETHEUS_MULTIPROC_DIR,
+so /metrics reports the sum over all workers whichever one answers.
+
+Usage:
+    gunicorn tools.receive_whatsapp_message:app -c gunicorn.conf.py
+
+Environment:
+    WEB_CONCURRENCY   worker processes (default 2)
+    GUNICORN_THREADS  threads per worker (default 2)
+    GUNICORN_PRELOAD  "false" to build the app in every worker instead
+    PROMETHEUS_MULTIPROC_DIR  per-worker metric files (default
+                      chatbot-rag/.tmp/prometheus, emptied at startup)
+"""
+
+import gc
+import os
+import shutil
+
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 2))
+timeout = 60
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+if preload_app:
+    # Tells the app to build a fork-safe chatbot (src/preload.py)
+    os.environ["RAG_PRELOAD"] = "1"
+
+# Set (and emptied of a previous run's files) before the app and
+# src.prometheus are imported; a config reload (HUP) keeps the live files
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot-rag", ".tmp", "prometheus"),
+)
+if not os.environ.get("_RAG_METRICS_DIR_READY"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    os.environ["_RAG_METRICS_DIR_READY"] = "1"
+
+_frozen = False
+
+
+def pre_fork(server, worker):
+    """Move everything allocated so far out of the GC's reach before forking.
+
+    Collector passes write to every tracked object's header, which would
+    un-share the pages the workers inherited; frozen objects are skipped.
+    """
+    global _frozen
+    if preload_app and not _frozen:
+        gc.collect()
+        gc.freeze()
+        _frozen = True
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from tools.receive_whatsapp_message import reset_after_fork
+
+    reset_after_fork()
+    server.log.info("Worker %s ready (shared preloaded app)", worker.pid)
@@ -0,0 +1,39 @@
+"""
+Import paths for the tests (chatbot-rag's ``src`` package and ``tools``),
+the application log kept out of the working tree, and shared fixtures.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "chatbot-rag"), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault(
+    "APP_LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="rag-tests-"), "app.log")
+)
+
+
+class Clock:
+    """Stands in for the ``time`` module inside tools.message_queue."""
+
+    def __init__(self):
+        self.now = 1_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Manual clock for tools.message_queue (advance ``clock.now``)."""
+    from tools import message_queue
+
+    clock = Clock()
+    monkeypatch.setattr(message_queue, "time", clock)
+    return clock
@@ -0,0 +1,76 @@
+"""In-memory stand-in for the Google Sheets API client used by tools/google_sheets.py."""
+
+from typing import Callable
+
+
+class FakeSheetsError(Exception):
+    """Stand-in for googleapiclient's HttpError (exposes ``status_code``)."""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class _FakeRequest:
+    def __init__(self, service: "FakeSheetsService", action: Callable[[], dict]):
+        self._service = service
+        self._action = action
+
+    def execute(self) -> dict:
+        service = self._service
+        service.calls += 1
+        if not service.fail_next:
+            return self._action()
+        service.fail_next -= 1
+        if service.fail_after_apply:
+            self._action()  # the server did the work, then the response was lost
+        raise FakeSheetsError(service.fail_status, "Request failed (fake)")
+
+
+class FakeSheetsService:
+    """
+    In-memory stand-in for ``build("sheets", "v4")`` covering
+    values.get / update / append, for exercising exports offline.
+
+    Usage:
+        fake = FakeSheetsService(fail_next=2)       # two 429s, then success
+        SheetsExporter(fake, "sheet-id", sleep=lambda s: None).export(store)
+        fake.sheets["Conversaciones"]               # appended rows
+
+        # A 503 returned after the append was applied
+        FakeSheetsService(fail_next=1, fail_status=503, fail_after_apply=True)
+    """
+
+    def __init__(
+        self, fail_next: int = 0, fail_status: int = 429, fail_after_apply: bool = False
+    ):
+        self.sheets: dict[str, list[list]] = {}
+        self.calls = 0
+        self.fail_next = fail_next
+        self.fail_status = fail_status
+        self.fail_after_apply = fail_after_apply
+
+    def spreadsheets(self) -> "FakeSheetsService":
+        return self
+
+    def values(self) -> "FakeSheetsService":
+        return self
+
+    def get(self, spreadsheetId: str, range: str) -> _FakeRequest:
+        sheet = range.split("!")[0]
+        return _FakeRequest(self, lambda: {"values": [list(r) for r in self.sheets.get(sheet, [])]})
+
+    def update(self, spreadsheetId: str, range: str, body: dict, **kwargs) -> _FakeRequest:
+        def action() -> dict:
+            rows = self.sheets.setdefault(range.split("!")[0], [])
+            rows[: len(body["values"])] = [list(r) for r in body["values"]]
+            return {"updatedCells": sum(len(r) for r in body["values"])}
+
+        return _FakeRequest(self, action)
+
+    def append(self, spreadsheetId: str, range: str, body: dict, **kwargs) -> _FakeRequest:
+        def action() -> dict:
+            self.sheets.setdefault(range.split("!")[0], []).extend(list(r) for r in body["values"])
+            return {"updates": {"updatedRows": len(body["values"])}}
+
+        return _FakeRequest(self, action)
@@ -0,0 +1,76 @@
+"""AnalyticsStore: mirroring and backfill of the conversation log."""
+
+import json
+import sqlite3
+
+from src.analytics_store import AnalyticsStore
+from src.utils import ConversationLogger
+
+
+def _log(conv_logger: ConversationLogger, question: str) -> None:
+    conv_logger.log(
+        question, "respuesta", [{"source": "04_precios.md", "chunk": "1/3", "relevance": 0.8}],
+        0.82, 0.5, 1, session_id="5215550001",
+    )
+
+
+def _jsonl_lines(conv_logger: ConversationLogger) -> list[dict]:
+    return [json.loads(line) for line in conv_logger.log_file.read_text().splitlines()]
+
+
+def test_fresh_install_then_restart_stores_each_interaction_once(tmp_path):
+    db_path = tmp_path / "analytics.sqlite3"
+
+    # Fresh install: no conversations.jsonl yet when the backfill runs
+    first = ConversationLogger(log_dir=tmp_path, analytics=AnalyticsStore(db_path))
+    for i in range(3):
+        _log(first, f"pregunta {i}")
+    first.flush()
+
+    # Restart (new process / gunicorn worker) over the same files
+    second = ConversationLogger(log_dir=tmp_path, analytics=AnalyticsStore(db_path))
+    _log(second, "pregunta 3")
+    second.flush()
+
+    store = AnalyticsStore(db_path)
+    assert len(_jsonl_lines(second)) == 4
+    assert store.summary()["total_interactions"] == 4
+    assert sum(s["citations"] for s in store.top_sources()) == 4
+
+
+def test_backfill_skips_interactions_already_mirrored(tmp_path):
+    db_path = tmp_path / "analytics.sqlite3"
+    conv_logger = ConversationLogger(log_dir=tmp_path)  # log only, no store yet
+    for i in range(3):
+        _log(conv_logger, f"pregunta {i}")
+    conv_logger.flush()
+    entries = _jsonl_lines(conv_logger)
+
+    store = AnalyticsStore(db_path)
+    assert store.add(entries[:2]) == 2
+    assert store.backfill([conv_logger.log_file, tmp_path / "missing.jsonl"]) == 1
+    assert store.backfill([conv_logger.log_file]) == 0  # once per database
+    assert store.summary()["total_interactions"] == 3
+
+
+def test_duplicates_from_older_databases_are_removed(tmp_path):
+    db_path = tmp_path / "analytics.sqlite3"
+    entry = {"timestamp": "2026-01-05T10:00:00", "session_id": None, "user_message": "hola",
+             "assistant_response": "¡Hola!", "confidence": 0.9, "response_time_ms": 12.0,
+             "docs_consulted": 1, "sources": [{"source": "05_faq.md"}]}
+    AnalyticsStore(db_path).add([entry])
+    # A database written before interactions had a unique key
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP INDEX interactions_entry")
+        conn.execute(
+            "INSERT INTO interactions (ts, day, sender, user_message, assistant_response,"
+            " confidence, response_time_ms, docs_consulted) SELECT ts, day, sender,"
+            " user_message, assistant_response, confidence, response_time_ms, docs_consulted"
+            " FROM interactions"
+        )
+        conn.execute("INSERT INTO citations (interaction_id, source_file) VALUES (2, '05_faq.md')")
+
+    store = AnalyticsStore(db_path)
+    assert store.summary()["total_interactions"] == 1
+    assert store.top_sources()[0]["citations"] == 1
+    assert store.add([entry]) == 0
@@ -0,0 +1,45 @@
+"""ConversationLogger.flush waits for earlier entries only, and never forever."""
+
+import threading
+import time
+
+from src.utils import ConversationLogger
+
+
+def _log(conv_logger, message):
+    conv_logger.log(message, "respuesta", [], 0.9, 0.1, 1)
+
+
+def test_flush_returns_under_sustained_traffic(tmp_path):
+    conv_logger = ConversationLogger(log_dir=tmp_path, flush_interval=0.05)
+    write = conv_logger._write
+    conv_logger._write = lambda data: time.sleep(0.005) or write(data)
+    _log(conv_logger, "primera")
+
+    stop = threading.Event()
+
+    def traffic():
+        while not stop.is_set():
+            _log(conv_logger, "más")
+
+    producer = threading.Thread(target=traffic, daemon=True)
+    producer.start()
+    try:
+        started = time.monotonic()
+        history = conv_logger.get_history(10_000)
+        assert time.monotonic() - started < 2.0
+    finally:
+        stop.set()
+        producer.join()
+    assert history[0]["user_message"] == "primera"
+
+
+def test_flush_gives_up_after_the_timeout(tmp_path):
+    conv_logger = ConversationLogger(log_dir=tmp_path, flush_interval=0.05)
+    stalled = threading.Event()
+    conv_logger._write = lambda data: stalled.wait()
+    _log(conv_logger, "atascada")
+
+    assert conv_logger.flush(timeout=0.1) is False
+    stalled.set()
+    assert conv_logger.flush(timeout=2.0) is True
@@ -0,0 +1,72 @@
+"""EmbeddingCache: memory LRU and the write-behind, size-capped disk tier."""
+
+import sqlite3
+import threading
+
+from src.embedding_cache import EmbeddingCache
+
+
+def _rows(db_path) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+def test_put_does_not_write_to_disk_until_flushed(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    cache = EmbeddingCache("model", db_path=db_path, write_interval=60)
+    cache.put("¿Horarios?", [0.5, 0.25])
+
+    assert _rows(db_path) == 0
+    assert cache.get("  ¿HORARIOS? ") == [0.5, 0.25]
+    cache.flush()
+    assert _rows(db_path) == 1
+
+    restarted = EmbeddingCache("model", db_path=db_path)
+    assert restarted.get("¿horarios?") == [0.5, 0.25]
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_queued_vectors_are_found_before_they_reach_disk(tmp_path):
+    cache = EmbeddingCache("model", max_size=1, db_path=tmp_path / "c.sqlite3", write_interval=60)
+    cache.put("uno", [1.0])
+    cache.put("dos", [2.0])  # evicts "uno" from memory; still only queued for disk
+    assert cache.get("uno") == [1.0]
+
+
+def test_memory_only_lookup_skips_the_disk_tier(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    writer = EmbeddingCache("model", db_path=db_path)
+    writer.put("precios", [1.0])
+    writer.flush()
+
+    cache = EmbeddingCache("model", db_path=db_path)
+    assert cache.get("precios", disk=False) is None
+    assert cache.stats()["misses"] == 0
+    assert cache.get("precios") == [1.0]
+
+
+def test_disk_tier_is_capped_oldest_first(tmp_path):
+    db_path = tmp_path / "cache.sqlite3"
+    cache = EmbeddingCache("model", max_size=1, db_path=db_path, disk_max_entries=3)
+    for i in range(5):
+        cache.put(f"pregunta {i}", [float(i)])
+        cache.flush()
+
+    assert _rows(db_path) == 3
+    fresh = EmbeddingCache("model", db_path=db_path)
+    assert fresh.get("pregunta 0") is None
+    assert fresh.get("pregunta 4") == [4.0]
+
+
+def test_disk_io_does_not_hold_the_memory_lock(tmp_path):
+    cache = EmbeddingCache("model", db_path=tmp_path / "cache.sqlite3", write_interval=60)
+    cache.put("hola", [1.0])
+    cache.flush()
+
+    with cache._db_lock:  # a slow disk write in progress
+        found = []
+        reader = threading.Thread(target=lambda: found.append(cache.get("hola")))
+        reader.start()
+        reader.join(timeout=2)
+        assert found == [[1.0]]
+        cache.put("adiós", [2.0])  # returns without waiting for the disk
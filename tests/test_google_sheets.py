@@ -0,0 +1,119 @@
+"""SheetsExporter against the in-memory FakeSheetsService."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from fake_sheets import FakeSheetsError, FakeSheetsService
+from src.analytics_store import AnalyticsStore
+from tools.google_sheets import EXPORT_HEADER, SheetsExporter
+
+SHEET = "Conversaciones"
+
+
+def _store(tmp_path, count: int, start: int = 0) -> AnalyticsStore:
+    store = AnalyticsStore(tmp_path / "analytics.sqlite3")
+    first = datetime(2026, 3, 2, 9, 0)
+    store.add(
+        {
+            "timestamp": (first + timedelta(minutes=i)).isoformat(),
+            "session_id": "5215550001",
+            "user_message": f"pregunta {i}",
+            "assistant_response": "respuesta",
+            "confidence": 0.8,
+            "response_time_ms": 120.0,
+            "docs_consulted": 2,
+        }
+        for i in range(start, start + count)
+    )
+    return store
+
+
+def _exporter(tmp_path, fake, **kwargs) -> SheetsExporter:
+    kwargs.setdefault("sleep", lambda seconds: None)
+    return SheetsExporter(
+        fake, "sheet-id", sheet=SHEET, state_path=tmp_path / "state.json", **kwargs
+    )
+
+
+def _questions(fake) -> list[str]:
+    return [row[3] for row in fake.sheets[SHEET] if row != EXPORT_HEADER]
+
+
+def test_header_is_written_on_the_first_run_only(tmp_path):
+    fake = FakeSheetsService()
+    _exporter(tmp_path, fake, chunk_size=2).export(_store(tmp_path, 3))
+    result = _exporter(tmp_path, fake, chunk_size=2).export(_store(tmp_path, 2, start=3))
+
+    assert fake.sheets[SHEET][0] == EXPORT_HEADER
+    assert fake.sheets[SHEET].count(EXPORT_HEADER) == 1
+    assert _questions(fake) == [f"pregunta {i}" for i in range(5)]
+    assert result == {"rows": 2, "api_calls": 1, "high_water_mark": 5}
+
+
+def test_failed_chunk_resumes_from_the_high_water_mark(tmp_path):
+    fake = FakeSheetsService()
+    store = _store(tmp_path, 5)
+    exporter = _exporter(tmp_path, fake, chunk_size=2, max_retries=1)
+
+    # The second chunk's append keeps failing once the first one is in
+    reads = []
+    interactions_after = store.interactions_after
+
+    def failing_after_first_chunk(last_id, limit):
+        reads.append(last_id)
+        if len(reads) == 2:
+            fake.fail_next = 10
+        return interactions_after(last_id, limit)
+
+    store.interactions_after = failing_after_first_chunk
+    with pytest.raises(FakeSheetsError):
+        exporter.export(store)
+    assert exporter.high_water_mark() == 2
+    assert _questions(fake) == ["pregunta 0", "pregunta 1"]
+
+    fake.fail_next = 0
+    result = exporter.export(store)
+    assert result["rows"] == 3
+    assert _questions(fake) == [f"pregunta {i}" for i in range(5)]
+    assert fake.sheets[SHEET].count(EXPORT_HEADER) == 1
+
+
+def test_rate_limited_append_is_retried(tmp_path):
+    fake = FakeSheetsService(fail_next=2)  # two 429s, then success
+    delays = []
+    result = _exporter(tmp_path, fake, sleep=delays.append).export(_store(tmp_path, 3))
+
+    assert fake.calls == 3
+    # Exponential backoff with jitter: 1s then 2s, each scaled by 0.5–1
+    assert 0.5 <= delays[0] <= 1.0 <= delays[1] <= 2.0
+    assert result["rows"] == 3
+    assert len(_questions(fake)) == 3
+
+
+def test_rate_limit_beyond_the_retries_raises_and_keeps_the_mark(tmp_path):
+    fake = FakeSheetsService(fail_next=3)
+    exporter = _exporter(tmp_path, fake, max_retries=2)
+
+    with pytest.raises(FakeSheetsError) as raised:
+        exporter.export(_store(tmp_path, 3))
+    assert raised.value.status_code == 429
+    assert exporter.high_water_mark() == 0
+    assert SHEET not in fake.sheets
+
+
+def test_append_applied_before_a_server_error_is_not_repeated(tmp_path):
+    fake = FakeSheetsService(fail_next=1, fail_status=503, fail_after_apply=True)
+    result = _exporter(tmp_path, fake).export(_store(tmp_path, 3))
+
+    assert _questions(fake) == ["pregunta 0", "pregunta 1", "pregunta 2"]
+    assert result["high_water_mark"] == 3
+    assert fake.calls == 2  # the append, then the ID-column check instead of a second append
+
+
+def test_append_lost_to_a_server_error_is_retried(tmp_path):
+    fake = FakeSheetsService(fail_next=1, fail_status=503)
+    _exporter(tmp_path, fake).export(_store(tmp_path, 3))
+
+    assert _questions(fake) == ["pregunta 0", "pregunta 1", "pregunta 2"]
+    assert fake.calls == 3  # failed append, ID-column check, append
@@ -0,0 +1,44 @@
+"""BM25 index stays in step with writes made by other processes."""
+
+from langchain_core.documents import Document
+
+from src.embeddings_manager import EmbeddingsManager
+from src.utils import Config
+
+
+def _manager(tmp_path) -> EmbeddingsManager:
+    config = Config(
+        embedding_model="hashing:64",
+        vector_backend="numpy",
+        persist_directory=str(tmp_path),
+        embedding_cache_size=0,
+    )
+    return EmbeddingsManager(config)
+
+
+def _add(em: EmbeddingsManager, doc_id: str, text: str) -> None:
+    doc = Document(page_content=text, metadata={"source_file": "x.md"}, id=doc_id)
+    em.upsert_embeddings([doc], em.embeddings.embed_documents([text]))
+
+
+def test_writes_from_another_manager_rebuild_the_index(tmp_path):
+    api, worker = _manager(tmp_path), _manager(tmp_path)
+    _add(api, "a", "limpieza dental cada seis meses")
+    assert [doc_id for doc_id, _ in worker.lexical_search("limpieza", 3)] == ["a"]
+
+    version = worker.collection_version
+    _add(api, "b", "blanqueamiento dental con láser")
+    assert worker.collection_version != version
+    assert [doc_id for doc_id, _ in worker.lexical_search("blanqueamiento", 3)] == ["b"]
+
+    api.delete_documents(["a"])
+    assert worker.lexical_search("limpieza", 3) == []
+
+
+def test_own_writes_keep_the_index(tmp_path):
+    em = _manager(tmp_path)
+    _add(em, "a", "ortodoncia invisible")
+    index = em.get_lexical_index()
+    _add(em, "b", "implantes de titanio")
+    assert em.get_lexical_index() is index
+    assert [doc_id for doc_id, _ in em.lexical_search("implantes", 3)] == ["b"]
@@ -0,0 +1,63 @@
+"""Directory sync: manifest from the first ingest, retained chunks renumbered."""
+
+import pytest
+
+from src.chatbot import RAGChatbot
+from src.utils import Config
+
+
+@pytest.fixture
+def chatbot(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.delenv("ANALYTICS_DB_PATH", raising=False)
+    config = Config(
+        embedding_model="hashing:64",
+        vector_backend="numpy",
+        persist_directory=str(tmp_path / "store"),
+        logs_dir=str(tmp_path / "logs"),
+        metrics_dir=str(tmp_path / "metrics"),
+        chunk_size=40,
+        chunk_overlap=0,
+    )
+    return RAGChatbot(config)
+
+
+def _paragraphs(*words: str) -> str:
+    return "\n\n".join(f"{word} " * 4 for word in words)
+
+
+def test_sync_after_load_skips_files_already_ingested(chatbot, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "horarios.txt").write_text(_paragraphs("lunes", "martes"), encoding="utf-8")
+    (docs / "precios.txt").write_text(_paragraphs("limpieza"), encoding="utf-8")
+
+    assert chatbot.load_documents_from_path(str(docs)) == 3
+    report = chatbot.sync_directory(docs)
+    assert report.unchanged_files == 2
+    assert (report.added_files, report.updated_files, report.chunks_added) == ([], [], 0)
+
+
+def test_edit_renumbers_the_chunks_it_kept(chatbot, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    file = docs / "horarios.txt"
+    file.write_text(_paragraphs("lunes", "martes"), encoding="utf-8")
+    chatbot.sync_directory(docs)
+
+    file.write_text(_paragraphs("domingo", "lunes", "martes"), encoding="utf-8")
+    report = chatbot.sync_directory(docs)
+    assert (report.updated_files, report.chunks_added, report.chunks_deleted) == (
+        ["horarios.txt"], 1, 0,
+    )
+
+    entry = chatbot.em.manifest.get(file)
+    stored = chatbot.em.get_documents(entry.chunk_ids)
+    positions = {
+        stored[chunk_id].page_content.split()[0]: (
+            stored[chunk_id].metadata["chunk_index"],
+            stored[chunk_id].metadata["total_chunks"],
+        )
+        for chunk_id in entry.chunk_ids
+    }
+    assert positions == {"domingo": (0, 3), "lunes": (1, 3), "martes": (2, 3)}
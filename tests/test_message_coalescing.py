@@ -0,0 +1,61 @@
+"""MessageQueue coalescing: a burst from one sender becomes one job."""
+
+from tools.message_queue import MessageQueue
+
+
+def _queue(tmp_path, **kwargs) -> MessageQueue:
+    kwargs.setdefault("coalesce_window", 3.0)
+    kwargs.setdefault("coalesce_max_wait", 10.0)
+    return MessageQueue(tmp_path / "queue.sqlite3", **kwargs)
+
+
+def test_burst_is_merged_once_the_sender_goes_quiet(tmp_path, clock):
+    q = _queue(tmp_path)
+    q.enqueue("ana", "hola")
+    clock.now += 1.0
+    q.enqueue("ana", "quería saber")
+    clock.now += 1.0
+    q.enqueue("ana", "el precio de brackets")
+
+    clock.now += 2.0
+    assert q.claim() is None  # last message 2s ago: still typing
+
+    clock.now += 1.5
+    job = q.claim()
+    assert job.body == "hola\nquería saber\nel precio de brackets"
+    assert job.message_count == 3
+    q.complete(job)
+    assert q.claim() is None
+    stats = q.stats()
+    assert (stats["done"], stats["coalesced"], stats["messages_per_answer"]) == (1, 2, 3.0)
+
+
+def test_steady_stream_is_answered_after_the_max_wait(tmp_path, clock):
+    q = _queue(tmp_path)
+    for i in range(5):
+        q.enqueue("ana", f"mensaje {i}")
+        clock.now += 2.0  # never quiet for 3s
+        if i < 4:
+            assert q.claim() is None
+    q.enqueue("ana", "mensaje 5")
+
+    job = q.claim()  # the first message has waited 10s
+    assert job.message_count == 6
+
+
+def test_retry_with_a_saved_reply_is_not_merged(tmp_path, clock):
+    q = _queue(tmp_path, retry_base_delay=1.0)
+    q.enqueue("ana", "hola")
+    clock.now += 5.0
+    job = q.claim()
+    q.save_reply(job, "¡Hola! ¿En qué te ayudo?", generate_seconds=0.4)
+    q.fail(job, "send failed")
+
+    q.enqueue("ana", "precio de limpieza")
+    clock.now += 1.0  # past the retry delay; the follow-up is still pending
+    retry = q.claim()
+    assert (retry.body, retry.message_count) == ("hola", 1)
+    q.complete(retry)
+
+    clock.now += 3.0
+    assert q.claim().body == "precio de limpieza"
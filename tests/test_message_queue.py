@@ -0,0 +1,80 @@
+"""MessageQueue: per-sender ordering, retries, dead-lettering and lease recovery."""
+
+from tools.message_queue import MessageQueue
+
+
+def _queue(tmp_path, **kwargs) -> MessageQueue:
+    return MessageQueue(tmp_path / "queue.sqlite3", **kwargs)
+
+
+def test_one_sender_at_a_time_in_order(tmp_path, clock):
+    q = _queue(tmp_path)
+    q.enqueue("ana", "uno")
+    q.enqueue("beto", "hola")
+    q.enqueue("ana", "dos")
+
+    first, second = q.claim(), q.claim()
+    assert (first.sender, first.body) == ("ana", "uno")
+    assert (second.sender, second.body) == ("beto", "hola")
+    assert q.claim() is None  # "dos" waits for "uno"
+
+    q.complete(first)
+    assert q.claim().body == "dos"
+
+
+def test_failed_message_is_retried_before_later_ones(tmp_path, clock):
+    q = _queue(tmp_path, retry_base_delay=2.0)
+    q.enqueue("ana", "uno")
+    q.enqueue("ana", "dos")
+
+    job = q.claim()
+    q.save_reply(job, "respuesta a uno", generate_seconds=0.5)
+    assert q.fail(job, "twilio 503") is False
+    assert q.claim() is None  # backing off, and "dos" may not overtake it
+
+    clock.now += 2.0
+    retry = q.claim()
+    assert (retry.id, retry.attempts, retry.reply) == (job.id, 2, "respuesta a uno")
+    q.complete(retry)
+    assert q.claim().body == "dos"
+
+
+def test_retry_delay_doubles_up_to_the_cap(tmp_path, clock):
+    q = _queue(tmp_path, max_attempts=10, retry_base_delay=2.0, retry_max_delay=10.0)
+    q.enqueue("ana", "uno")
+
+    # Delay after attempt n is min(2 * 2**(n-1), 10), jittered to 50–100 %
+    job = q.claim()
+    for attempt, full_delay in enumerate((2.0, 4.0, 8.0, 10.0, 10.0), start=1):
+        assert job.attempts == attempt
+        q.fail(job, "twilio 503")
+        clock.now += full_delay * 0.5 - 0.01
+        assert q.claim() is None
+        clock.now += full_delay * 0.5 + 0.01
+        job = q.claim()
+        assert job is not None
+
+
+def test_dead_letter_after_max_attempts_unblocks_the_sender(tmp_path, clock):
+    q = _queue(tmp_path, max_attempts=2, retry_base_delay=1.0)
+    q.enqueue("ana", "uno")
+    q.enqueue("ana", "dos")
+
+    assert q.fail(q.claim(), "llm timeout") is False
+    clock.now += 1.0
+    assert q.fail(q.claim(), "llm timeout") is True
+
+    assert q.stats()["dead"] == 1
+    assert q.claim().body == "dos"
+
+
+def test_job_of_a_dead_worker_is_reclaimed_after_the_lease(tmp_path, clock):
+    q = _queue(tmp_path, lease_seconds=60)
+    q.enqueue("ana", "uno")
+    job = q.claim()  # the worker dies before complete() / fail()
+
+    clock.now += 59
+    assert q.claim() is None
+    clock.now += 2
+    again = q.claim()
+    assert (again.id, again.body, again.attempts) == (job.id, "uno", 2)
@@ -0,0 +1,61 @@
+"""MetricsTracker: workers add up in metrics.json; configurable low-confidence threshold."""
+
+import multiprocessing
+
+from src.utils import MetricsTracker
+
+
+def _worker(metrics_dir, queries: int) -> None:
+    metrics = MetricsTracker(metrics_dir, flush_interval=0)
+    for i in range(queries):
+        metrics.record(0.1, 0.9, 3, stages={"retrieval": 0.02})
+        if i % 5 == 0:
+            metrics.flush()  # several flushes per worker, interleaved with the others
+    metrics.flush()
+
+
+def test_workers_add_up_instead_of_overwriting(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_worker, args=(tmp_path, 20 + i)) for i in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    summary = MetricsTracker(tmp_path, flush_interval=0).summary()
+    assert summary["total_queries"] == 20 + 21 + 22 + 23
+    assert summary["latency_ms"]["retrieval"]["count"] == 86
+    assert summary["avg_docs_consulted"] == 3
+
+
+def test_summary_includes_queries_not_flushed_yet(tmp_path):
+    first = MetricsTracker(tmp_path, flush_interval=0)
+    first.record(0.2, 0.9, 2)
+    first.flush()
+    second = MetricsTracker(tmp_path, flush_interval=0)
+    second.record(0.4, 0.9, 4)
+
+    assert first.summary()["total_queries"] == 1
+    assert second.summary()["total_queries"] == 2
+    second.flush()
+    second.flush()  # nothing new: not added twice
+    assert MetricsTracker(tmp_path, flush_interval=0).summary()["avg_response_time_ms"] == 300
+
+
+def test_low_confidence_threshold_is_configurable(tmp_path):
+    metrics = MetricsTracker(tmp_path, flush_interval=0, low_confidence_threshold=0.5)
+    metrics.record(0.1, 0.6, 1)
+    metrics.record(0.1, 0.4, 1)
+    assert metrics.summary()["low_confidence_count"] == 1
+
+
+def test_averages_keep_moving_across_many_flushes(tmp_path):
+    metrics = MetricsTracker(tmp_path, flush_interval=0)
+    for confidence in [0.5] * 1000 + [1.0] * 1000:
+        metrics.record(0.123, confidence, 3)
+        metrics.flush()
+
+    summary = MetricsTracker(tmp_path, flush_interval=0).summary()
+    assert summary["total_queries"] == 2000
+    assert summary["avg_confidence"] == 0.75
+    assert summary["avg_response_time_ms"] == 123.0
@@ -0,0 +1,60 @@
+"""NumpyVectorStore: own writes patch the snapshot, others' writes reload it."""
+
+import numpy as np
+
+from src.numpy_store import NumpyVectorStore
+from src.utils import Config
+
+
+def _store(tmp_path) -> NumpyVectorStore:
+    return NumpyVectorStore(
+        Config(vector_backend="numpy", persist_directory=str(tmp_path), embedding_model="hashing:8")
+    )
+
+
+def _upsert(store, ids, source="a.md", seed=0):
+    vectors = np.random.default_rng(seed).random((len(ids), 8))
+    store.upsert(ids, vectors, ids, [{"source_file": source, "file_type": "md"} for _ in ids])
+
+
+def _state(store):
+    snapshot = store._current()
+    # Partitions may keep deleted rows; compare the live ones
+    partitions = {
+        name: {
+            value: sorted(row for row in rows.tolist() if snapshot.row_ids[row] is not None)
+            for value, rows in index.items()
+        }
+        for name, index in snapshot.partitions.items()
+    }
+    return snapshot.version, snapshot.row_ids, snapshot.id_rows, snapshot.norms.tolist(), partitions
+
+
+def test_incremental_snapshot_matches_a_full_reload(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    _upsert(store, ["a", "b", "c"])
+
+    applied = []
+    apply = NumpyVectorStore._apply
+    monkeypatch.setattr(
+        NumpyVectorStore, "_apply", lambda self, delta: applied.append(delta) or apply(self, delta)
+    )
+    _upsert(store, ["b", "d"], source="b.md", seed=1)  # re-upserts "b"
+    store.delete(["a", "missing"])
+    store.update_metadata(["c"], [{"source_file": "a.md", "file_type": "md", "page": 2}])
+    assert len(applied) == 3  # no full reload
+
+    assert _state(store) == _state(_store(tmp_path))
+    assert store.ids_matching({"source_file": "b.md"}) == {"b", "d"}
+    assert store.get_documents(["c"])["c"].metadata["page"] == 2
+
+
+def test_writes_from_another_process_are_reloaded(tmp_path):
+    store, other = _store(tmp_path), _store(tmp_path)
+    _upsert(store, ["a", "b"])
+    _upsert(other, ["c"], source="c.md", seed=2)
+    other.delete(["a"])
+    _upsert(store, ["d"], seed=3)  # made on top of a version it has not seen
+
+    assert _state(store) == _state(other) == _state(_store(tmp_path))
+    assert store.count() == 3
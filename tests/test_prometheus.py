@@ -0,0 +1,82 @@
+"""Prometheus registry: exposition format and multi-worker aggregation."""
+
+import multiprocessing
+import os
+
+import pytest
+
+from src.prometheus import Registry
+
+
+def _samples(text: str) -> dict[str, float]:
+    return {
+        line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line and not line.startswith("#")
+    }
+
+
+def test_render_counter_and_histogram():
+    registry = Registry()
+    requests = registry.counter("rag_requests", "Chat requests", ["cache"])
+    latency = registry.histogram("rag_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(cache="miss")
+    requests.inc(2, cache="hit")
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    samples = _samples(registry.render())
+    assert samples['rag_requests_total{cache="hit"}'] == 2
+    assert samples['rag_seconds_bucket{le="0.1"}'] == 1
+    assert samples['rag_seconds_bucket{le="+Inf"}'] == 2
+    assert samples["rag_seconds_count"] == 2
+
+
+def _worker(directory: str, hits: int) -> None:
+    registry = Registry(directory)
+    requests = registry.counter("rag_requests", "Chat requests", ["cache"])
+    latency = registry.histogram("rag_seconds", "Latency", buckets=(0.1, 1.0))
+    for _ in range(hits):
+        requests.inc(cache="hit")
+        latency.observe(0.5)
+    registry.save()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_workers_are_summed_whichever_one_renders(tmp_path):
+    context = multiprocessing.get_context("fork")
+    for hits in (3, 4):
+        worker = context.Process(target=_worker, args=(str(tmp_path), hits))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+
+    # A third process answers the scrape: exited workers still count
+    registry = Registry(tmp_path)
+    requests = registry.counter("rag_requests", "Chat requests", ["cache"])
+    requests.inc(cache="miss")
+
+    samples = _samples(registry.render())
+    assert samples['rag_requests_total{cache="hit"}'] == 7
+    assert samples['rag_requests_total{cache="miss"}'] == 1
+    assert samples['rag_seconds_bucket{le="1"}'] == 7
+    assert samples["rag_seconds_count"] == 7
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_does_not_repeat_parent_counts(tmp_path):
+    registry = Registry(tmp_path)
+    requests = registry.counter("rag_requests", "Chat requests")
+    requests.inc(5)  # e.g. warm-up in the gunicorn master before forking
+    registry.save()
+
+    def child() -> None:
+        requests.inc()
+        registry.save()
+
+    worker = multiprocessing.get_context("fork").Process(target=child)
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+
+    assert _samples(registry.render())["rag_requests_total"] == 6
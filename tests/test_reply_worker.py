@@ -0,0 +1,43 @@
+"""ReplyWorkerPool: a failing queue or sender must not kill a worker thread."""
+
+import sqlite3
+
+from tools.message_queue import MessageQueue
+from tools.reply_worker import FALLBACK_REPLY, ReplyWorkerPool
+
+
+def _failing_handler(body, sender):
+    raise RuntimeError("llm timeout")
+
+
+def test_failing_fallback_send_is_contained(tmp_path, clock):
+    sent = []
+
+    def sender_fn(to, body):
+        sent.append(body)
+        raise ConnectionError("twilio unreachable")
+
+    q = MessageQueue(tmp_path / "queue.sqlite3", max_attempts=1)
+    pool = ReplyWorkerPool(_failing_handler, q, workers=0, sender_fn=sender_fn)
+    q.enqueue("whatsapp:+5215512345678", "hola")
+
+    pool._process(q.claim())  # must not raise
+
+    assert sent == [FALLBACK_REPLY]
+    assert q.stats()["dead"] == 1
+
+
+def test_locked_queue_on_failure_is_contained(tmp_path, clock):
+    class LockedQueue(MessageQueue):
+        def fail(self, job, error):
+            raise sqlite3.OperationalError("database is locked")
+
+    q = LockedQueue(tmp_path / "queue.sqlite3", lease_seconds=60)
+    pool = ReplyWorkerPool(_failing_handler, q, workers=0, sender_fn=lambda to, body: {})
+    q.enqueue("ana", "hola")
+    job = q.claim()
+
+    pool._process(job)  # must not raise
+
+    clock.now += 61  # the lease hands the job to the next claim
+    assert q.claim().id == job.id
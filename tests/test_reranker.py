@@ -0,0 +1,93 @@
+"""Rerankers: ordering and the per-query time budget."""
+
+import sys
+import time
+import types
+
+from langchain_core.documents import Document
+
+from src.reranker import CrossEncoderReranker, LexicalOverlapReranker
+
+
+def _candidates(*texts: str) -> list[tuple[Document, float]]:
+    # Search order: decreasing vector relevance
+    return [
+        (Document(id=f"c{i}", page_content=text), 0.8 - 0.01 * i)
+        for i, text in enumerate(texts)
+    ]
+
+
+def _ids(ranked: list[tuple[Document, float]]) -> list[str]:
+    return [doc.id for doc, _ in ranked]
+
+
+def test_lexical_promotes_chunks_containing_the_query():
+    candidates = _candidates(
+        "Horarios de atención: lunes a viernes de 9 a 18 h.",
+        "Nuestros servicios incluyen ortodoncia y blanqueamiento.",
+        "El blanqueamiento dental cuesta $3,500 MXN por sesión.",
+    )
+    ranked, scored = LexicalOverlapReranker().rerank(
+        "¿Cuánto cuesta el blanqueamiento dental?", candidates, k=2,
+        deadline=time.perf_counter() + 1.0,
+    )
+    assert scored == 3
+    assert _ids(ranked) == ["c2", "c1"]
+    assert ranked[0][1] == candidates[2][1]  # vector relevance is kept
+
+
+def test_lexical_over_budget_keeps_search_order_without_scoring():
+    candidates = _candidates("uno", "precio del blanqueamiento", "tres")
+    ranked, scored = LexicalOverlapReranker().rerank(
+        "precio blanqueamiento", candidates, k=3, deadline=time.perf_counter() - 1.0
+    )
+    assert scored == 0
+    assert _ids(ranked) == ["c0", "c1", "c2"]
+
+
+class _SlowCrossEncoder:
+    """Stand-in CrossEncoder: scores by text length, each call takes ``delay``."""
+
+    delay = 0.0
+
+    def __init__(self, model_name, device="cpu"):
+        self.calls = 0
+
+    def predict(self, pairs, show_progress_bar=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [len(text) for _, text in pairs]
+
+
+def _cross_encoder(monkeypatch, delay: float) -> CrossEncoderReranker:
+    monkeypatch.setitem(
+        sys.modules, "sentence_transformers", types.SimpleNamespace(CrossEncoder=_SlowCrossEncoder)
+    )
+    monkeypatch.setattr(_SlowCrossEncoder, "delay", delay)
+    monkeypatch.setattr("src.reranker.CROSS_ENCODER_BATCH", 2)
+    return CrossEncoderReranker("fake-model")
+
+
+def test_cross_encoder_warm_up_stops_a_batch_that_cannot_fit(monkeypatch):
+    reranker = _cross_encoder(monkeypatch, delay=0.05)
+    assert reranker.batch_seconds >= 0.05  # measured at load, not on the first query
+
+    candidates = _candidates("a", "bbbb", "cc", "dddddd")
+    started = time.perf_counter()
+    ranked, scored = reranker.rerank("q", candidates, k=4, deadline=started + 0.01)
+    assert scored == 0
+    assert time.perf_counter() - started < 0.05
+    assert _ids(ranked) == ["c0", "c1", "c2", "c3"]
+
+
+def test_cross_encoder_returns_scored_prefix_then_unscored_tail(monkeypatch):
+    reranker = _cross_encoder(monkeypatch, delay=0.05)
+    calls = reranker.model.calls
+
+    candidates = _candidates("a", "bbbb", "cc", "dddddd")
+    ranked, scored = reranker.rerank(
+        "q", candidates, k=4, deadline=time.perf_counter() + 0.08
+    )
+    assert reranker.model.calls == calls + 1  # the second batch would not fit
+    assert scored == 2
+    assert _ids(ranked) == ["c1", "c0", "c2", "c3"]
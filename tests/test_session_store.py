@@ -0,0 +1,26 @@
+"""SessionStore: idle sessions are swept even if they are never looked up again."""
+
+from src import session_store
+from src.session_store import SWEEP_INTERVAL, SessionStore
+from src.utils import Config
+
+
+class _Monotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def test_get_sweeps_sessions_nobody_asks_for(monkeypatch):
+    clock = _Monotonic()
+    monkeypatch.setattr(session_store, "time", clock)
+    store = SessionStore(Config(session_ttl=120.0))
+    store.get("whatsapp:+5215500000001")
+    clock.now += 100
+    kept = store.get("whatsapp:+5215500000002")
+
+    clock.now += SWEEP_INTERVAL  # +...0001 idle 160 s, +...0002 only 60 s
+    assert store.get("whatsapp:+5215500000002") is kept
+    assert store.active_sessions == 1
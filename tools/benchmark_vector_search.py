@@ -0,0 +1,136 @@
+"""
+Tool: Vector Search Benchmark
+========================================
+Measures recall@k and latency of the IVF approximate index against
+exact search on the NumPy vector backend, for a range of ``ivf_nprobe``
+values, so Config can be tuned before a large corpus goes live.
+
+Inputs:
+    - chunks (int): Number of vectors to index (default 50000)
+    - dim (int): Vector dimension (default 384)
+    - k (int): Results per query (default 10)
+    - BENCH_STORE_DIR in .env (optional): an existing numpy-backend
+      persist_directory to benchmark instead of synthetic vectors
+
+Outputs:
+    - Table on stdout: nprobe, mean/p95 latency (ms), recall@k
+
+Usage:
+    python tools/benchmark_vector_search.py [chunks] [dim] [k]
+
+Requirements:
+    - numpy (already a chatbot-rag dependency)
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_DIR = os.path.join(BASE_DIR, "chatbot-rag")
+if RAG_DIR not in sys.path:
+    sys.path.append(RAG_DIR)
+
+from src.numpy_store import NumpyVectorStore
+from src.utils import Config
+
+NPROBES = (1, 2, 4, 8, 16, 32, 64)
+QUERIES = 200
+INSERT_BATCH = 5000
+
+
+def synthetic_vectors(chunks: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors grouped around topics, like embeddings of a real corpus."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(1, chunks // 100), dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, len(topics), chunks)]
+    vectors += rng.standard_normal((chunks, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_store(persist_directory: str, chunks: int, dim: int) -> None:
+    """Fill a fresh numpy-backend store with synthetic vectors."""
+    store = NumpyVectorStore(
+        Config(persist_directory=persist_directory, vector_backend="numpy",
+               embedding_model="benchmark")
+    )
+    vectors = synthetic_vectors(chunks, dim)
+    for start in range(0, chunks, INSERT_BATCH):
+        batch = vectors[start:start + INSERT_BATCH]
+        ids = [f"chunk-{i}" for i in range(start, start + len(batch))]
+        store.upsert(ids, batch, [""] * len(batch), [{}] * len(batch))
+
+
+def run_queries(store: NumpyVectorStore, queries: np.ndarray, k: int):
+    """(ids per query, latency per query in ms)."""
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = store.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({doc.id for doc, _ in hits})
+    return results, np.array(latencies)
+
+
+def stored_embedding_model(persist_directory: str) -> str:
+    """Embedding model recorded by an existing store (the store refuses any other)."""
+    config = Config(persist_directory=persist_directory)
+    db_path = os.path.join(persist_directory, f"{config.collection_name}.npvec", "chunks.sqlite3")
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'embedding_model'").fetchone()
+    return row[0] if row else config.embedding_model
+
+
+def benchmark(persist_directory: str, k: int, embedding_model: str) -> None:
+    base = dict(persist_directory=persist_directory, vector_backend="numpy",
+                embedding_model=embedding_model)
+    exact = NumpyVectorStore(Config(**base, ann_index="none"))
+    approximate = NumpyVectorStore(Config(**base, ann_index="ivf", ann_min_rows=0))
+
+    snapshot = exact._current()
+    if snapshot.matrix is None:
+        print("❌ The store is empty.")
+        return
+    rng = np.random.default_rng(1)
+    live = np.flatnonzero(np.isfinite(snapshot.norms))
+    queries = np.asarray(snapshot.matrix[rng.choice(live, size=min(QUERIES, len(live)))],
+                         dtype=np.float32)
+    queries += 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    started = time.perf_counter()
+    approximate.warm_up()
+    print(f"Chunks: {len(live)}  dim: {snapshot.matrix.shape[1]}  k: {k}")
+    print(f"IVF index ready in {time.perf_counter() - started:.1f}s "
+          f"({approximate._ann.nlist} lists)\n")
+
+    truth, latencies = run_queries(exact, queries, k)
+    print(f"{'nprobe':>8} {'mean ms':>9} {'p95 ms':>8} {'recall@' + str(k):>10}")
+    print(f"{'exact':>8} {latencies.mean():9.2f} {np.percentile(latencies, 95):8.2f} "
+          f"{1.0:10.3f}")
+    for nprobe in NPROBES:
+        if nprobe > approximate._ann.nlist:
+            break
+        approximate.config.ivf_nprobe = nprobe
+        found, latencies = run_queries(approximate, queries, k)
+        recall = np.mean([len(f & t) / max(1, len(t)) for f, t in zip(found, truth)])
+        print(f"{nprobe:>8} {latencies.mean():9.2f} {np.percentile(latencies, 95):8.2f} "
+              f"{recall:10.3f}")
+
+
+if __name__ == "__main__":
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    store_dir = os.getenv("BENCH_STORE_DIR")
+    if store_dir:
+        benchmark(store_dir, k, stored_embedding_model(store_dir))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(f"Indexing {chunks} synthetic vectors...")
+            build_store(tmp, chunks, dim)
+            benchmark(tmp, k, "benchmark")
@@ -1,7 +1,8 @@
 """
 Tool: Google Sheets Integration
 ========================================
-Read from and write to Google Sheets for storing deliverables and data.
+Read from and write to Google Sheets for storing deliverables and data,
+and export the chatbot's conversation history incrementally.
 
 Inputs:
     - spreadsheet_id (str): The Google Sheets spreadsheet ID
@@ -11,35 +12,70 @@ Inputs:
 Outputs:
     - dict: { "success": bool, "data": list | None, "error": str | None }
 
+Usage:
+    python tools/google_sheets.py export <spreadsheet_id> [sheet_name]
+
 Requirements:
     - credentials.json (Google OAuth) in project root
     - GOOGLE_CREDENTIALS_PATH in .env
 """
 
+import json
 import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_EXPORT_STATE = BASE_DIR / ".tmp" / "sheets_export_state.json"
 
-def read_sheet(spreadsheet_id: str, range_name: str) -> dict:
-    """Read data from a Google Sheet."""
-    try:
-        from google.oauth2.credentials import Credentials
-        from google_auth_oauthlib.flow import InstalledAppFlow
-        from google.auth.transport.requests import Request
+READ_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+WRITE_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# HTTP statuses worth retrying: quota / rate limit and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+EXPORT_HEADER = [
+    "ID", "Fecha", "Número", "Mensaje", "Respuesta",
+    "Confianza", "Tiempo (ms)", "Documentos", "Caché",
+]
+
+# httplib2 (under googleapiclient) is not thread-safe: one client per thread
+_services = threading.local()
+
+
+def get_service(scopes: list[str] = WRITE_SCOPES):
+    """
+    Authorized Sheets API client, built once per scope set (and thread) and reused.
+
+    Credentials are refreshed by the client library when they expire.
+    """
+    cache: dict[tuple[str, ...], Any] = _services.__dict__.setdefault("by_scopes", {})
+    key = tuple(sorted(scopes))
+    if key not in cache:
         from googleapiclient.discovery import build
-        import pickle
 
-        SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
-        creds = _get_credentials(SCOPES)
+        cache[key] = build(
+            "sheets", "v4", credentials=_get_credentials(scopes), cache_discovery=False
+        )
+    return cache[key]
 
-        service = build("sheets", "v4", credentials=creds)
-        sheet = service.spreadsheets()
-        result = sheet.values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_name
-        ).execute()
+
+def read_sheet(spreadsheet_id: str, range_name: str) -> dict:
+    """Read data from a Google Sheet."""
+    try:
+        sheet = get_service(READ_SCOPES).spreadsheets()
+        result = execute_with_retry(
+            sheet.values().get(spreadsheetId=spreadsheet_id, range=range_name)
+        )
 
         values = result.get("values", [])
 
@@ -58,23 +94,19 @@ def read_sheet(spreadsheet_id: str, range_name: str) -> dict:
 
 
 def write_sheet(spreadsheet_id: str, range_name: str, values: list[list]) -> dict:
-    """Write data to a Google Sheet."""
+    """Write data to a Google Sheet (overwrites the range)."""
     try:
-        from googleapiclient.discovery import build
-
-        SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-        creds = _get_credentials(SCOPES)
-
-        service = build("sheets", "v4", credentials=creds)
-        sheet = service.spreadsheets()
+        sheet = get_service(WRITE_SCOPES).spreadsheets()
 
         body = {"values": values}
-        result = sheet.values().update(
-            spreadsheetId=spreadsheet_id,
-            range=range_name,
-            valueInputOption="USER_ENTERED",
-            body=body
-        ).execute()
+        result = execute_with_retry(
+            sheet.values().update(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueInputOption="USER_ENTERED",
+                body=body
+            )
+        )
 
         return {
             "success": True,
@@ -90,19 +122,228 @@ def write_sheet(spreadsheet_id: str, range_name: str, values: list[list]) -> dic
         }
 
 
+def append_sheet(spreadsheet_id: str, range_name: str, values: list[list]) -> dict:
+    """Append rows after the last row of a table (never overwrites)."""
+    try:
+        sheet = get_service(WRITE_SCOPES).spreadsheets()
+        result = execute_with_retry(
+            sheet.values().append(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueInputOption="RAW",
+                insertDataOption="INSERT_ROWS",
+                body={"values": values},
+            )
+        )
+
+        return {
+            "success": True,
+            "data": {"updated_rows": result.get("updates", {}).get("updatedRows", 0)},
+            "error": None
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "data": None,
+            "error": str(e)
+        }
+
+
+def execute_with_retry(
+    request,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 64.0,
+    sleep: Callable[[float], None] = time.sleep,
+):
+    """
+    request.execute() with exponential backoff (plus jitter) on quota
+    and transient server errors; other errors are raised at once.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return request.execute()
+        except Exception as e:
+            status = _http_status(e)
+            if status not in RETRYABLE_STATUSES or attempt == max_retries:
+                raise
+            delay = min(base_delay * 2 ** attempt, max_delay) * random.uniform(0.5, 1.0)
+            print(f"[SHEETS] HTTP {status}, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            sleep(delay)
+
+
+def _http_status(error: Exception) -> Optional[int]:
+    """Status code of a googleapiclient HttpError (or any error with ``status_code``)."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        resp = getattr(error, "resp", None)
+        status = getattr(resp, "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ─── Incremental conversation export ────────────────────
+
+
+class SheetsExporter:
+    """
+    Append new conversations to a sheet, picking up where the last run stopped.
+
+    The high-water mark is the last exported interaction ID of the
+    analytics store (chatbot-rag/src/analytics_store.py), kept in a small
+    JSON state file and advanced after every successful chunk, so an
+    interrupted export resumes without duplicating rows. Each chunk is a
+    single values.append call.
+
+    values.append is not idempotent: a 5xx can arrive after the server
+    has already added the rows. Before retrying a chunk after a server
+    error the exporter reads the ID column, and if the sheet already
+    ends with the chunk's last ID the append is not repeated. (429s are
+    retried directly, since a rate-limited request is never applied.)
+
+    Usage:
+        exporter = SheetsExporter(get_service(), "spreadsheet_id", sheet="Conversaciones")
+        exporter.export(AnalyticsStore())    # {"rows": 1234, "api_calls": 1, ...}
+    """
+
+    def __init__(
+        self,
+        service,
+        spreadsheet_id: str,
+        sheet: str = "Conversaciones",
+        state_path: Optional[str | Path] = None,
+        chunk_size: int = 2000,
+        max_retries: int = 5,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet = sheet
+        self.state_path = Path(state_path or DEFAULT_EXPORT_STATE)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.sleep = sleep
+
+    @property
+    def state_key(self) -> str:
+        return f"{self.spreadsheet_id}/{self.sheet}"
+
+    def high_water_mark(self) -> int:
+        """ID of the last interaction already in the sheet (0 = nothing exported)."""
+        return self._load_state().get(self.state_key, 0)
+
+    def export(self, store) -> dict:
+        """Append every interaction newer than the high-water mark."""
+        last_id = self.high_water_mark()
+        rows_exported = api_calls = 0
+
+        while True:
+            interactions = store.interactions_after(last_id, limit=self.chunk_size)
+            if not interactions:
+                break
+            rows = [self._to_row(i) for i in interactions]
+            if last_id == 0 and rows_exported == 0:
+                rows.insert(0, EXPORT_HEADER)
+
+            request = self.service.spreadsheets().values().append(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{self.sheet}!A1",
+                valueInputOption="RAW",
+                insertDataOption="INSERT_ROWS",
+                body={"values": rows},
+            )
+            execute_with_retry(
+                _CheckedAppend(self, request, interactions[-1]["id"]),
+                max_retries=self.max_retries,
+                sleep=self.sleep,
+            )
+            api_calls += 1
+            rows_exported += len(interactions)
+            last_id = interactions[-1]["id"]
+            self._save_state(last_id)
+
+            if len(interactions) < self.chunk_size:
+                break
+
+        print(f"[SHEETS] Exported {rows_exported} rows in {api_calls} call(s) (last id {last_id})")
+        return {"rows": rows_exported, "api_calls": api_calls, "high_water_mark": last_id}
+
+    @staticmethod
+    def _to_row(interaction: dict) -> list:
+        return [
+            interaction["id"],
+            datetime.fromtimestamp(interaction["ts"]).strftime("%Y-%m-%d %H:%M:%S"),
+            interaction["sender"] or "",
+            interaction["user_message"],
+            interaction["assistant_response"],
+            round(interaction["confidence"], 4),
+            round(interaction["response_time_ms"], 1),
+            interaction["docs_consulted"],
+            "sí" if interaction["cached"] else "no",
+        ]
+
+    def last_exported_id(self) -> Optional[str]:
+        """Value of the ID column in the sheet's last row (None if empty)."""
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, range=f"{self.sheet}!A:A"
+        ).execute()
+        values = result.get("values", [])
+        return str(values[-1][0]) if values and values[-1] else None
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, last_id: int) -> None:
+        state = self._load_state()
+        state[self.state_key] = last_id
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+
+class _CheckedAppend:
+    """
+    An export chunk's append request for execute_with_retry: after a
+    server error, a retry first checks whether the rows already landed.
+    """
+
+    def __init__(self, exporter: SheetsExporter, request, last_id: int):
+        self._exporter = exporter
+        self._request = request
+        self._last_id = str(last_id)
+        self._maybe_applied = False
+
+    def execute(self) -> dict:
+        if self._maybe_applied and self._exporter.last_exported_id() == self._last_id:
+            print(f"[SHEETS] Rows up to id {self._last_id} already appended, not retrying")
+            return {}
+        try:
+            return self._request.execute()
+        except Exception as e:
+            status = _http_status(e)
+            self._maybe_applied = status is not None and status >= 500
+            raise
+
+
 def _get_credentials(scopes):
     """Get or refresh Google OAuth credentials."""
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import InstalledAppFlow
     from google.auth.transport.requests import Request
-    import pickle
 
     creds = None
     token_path = "token.json"
     creds_path = os.getenv("GOOGLE_CREDENTIALS_PATH", "credentials.json")
 
     if os.path.exists(token_path):
-        import json
         creds = Credentials.from_authorized_user_file(token_path, scopes)
 
     if not creds or not creds.valid:
@@ -116,3 +357,19 @@ def _get_credentials(scopes):
             token.write(creds.to_json())
 
     return creds
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "export":
+        print("Usage: python tools/google_sheets.py export <spreadsheet_id> [sheet_name]")
+        sys.exit(1)
+
+    sys.path.append(str(BASE_DIR / "chatbot-rag"))
+    from src.analytics_store import AnalyticsStore
+
+    exporter = SheetsExporter(
+        get_service(WRITE_SCOPES),
+        sys.argv[2],
+        sheet=sys.argv[3] if len(sys.argv) > 3 else "Conversaciones",
+    )
+    print(exporter.export(AnalyticsStore()))
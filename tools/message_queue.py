@@ -0,0 +1,315 @@
+"""
+Tool: Durable Inbound Message Queue
+========================================
+SQLite (WAL) backed job queue for incoming WhatsApp messages, shared by
+every gunicorn worker and any standalone reply worker on the machine.
+
+Inputs:
+    - (sender, body) pairs enqueued by the webhook
+
+Outputs:
+    - Jobs claimed by reply workers, one sender at a time and in order;
+      a burst of short messages from one sender is merged into one job
+    - Queue depth and per-stage latency via stats()
+
+Requirements:
+    - MESSAGE_QUEUE_PATH in .env (optional, default .tmp/message_queue.sqlite3)
+    - COALESCE_WINDOW / COALESCE_MAX_WAIT in .env (optional, seconds; 3 / 10)
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_QUEUE_PATH = BASE_DIR / ".tmp" / "message_queue.sqlite3"
+
+# A job stuck in "processing" this long is assumed orphaned (worker
+# crashed or was killed) and is handed out again
+DEFAULT_LEASE_SECONDS = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending | processing | done | dead | merged
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    generate_seconds REAL,
+    send_seconds REAL,
+    reply TEXT,
+    error TEXT,
+    merged_into INTEGER                       -- job that absorbed this message
+);
+CREATE INDEX IF NOT EXISTS jobs_status_sender ON jobs (status, sender, id);
+"""
+
+
+@dataclass
+class Job:
+    """One claimed message."""
+
+    id: int
+    sender: str
+    body: str
+    attempts: int
+    enqueued_at: float
+    reply: Optional[str] = None  # set when a previous attempt already generated it
+    message_count: int = 1  # > 1 when several messages were coalesced into this job
+
+
+class MessageQueue:
+    """
+    Durable FIFO-per-sender queue.
+
+    - Only the oldest unfinished message of a sender can be claimed, so
+      replies to one patient are never reordered, while different
+      senders are processed in parallel.
+    - Coalescing: a sender's messages are held until they have been quiet
+      for ``coalesce_window`` seconds (but never longer than
+      ``coalesce_max_wait``), then merged into one job — "hola" /
+      "quería saber" / "el precio de brackets" get a single answer.
+    - Failed jobs are retried with exponential backoff and moved to the
+      ``dead`` state after ``max_attempts``.
+    - Each process/thread gets its own connection; claims run inside
+      ``BEGIN IMMEDIATE`` so concurrent workers never take the same job.
+
+    Usage:
+        q = MessageQueue()
+        q.enqueue("whatsapp:+5215512345678", "Hola")
+        job = q.claim()
+        q.complete(job)             # or q.fail(job, "error")
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str | Path] = None,
+        max_attempts: int = 5,
+        retry_base_delay: float = 2.0,
+        retry_max_delay: float = 300.0,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        coalesce_window: float = 0.0,
+        coalesce_max_wait: float = 10.0,
+    ):
+        self.db_path = Path(db_path or os.getenv("MESSAGE_QUEUE_PATH", DEFAULT_QUEUE_PATH))
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.lease_seconds = lease_seconds
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_wait = coalesce_max_wait
+        self._local = threading.local()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "merged_into" not in columns:  # queue files created before coalescing
+            conn.execute("ALTER TABLE jobs ADD COLUMN merged_into INTEGER")
+
+    @classmethod
+    def from_env(cls) -> "MessageQueue":
+        """Queue configured from REPLY_MAX_ATTEMPTS / COALESCE_WINDOW / COALESCE_MAX_WAIT."""
+        return cls(
+            max_attempts=int(os.getenv("REPLY_MAX_ATTEMPTS", 5)),
+            coalesce_window=float(os.getenv("COALESCE_WINDOW", 3.0)),
+            coalesce_max_wait=float(os.getenv("COALESCE_MAX_WAIT", 10.0)),
+        )
+
+    # ─── Producer ────────────────────────────────────────
+
+    def enqueue(self, sender: str, body: str) -> int:
+        """Persist a message; returns its job ID."""
+        now = time.time()
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (sender, body, enqueued_at, available_at) VALUES (?, ?, ?, ?)",
+                (sender, body, now, now),
+            )
+        return cursor.lastrowid
+
+    # ─── Consumer ────────────────────────────────────────
+
+    def claim(self) -> Optional[Job]:
+        """
+        Take the next ready job (head of its sender's line), or None.
+
+        Later pending messages of the same sender are merged into the
+        claimed job (unless it already has a generated reply to resend).
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Recover jobs whose worker died mid-flight
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', available_at = ?"
+                " WHERE status = 'processing' AND started_at < ?",
+                (now, now - self.lease_seconds),
+            )
+            # Head of a sender's line, once the sender has gone quiet for
+            # the coalescing window (retries and overdue bursts go at once)
+            row = conn.execute(
+                """
+                SELECT id, sender, body, attempts, enqueued_at, reply FROM jobs AS j
+                WHERE status = 'pending' AND available_at <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM jobs AS p
+                      WHERE p.sender = j.sender AND p.id < j.id
+                        AND p.status IN ('pending', 'processing'))
+                  AND (attempts > 0 OR enqueued_at <= ? OR NOT EXISTS (
+                      SELECT 1 FROM jobs AS n
+                      WHERE n.sender = j.sender AND n.status = 'pending'
+                        AND n.enqueued_at > ?))
+                ORDER BY id LIMIT 1
+                """,
+                (now, now - self.coalesce_max_wait, now - self.coalesce_window),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            job = Job(
+                id=row[0],
+                sender=row[1],
+                body=row[2],
+                attempts=row[3] + 1,
+                enqueued_at=row[4],
+                reply=row[5],
+            )
+            if job.reply is None and self.coalesce_window > 0:
+                self._merge_followups(conn, job)
+
+            conn.execute(
+                "UPDATE jobs SET status = 'processing', started_at = ?, attempts = ?, body = ?"
+                " WHERE id = ?",
+                (now, job.attempts, job.body, job.id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        return job
+
+    def save_reply(self, job: Job, reply: str, generate_seconds: float) -> None:
+        """Keep the generated answer so a retry only has to re-send it."""
+        job.reply = reply
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE jobs SET reply = ?, generate_seconds = ? WHERE id = ?",
+                (reply, generate_seconds, job.id),
+            )
+
+    def complete(self, job: Job, send_seconds: float = 0.0) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, send_seconds = ?, error = NULL"
+                " WHERE id = ?",
+                (time.time(), send_seconds, job.id),
+            )
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        Record a failed attempt.
+
+        Returns:
+            True if the job was dead-lettered, False if it will be retried.
+        """
+        now = time.time()
+        dead = job.attempts >= self.max_attempts
+        with self._conn() as conn:
+            if dead:
+                conn.execute(
+                    "UPDATE jobs SET status = 'dead', finished_at = ?, error = ? WHERE id = ?",
+                    (now, error, job.id),
+                )
+            else:
+                delay = min(self.retry_base_delay * 2 ** (job.attempts - 1), self.retry_max_delay)
+                delay *= random.uniform(0.5, 1.0)
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', available_at = ?, error = ? WHERE id = ?",
+                    (now + delay, error, job.id),
+                )
+        return dead
+
+    def purge(self, older_than: float = 7 * 86400) -> int:
+        """Delete finished (done / merged) jobs older than ``older_than`` seconds."""
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'merged')"
+                " AND COALESCE(finished_at, enqueued_at) < ?",
+                (time.time() - older_than,),
+            )
+        return cursor.rowcount
+
+    # ─── Monitoring ──────────────────────────────────────
+
+    def stats(self, window: int = 500) -> dict:
+        """Depth per status plus average stage latencies over the last ``window`` jobs."""
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        answered = counts.get("done", 0) + counts.get("dead", 0)
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM jobs WHERE status = 'pending'"
+        ).fetchone()[0]
+        wait, generate, send = conn.execute(
+            """
+            SELECT AVG(started_at - enqueued_at), AVG(generate_seconds), AVG(send_seconds)
+            FROM (SELECT * FROM jobs WHERE status = 'done' ORDER BY id DESC LIMIT ?)
+            """,
+            (window,),
+        ).fetchone()
+        return {
+            "pending": counts.get("pending", 0),
+            "processing": counts.get("processing", 0),
+            "done": counts.get("done", 0),
+            "dead": counts.get("dead", 0),
+            "coalesced": counts.get("merged", 0),
+            "messages_per_answer": (
+                round((answered + counts.get("merged", 0)) / answered, 2) if answered else 0.0
+            ),
+            "oldest_pending_age_s": round(time.time() - oldest, 2) if oldest else 0.0,
+            "avg_queue_wait_ms": round((wait or 0.0) * 1000, 1),
+            "avg_generate_ms": round((generate or 0.0) * 1000, 1),
+            "avg_send_ms": round((send or 0.0) * 1000, 1),
+        }
+
+    # ─── Internals ───────────────────────────────────────
+
+    @staticmethod
+    def _merge_followups(conn: sqlite3.Connection, job: Job) -> None:
+        """Fold the sender's later pending messages into ``job`` (inside the claim transaction)."""
+        followups = conn.execute(
+            "SELECT id, body FROM jobs WHERE sender = ? AND status = 'pending' AND id > ?"
+            " ORDER BY id",
+            (job.sender, job.id),
+        ).fetchall()
+        if not followups:
+            return
+        job.body = "\n".join([job.body] + [body for _, body in followups])
+        job.message_count += len(followups)
+        conn.executemany(
+            "UPDATE jobs SET status = 'merged', merged_into = ?, finished_at = ? WHERE id = ?",
+            [(job.id, time.time(), job_id) for job_id, _ in followups],
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread, reopened after fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -8,6 +8,16 @@ Inputs:
 
 Outputs:
     - Processes the incoming message and returns a TwiML response
+    - With DEFERRED_REPLIES=true, returns an empty TwiML response at once;
+      the message is stored in tools/message_queue.py and answered later
+      by tools/reply_worker.py
+
+Startup:
+    The RAG chatbot loads in a background thread, so /health (liveness)
+    answers right away and /ready returns 503 until the warm-up is done.
+    /metrics serves Prometheus counters and per-stage latency histograms.
+    `python tools/receive_whatsapp_message.py --profile-startup` prints an
+    import-time breakdown instead of starting the server.
 
 Requirements:
     - TWILIO_AUTH_TOKEN in .env (for request validation)
@@ -15,33 +25,70 @@ Requirements:
 """
 
 import os
+import time
 from dotenv import load_dotenv
 from flask import Flask, request
 import sys
 from twilio.twiml.messaging_response import MessagingResponse
 
-# Add chatbot-rag to python path
+# Add project root and chatbot-rag to python path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RAG_DIR = os.path.join(BASE_DIR, "chatbot-rag")
-if RAG_DIR not in sys.path:
-    sys.path.append(RAG_DIR)
+for path in (BASE_DIR, RAG_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
 
-try:
-    from src.chatbot import RAGChatbot
-    rag_chatbot = RAGChatbot()
-    if rag_chatbot.em.document_count == 0:
-        print("⚠️ Database empty! Loading sample documents for production...")
-        rag_chatbot.load_sample_documents()
-    print(f"✅ RAG Chatbot initialized (Docs: {rag_chatbot.em.document_count})")
-except Exception as e:
-    print(f"⚠️ Failed to initialize RAG Chatbot: {e}")
-    rag_chatbot = None
+from src.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, REGISTRY
+from src.startup import BackgroundWarmup, print_startup_profile
+from tools.message_queue import MessageQueue
+from tools.reply_worker import ReplyWorkerPool
 
 # Load environment variables
 load_dotenv()
 
+# Set by gunicorn.conf.py when the app is imported once in the master
+# and forked into workers
+PRELOADED = os.getenv("RAG_PRELOAD") == "1"
+
+# Seconds a message waits for the chatbot while it is still warming up
+WARMUP_WAIT = float(os.getenv("WARMUP_WAIT", 10))
+
+
+def _build_chatbot():
+    """Heavy imports (langchain, ChromaDB, OpenAI) happen here, not at module import."""
+    if PRELOADED:
+        from src.preload import preload_chatbot
+        chatbot = preload_chatbot()
+        print("✅ RAG Chatbot preloaded (workers open the vector store after fork)")
+        return chatbot
+
+    from src.chatbot import RAGChatbot
+    chatbot = RAGChatbot()
+    if chatbot.em.document_count == 0:
+        print("⚠️ Database empty! Loading sample documents for production...")
+        chatbot.load_sample_documents()
+    print(f"✅ RAG Chatbot initialized (Docs: {chatbot.em.document_count})")
+    return chatbot
+
+
+warmup = BackgroundWarmup("rag_chatbot", _build_chatbot)
+if PRELOADED:
+    warmup.run()  # must be complete before gunicorn forks the workers
+elif "--profile-startup" not in sys.argv:
+    warmup.start()
+
 app = Flask(__name__)
 
+INCOMING_MESSAGES = REGISTRY.counter(
+    "whatsapp_incoming_messages", "Messages received on the Twilio webhook", ["mode"]
+)
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    "whatsapp_webhook_duration_seconds", "Time to answer Twilio's webhook request", ["mode"]
+)
+
+# Answer in the background and reply via the REST API instead of TwiML
+DEFERRED_REPLIES = os.getenv("DEFERRED_REPLIES", "false").lower() in ("1", "true", "yes")
+
 
 @app.route("/webhook", methods=["POST"])
 def webhook():
@@ -51,16 +98,58 @@ def webhook():
 
     print(f"[INCOMING] From: {sender} | Message: {incoming_msg}")
 
+    resp = MessagingResponse()
+    started = time.perf_counter()
+
+    if DEFERRED_REPLIES:
+        # Acknowledge now; the reply worker answers and sends it later
+        reply_pool.submit(sender, incoming_msg)
+        INCOMING_MESSAGES.inc(mode="deferred")
+        WEBHOOK_SECONDS.observe(time.perf_counter() - started, mode="deferred")
+        return str(resp)
+
     # Process the message (connect to AI agent here)
     response_text = process_message(incoming_msg, sender)
-
-    # Build TwiML response
-    resp = MessagingResponse()
     resp.message(response_text)
 
+    INCOMING_MESSAGES.inc(mode="inline")
+    WEBHOOK_SECONDS.observe(time.perf_counter() - started, mode="inline")
     return str(resp)
 
 
+def generate_reply(message: str, sender: str) -> str:
+    """
+    Answer a message with the RAG chatbot (one conversation per sender).
+
+    Errors propagate so the deferred reply queue can retry the job.
+
+    Args:
+        message: The incoming message text
+        sender: The sender's WhatsApp number
+
+    Returns:
+        Response text to send back
+    """
+    rag_chatbot = warmup.get(timeout=WARMUP_WAIT)
+    if rag_chatbot is None:
+        raise RuntimeError(f"RAG chatbot is not available ({warmup.status()['state']})")
+
+    # 1. Get response from RAG
+    response = rag_chatbot.chat(message, session_id=sender)
+
+    # 2. Format response for WhatsApp
+    text = response.answer
+
+    # Add sources if available/relevant
+    # if response.sources and response.confidence >= 0.7:
+    #     sources_text = "\n\n📄 *Fuentes:*\n" + "\n".join(
+    #         [f"- {s['source']} ({s['relevance']:.0%})" for s in response.sources[:2]]
+    #     )
+    #     text += sources_text
+
+    return text
+
+
 def process_message(message: str, sender: str) -> str:
     """
     Process an incoming message and generate a response.
@@ -73,35 +162,73 @@ def process_message(message: str, sender: str) -> str:
     Returns:
         Response text to send back
     """
-    if rag_chatbot:
-        try:
-            # 1. Get response from RAG
-            response = rag_chatbot.chat(message)
-            
-            # 2. Format response for WhatsApp
-            text = response.answer
-            
-            # Add sources if available/relevant
-            # if response.sources and response.confidence >= 0.7:
-            #     sources_text = "\n\n📄 *Fuentes:*\n" + "\n".join(
-            #         [f"- {s['source']} ({s['relevance']:.0%})" for s in response.sources[:2]]
-            #     )
-            #     text += sources_text
-                
-            return text
-        except Exception as e:
-            print(f"Error generating RAG response: {e}")
-            return "Lo siento, tuve un problema procesando tu mensaje. Intenta nuevamente."
-    
-    return "El sistema RAG no está disponible en este momento."
+    if warmup.get(timeout=WARMUP_WAIT) is None:
+        return "El sistema RAG no está disponible en este momento."
+
+    try:
+        return generate_reply(message, sender)
+    except Exception as e:
+        print(f"Error generating RAG response: {e}")
+        return "Lo siento, tuve un problema procesando tu mensaje. Intenta nuevamente."
+
+
+# Durable queue + worker threads for DEFERRED_REPLIES. With REPLY_WORKERS=0
+# the web process only enqueues and `python tools/reply_worker.py` replies.
+reply_pool = (
+    ReplyWorkerPool(
+        generate_reply,
+        MessageQueue.from_env(),
+        workers=int(os.getenv("REPLY_WORKERS", 2)),
+    )
+    if DEFERRED_REPLIES
+    else None
+)
+
+
+def reset_after_fork() -> None:
+    """
+    Called by gunicorn's post_fork hook (gunicorn.conf.py) in each worker.
+
+    With preload_app the chatbot, its index and caches are built once in
+    the master and shared copy-on-write; each worker only re-opens its
+    own clients and gets its own sessions and metrics.
+    """
+    rag_chatbot = warmup.get()
+    if rag_chatbot is not None:
+        rag_chatbot.reset_after_fork()
 
 
 @app.route("/health", methods=["GET"])
 def health():
-    """Health check endpoint."""
+    """Liveness: the process is up (does not wait for the chatbot)."""
     return {"status": "ok", "service": "whatsapp-chatbot"}
 
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once the RAG chatbot has finished warming up, 503 before."""
+    status = warmup.status()
+    return status, 200 if status["ready"] else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint (counters and latency histograms, summed over workers)."""
+    return REGISTRY.render(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE}
+
+
+@app.route("/queue/stats", methods=["GET"])
+def queue_stats():
+    """Deferred reply queue depth and per-stage latency."""
+    if reply_pool is None:
+        return {"enabled": False}
+    return {"enabled": True, **reply_pool.queue.stats()}
+
+
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        print_startup_profile("tools.receive_whatsapp_message", cwd=BASE_DIR)
+        sys.exit(0)
+
     port = int(os.getenv("APP_PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=os.getenv("APP_ENV") == "development")
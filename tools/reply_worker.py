@@ -0,0 +1,210 @@
+"""
+Tool: Deferred WhatsApp Reply Worker
+========================================
+Worker pool that consumes the durable message queue, generates answers
+with the RAG chatbot and delivers them through the Twilio REST API, so
+the webhook can acknowledge Twilio immediately instead of waiting for
+the LLM.
+
+Inputs:
+    - Jobs from tools/message_queue.py (enqueued by the webhook)
+
+Outputs:
+    - Replies sent with tools/send_whatsapp_message.send_whatsapp_message
+
+Usage:
+    python tools/reply_worker.py          # standalone worker process
+
+Requirements:
+    - TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER in .env
+    - REPLY_WORKERS in .env (optional, threads per process, default 2)
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_DIR = os.path.join(BASE_DIR, "chatbot-rag")
+for path in (BASE_DIR, RAG_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from src.latency import span
+from src.prometheus import REGISTRY
+from tools.message_queue import Job, MessageQueue
+from tools.send_whatsapp_message import send_whatsapp_message
+
+WHATSAPP_PREFIX = "whatsapp:"
+
+# Seconds an idle worker sleeps before polling the queue again. Jobs
+# enqueued by this process wake it immediately; coalesced bursts become
+# ready within one interval of the sender going quiet.
+POLL_INTERVAL = 0.5
+
+# How often finished jobs are purged from the queue database
+PURGE_INTERVAL = 3600.0
+
+REPLIES = REGISTRY.counter(
+    "whatsapp_replies", "Deferred reply attempts by outcome", ["outcome"]
+)
+
+FALLBACK_REPLY = (
+    "Estamos experimentando dificultades técnicas. "
+    "Por favor, intenta nuevamente en unos minutos."
+)
+
+
+def strip_whatsapp_prefix(sender: str) -> str:
+    """'whatsapp:+5215512345678' → '+5215512345678' (send_whatsapp_message adds it back)."""
+    return sender[len(WHATSAPP_PREFIX):] if sender.startswith(WHATSAPP_PREFIX) else sender
+
+
+class ReplyWorkerPool:
+    """
+    Threads that answer queued messages off the request path.
+
+    Ordering per sender, retries and dead-lettering are handled by the
+    MessageQueue, so any number of pools (one per gunicorn worker, or a
+    standalone process) can share the same queue file. Threads start
+    lazily on the first submit and are restarted after a fork, so the
+    pool is safe to create at import time under gunicorn.
+
+    Usage:
+        pool = ReplyWorkerPool(generate_reply, MessageQueue(), workers=2)
+        pool.submit("whatsapp:+5215512345678", "¿Cuánto cuesta una limpieza?")
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str, str], str],
+        message_queue: MessageQueue,
+        workers: int = 2,
+        sender_fn: Callable[[str, str], dict] = send_whatsapp_message,
+    ):
+        self.handler = handler
+        self.queue = message_queue
+        self.workers = workers
+        self.sender_fn = sender_fn
+        self._wakeup = threading.Event()
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def submit(self, sender: str, message: str) -> int:
+        """Persist a message and wake a worker; returns immediately."""
+        job_id = self.queue.enqueue(sender, message)
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def start(self) -> None:
+        """Start the worker threads in this process (no-op if running or workers=0)."""
+        # Threads do not survive fork(): start them in whichever process
+        # actually receives traffic (each gunicorn worker)
+        if self.workers <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"reply-worker-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def run_forever(self) -> None:
+        """Block the calling thread while the workers run (standalone mode)."""
+        self.start()
+        while True:
+            time.sleep(60)
+            print(f"[QUEUE] {self.queue.stats()}")
+
+    # ─── Worker loop ─────────────────────────────────────
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self.queue.claim()
+            except Exception as e:
+                print(f"[REPLY] Queue error: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                self._maybe_purge()
+                continue
+
+            try:
+                self._process(job)
+            except Exception as e:
+                # Never lose the thread: start() will not replace it.
+                # The job's lease expires and another claim picks it up.
+                print(f"[REPLY] Worker error on job {job.id}: {e}")
+
+    def _process(self, job: Job) -> None:
+        started = time.time()
+        try:
+            if job.reply is None:
+                self.queue.save_reply(
+                    job, self.handler(job.body, job.sender), time.time() - started
+                )
+
+            send_started = time.time()
+            with span("twilio_send"):
+                result = self.sender_fn(strip_whatsapp_prefix(job.sender), job.reply)
+            if not result.get("success"):
+                raise RuntimeError(result.get("error") or "send failed")
+
+            self.queue.complete(job, time.time() - send_started)
+            REPLIES.inc(outcome="sent")
+            print(
+                f"[REPLY] To: {job.sender} | {job.message_count} message(s) | "
+                f"waited {started - job.enqueued_at:.2f}s | "
+                f"answered+sent in {time.time() - started:.2f}s"
+            )
+        except Exception as e:
+            self._handle_failure(job, e)
+
+    def _handle_failure(self, job: Job, error: Exception) -> None:
+        try:
+            dead = self.queue.fail(job, str(error))
+        except Exception as e:
+            # e.g. the queue database is locked: the lease recovers the job
+            print(f"[REPLY] Could not record failure of job {job.id}: {e}")
+            return
+
+        REPLIES.inc(outcome="dead" if dead else "retry")
+        print(
+            f"[REPLY] Attempt {job.attempts} failed for {job.sender}: {error}"
+            + (" — moved to dead letter" if dead else " — will retry")
+        )
+        if dead and job.reply is None:
+            # Generation never succeeded: at least tell the patient
+            try:
+                self.sender_fn(strip_whatsapp_prefix(job.sender), FALLBACK_REPLY)
+            except Exception as e:
+                print(f"[REPLY] Fallback reply to {job.sender} failed: {e}")
+
+    def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        try:
+            self.queue.purge()
+        except Exception as e:
+            print(f"[REPLY] Queue purge failed: {e}")
+
+
+if __name__ == "__main__":
+    from tools.receive_whatsapp_message import generate_reply
+
+    pool = ReplyWorkerPool(
+        generate_reply,
+        MessageQueue.from_env(),
+        workers=max(int(os.getenv("REPLY_WORKERS", 2)), 1),
+    )
+    print(f"✅ Reply worker running ({pool.workers} threads, queue: {pool.queue.db_path})")
+    pool.run_forever()